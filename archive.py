@@ -0,0 +1,73 @@
+import gzip
+import json
+import os
+from typing import Dict, Iterable, List, Tuple
+
+from models import options_to_mask
+
+# Columns of the responses table kept in the archive (questionnaire_id is implied by the file)
+ARCHIVE_COLUMNS = ('id', 'user_id', 'question_id', 'answer_text', 'selected_option', 'selected_mask', 'created_at',
+                   'answer_number', 'answer_date')
+
+
+class ResponseArchive:
+    """Cold storage for responses of closed questionnaires, one gzip JSONL file per questionnaire"""
+
+    def __init__(self, archive_dir: str):
+        self.archive_dir = archive_dir
+
+    def path(self, questionnaire_id: int) -> str:
+        return os.path.join(self.archive_dir, f'questionnaire_{questionnaire_id}.jsonl.gz')
+
+    def exists(self, questionnaire_id: int) -> bool:
+        return os.path.exists(self.path(questionnaire_id))
+
+    def write(self, questionnaire_id: int, rows: Iterable) -> int:
+        """Append rows to the questionnaire's archive; returns the number written.
+
+        Existing archived rows are rewritten into a temporary file with the new
+        ones, which then atomically replaces the archive, so a crash never
+        leaves a truncated file behind.
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = self.path(questionnaire_id)
+        tmp_path = path + '.tmp'
+        count = 0
+
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for row in self.read(questionnaire_id):
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            for row in rows:
+                f.write(json.dumps({column: row[column] for column in ARCHIVE_COLUMNS}, ensure_ascii=False) + '\n')
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, path)
+        return count
+
+    def read(self, questionnaire_id: int) -> List[dict]:
+        """Load all archived rows for a questionnaire (empty if none)"""
+        path = self.path(questionnaire_id)
+        if not os.path.exists(path):
+            return []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        for row in rows:
+            if 'selected_options' in row:
+                # Written before selections became a bitmask; the column held a JSON list
+                legacy = row.pop('selected_options')
+                row['selected_mask'] = options_to_mask(json.loads(legacy)) if legacy else None
+            # Written before typed answers
+            row.setdefault('answer_number', None)
+            row.setdefault('answer_date', None)
+        return rows
+
+    def answers(self, questionnaire_id: int) -> Dict[Tuple[int, int], dict]:
+        """Archived rows keyed by (user_id, question_id)"""
+        return {(row['user_id'], row['question_id']): row for row in self.read(questionnaire_id)}
+
+    def remove(self, questionnaire_id: int):
+        path = self.path(questionnaire_id)
+        if os.path.exists(path):
+            os.remove(path)
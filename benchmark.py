@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+"""
+Database Benchmark Suite
+
+Builds a synthetic database and times the hot Database methods.
+Results are written as JSON so runs from different commits can be compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+With --backend memory the same suite runs against MemoryStorage, so the
+difference between the two runs is the cost of SQLite itself.
+
+With --startup it instead measures bot import and construction time in
+fresh interpreters, with a per-module import breakdown.
+
+With --models it measures turning a large questionnaire listing into model
+objects, against the eager per-field dataclass conversion it replaced.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+# Add current directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from database import Database
+from memory_storage import MemoryStorage
+from models import Questionnaire, QuestionType, QuestionnaireStatus, from_rows, options_to_mask
+from storage import StorageBackend
+
+ADMIN_ID = 1
+FIRST_RESPONDENT_ID = 1000
+# Rows per purge transaction, as PURGE_BATCH_SIZE defaults to in the bot
+PURGE_BATCH_SIZE = 500
+
+# Target for import + QuestionnaireBot construction, the part of time-to-first-update we control
+STARTUP_TARGET_SECONDS = 1.0
+
+STARTUP_SNIPPET = """
+import time
+start = time.perf_counter()
+import bot
+imported = time.perf_counter()
+bot.QuestionnaireBot()
+print(imported - start, time.perf_counter() - start)
+"""
+
+
+def build_dataset(db_path: str, questionnaires: int, questions: int, responses: int, seed: int) -> dict:
+    """Populate a fresh database with synthetic questionnaires, questions and answers"""
+    rng = random.Random(seed)
+    Database(db_path, shards=0)  # Create schema; rows are inserted directly into the catalog
+
+    respondents = max(1, responses // max(1, questionnaires * questions))
+    question_types = [QuestionType.SINGLE_CHOICE, QuestionType.MULTIPLE_CHOICE, QuestionType.TEXT]
+    options = json.dumps([f"Option {i + 1}" for i in range(5)])
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.executemany('''
+        INSERT INTO users (user_id, username, first_name, last_name, is_admin)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(ADMIN_ID, 'admin', 'Admin', None, True)] + [
+        (FIRST_RESPONDENT_ID + i, f'user{i}', f'First{i}', f'Last{i}', False)
+        for i in range(respondents)
+    ])
+
+    cursor.executemany('''
+        INSERT INTO questionnaires (id, title, description, created_by, status)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [
+        (q_id, f'Survey {q_id}', 'Synthetic benchmark questionnaire', ADMIN_ID,
+         QuestionnaireStatus.ACTIVE.value if q_id % 2 else QuestionnaireStatus.CLOSED.value)
+        for q_id in range(1, questionnaires + 1)
+    ])
+
+    question_rows = []
+    question_ids = {}
+    next_question_id = 1
+    for q_id in range(1, questionnaires + 1):
+        question_ids[q_id] = []
+        for index in range(questions):
+            question_type = question_types[index % len(question_types)]
+            question_rows.append((
+                next_question_id, q_id, f'Question {index + 1}', question_type.value,
+                options if question_type != QuestionType.TEXT else None, True, index + 1
+            ))
+            question_ids[q_id].append((next_question_id, question_type))
+            next_question_id += 1
+    cursor.executemany('''
+        INSERT INTO questions
+        (id, questionnaire_id, question_text, question_type, options, is_required, order_index)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', question_rows)
+    # Version 1 of each questionnaire holds all of its questions
+    cursor.executemany('''
+        INSERT INTO version_questions (questionnaire_id, version, position, question_id)
+        VALUES (?, 1, ?, ?)
+    ''', [(row[1], row[6], row[0]) for row in question_rows])
+
+    total_responses = 0
+    for q_id in range(1, questionnaires + 1):
+        cursor.executemany('''
+            INSERT INTO questionnaire_responses
+            (questionnaire_id, user_id, completed_at, is_completed)
+            VALUES (?, ?, CURRENT_TIMESTAMP, ?)
+        ''', [(q_id, FIRST_RESPONDENT_ID + i, True) for i in range(respondents)])
+
+        response_rows = []
+        for i in range(respondents):
+            user_id = FIRST_RESPONDENT_ID + i
+            for question_id, question_type in question_ids[q_id]:
+                if question_type == QuestionType.SINGLE_CHOICE:
+                    response_rows.append((q_id, user_id, question_id, None, rng.randrange(5), None))
+                elif question_type == QuestionType.MULTIPLE_CHOICE:
+                    picked = sorted(rng.sample(range(5), rng.randint(1, 3)))
+                    response_rows.append((q_id, user_id, question_id, None, None, options_to_mask(picked)))
+                else:
+                    response_rows.append((q_id, user_id, question_id, f'Answer {rng.random():.6f}', None, None))
+        cursor.executemany('''
+            INSERT INTO responses
+            (questionnaire_id, user_id, question_id, answer_text, selected_option, selected_mask)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', response_rows)
+        total_responses += len(response_rows)
+
+    conn.commit()
+    conn.close()
+
+    return {
+        'questionnaires': questionnaires,
+        'questions_per_questionnaire': questions,
+        'respondents_per_questionnaire': respondents,
+        'responses': total_responses,
+        'question_ids': question_ids,
+    }
+
+
+def build_storage_dataset(db: StorageBackend, questionnaires: int, questions: int, responses: int,
+                          seed: int) -> dict:
+    """Populate any storage backend through its public API with the same data as build_dataset"""
+    rng = random.Random(seed)
+    respondents = max(1, responses // max(1, questionnaires * questions))
+    question_types = [QuestionType.SINGLE_CHOICE, QuestionType.MULTIPLE_CHOICE, QuestionType.TEXT]
+    options = [f"Option {i + 1}" for i in range(5)]
+
+    db.create_or_update_user(ADMIN_ID, 'admin', 'Admin', None)
+    for i in range(respondents):
+        db.create_or_update_user(FIRST_RESPONDENT_ID + i, f'user{i}', f'First{i}', f'Last{i}')
+
+    question_ids = {}
+    total_responses = 0
+    for _ in range(questionnaires):
+        q_id = db.create_questionnaire(f'Survey {len(question_ids) + 1}', 'Synthetic benchmark questionnaire', ADMIN_ID)
+        db.update_questionnaire_status(q_id, QuestionnaireStatus.ACTIVE if q_id % 2 else QuestionnaireStatus.CLOSED)
+        question_ids[q_id] = []
+        for index in range(questions):
+            question_type = question_types[index % len(question_types)]
+            question_id = db.add_question(q_id, f'Question {index + 1}', question_type,
+                                          options if question_type != QuestionType.TEXT else None)
+            question_ids[q_id].append((question_id, question_type))
+
+        for i in range(respondents):
+            user_id = FIRST_RESPONDENT_ID + i
+            db.start_questionnaire_response(q_id, user_id)
+            for question_id, question_type in question_ids[q_id]:
+                if question_type == QuestionType.SINGLE_CHOICE:
+                    db.save_response(q_id, user_id, question_id, selected_option=rng.randrange(5))
+                elif question_type == QuestionType.MULTIPLE_CHOICE:
+                    db.save_response(q_id, user_id, question_id,
+                                     selected_options=sorted(rng.sample(range(5), rng.randint(1, 3))))
+                else:
+                    db.save_response(q_id, user_id, question_id, answer_text=f'Answer {rng.random():.6f}')
+                total_responses += 1
+            db.complete_questionnaire_response(q_id, user_id)
+
+    return {
+        'questionnaires': questionnaires,
+        'questions_per_questionnaire': questions,
+        'respondents_per_questionnaire': respondents,
+        'responses': total_responses,
+        'question_ids': question_ids,
+    }
+
+
+def time_calls(func, repeat: int, number: int = 1) -> dict:
+    """Run func repeat*number times and summarise per-call durations in milliseconds"""
+    samples = []
+    for run in range(repeat):
+        start = time.perf_counter()
+        for i in range(number):
+            func(run * number + i)
+        samples.append((time.perf_counter() - start) * 1000 / number)
+    return summarize(samples, number)
+
+
+def summarize(samples: list, number: int = 1) -> dict:
+    """Summarise per-run durations in milliseconds"""
+    return {
+        'runs': len(samples),
+        'calls_per_run': number,
+        'min_ms': min(samples),
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.mean(samples),
+        'max_ms': max(samples),
+    }
+
+
+def time_during(func, background, repeat: int, number: int = 100) -> dict:
+    """Time func while another thread calls background in a loop, e.g. answers saved during exports"""
+    stop = threading.Event()
+    background_calls = 0
+    call_ms = []
+
+    def worker():
+        nonlocal background_calls
+        while not stop.is_set():
+            background(background_calls)
+            background_calls += 1
+
+    def timed_call(i):
+        start = time.perf_counter()
+        func(i)
+        call_ms.append((time.perf_counter() - start) * 1000)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        results = time_calls(timed_call, repeat, number)
+    finally:
+        stop.set()
+        thread.join()
+
+    # A writer stalled behind a long read shows up in the tail, not the median
+    call_ms.sort()
+    results['p99_call_ms'] = call_ms[int(len(call_ms) * 0.99)]
+    results['max_call_ms'] = call_ms[-1]
+    results['background_calls'] = background_calls
+    return results
+
+
+def run_benchmarks(db: StorageBackend, dataset: dict, repeat: int) -> dict:
+    """Time the Database methods against the synthetic dataset"""
+    questionnaires = dataset['questionnaires']
+    question_ids = dataset['question_ids']
+    respondents = dataset['respondents_per_questionnaire']
+    # Keep read benchmarks and the destructive delete benchmark on disjoint questionnaires
+    read_ids = list(range(1, questionnaires - repeat + 1)) or [1]
+    delete_ids = list(range(max(1, questionnaires - repeat + 1), questionnaires + 1))
+
+    def pick(i):
+        return read_ids[i % len(read_ids)]
+
+    def save_response(i):
+        q_id = pick(i)
+        question_id, _ = question_ids[q_id][i % len(question_ids[q_id])]
+        db.save_response(q_id, FIRST_RESPONDENT_ID + i % respondents, question_id, answer_text='benchmark')
+
+    results = {
+        'save_response': time_calls(save_response, repeat, number=100),
+        'get_questions': time_calls(lambda i: db.get_questions(pick(i)), repeat, number=100),
+        'get_questionnaire_stats': time_calls(lambda i: db.get_questionnaire_stats(pick(i)), repeat, number=100),
+        'get_questionnaire_responses': time_calls(lambda i: db.get_questionnaire_responses(pick(i)), repeat),
+        'get_option_stats': time_calls(lambda i: db.get_option_stats(pick(i)), repeat, number=100),
+        'get_questionnaires_by_admin': time_calls(lambda i: db.get_questionnaires_by_admin(ADMIN_ID), repeat),
+        'save_response_during_export': time_during(
+            save_response, lambda i: db.get_questionnaire_responses(pick(i)), repeat
+        ),
+    }
+
+    try:
+        from utils import export_to_excel
+    except ImportError as e:
+        results['export_to_excel'] = {'skipped': f'missing dependency: {e}'}
+    else:
+        export_dir = tempfile.mkdtemp(prefix='bench_exports_')
+        cwd = os.getcwd()
+        os.chdir(export_dir)
+        try:
+            results['export_to_excel'] = time_calls(
+                lambda i: export_to_excel(f'bench {i}', db.get_questionnaire_responses(pick(i)),
+                                          db.get_questions(pick(i))),
+                repeat
+            )
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(export_dir, ignore_errors=True)
+
+    # The soft delete is a single UPDATE; the rows go in the batched purge that follows it.
+    # delete_questionnaire times both, comparable with the inline delete before soft-deletion
+    soft_delete_ms, purge_ms = [], []
+    for q_id in delete_ids[:repeat]:
+        start = time.perf_counter()
+        db.delete_questionnaire(q_id, ADMIN_ID)
+        soft_delete_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        while db.purge_questionnaire_batch(q_id, PURGE_BATCH_SIZE):
+            pass
+        purge_ms.append((time.perf_counter() - start) * 1000)
+    results['soft_delete_questionnaire'] = summarize(soft_delete_ms)
+    results['purge_questionnaire'] = summarize(purge_ms)
+    results['delete_questionnaire'] = summarize([a + b for a, b in zip(soft_delete_ms, purge_ms)])
+
+    return results
+
+
+def run_startup_benchmark(repeat: int) -> dict:
+    """Time `import bot` and QuestionnaireBot() in fresh interpreters"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(Path(__file__).parent), env.get('PYTHONPATH')]))
+    workdir = tempfile.mkdtemp(prefix='questionnaire_startup_')
+
+    try:
+        import_samples, construct_samples = [], []
+        for _ in range(repeat):
+            output = subprocess.check_output([sys.executable, '-c', STARTUP_SNIPPET], cwd=workdir, env=env)
+            imported, constructed = (float(value) for value in output.split())
+            import_samples.append(imported * 1000)
+            construct_samples.append(constructed * 1000)
+
+        # -X importtime reports cumulative microseconds per module on stderr
+        importtime = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import bot'],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True
+        ).stderr
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    breakdown = {}
+    for line in importtime.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        # Direct imports of bot are indented by exactly three spaces
+        if name.startswith('   ') and not name.startswith('    '):
+            breakdown[name.strip()] = int(parts[1]) / 1000
+    top_imports = dict(sorted(breakdown.items(), key=lambda item: -item[1])[:15])
+
+    def summarise(samples):
+        return {
+            'runs': repeat,
+            'min_ms': min(samples),
+            'median_ms': statistics.median(samples),
+            'mean_ms': statistics.mean(samples),
+            'max_ms': max(samples),
+        }
+
+    construct = summarise(construct_samples)
+    construct['target_ms'] = STARTUP_TARGET_SECONDS * 1000
+    construct['meets_target'] = construct['median_ms'] < STARTUP_TARGET_SECONDS * 1000
+    return {
+        'startup_import_bot': summarise(import_samples),
+        'startup_construct_bot': construct,
+        'import_breakdown_ms': top_imports,
+    }
+
+
+@dataclass
+class EagerQuestionnaire:
+    """The questionnaire model before lazy parsing, kept as the --models baseline"""
+    id: int
+    title: str
+    description: str
+    created_by: int
+    status: QuestionnaireStatus
+    created_at: datetime
+    updated_at: datetime
+    version: int
+
+
+def eager_questionnaires(rows) -> list:
+    """The per-field conversion loop the Database used to run for every listing"""
+    return [
+        EagerQuestionnaire(
+            id=row['id'],
+            title=row['title'],
+            description=row['description'],
+            created_by=row['created_by'],
+            status=QuestionnaireStatus(row['status']),
+            created_at=datetime.fromisoformat(row['created_at']),
+            updated_at=datetime.fromisoformat(row['updated_at']),
+            version=row['version']
+        )
+        for row in rows
+    ]
+
+
+def run_model_benchmark(rows: int, repeat: int) -> dict:
+    """Time and size the conversion of a questionnaire listing, eager baseline vs current models"""
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('''
+        CREATE TABLE questionnaires (id INTEGER PRIMARY KEY, title TEXT, description TEXT, created_by INTEGER,
+                                     status TEXT, created_at TIMESTAMP, updated_at TIMESTAMP, version INTEGER)
+    ''')
+    statuses = [status.value for status in QuestionnaireStatus]
+    conn.executemany('INSERT INTO questionnaires VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [
+        (i, f'Questionnaire {i}', 'Synthetic benchmark questionnaire', ADMIN_ID, statuses[i % len(statuses)],
+         '2024-01-01 12:00:00', '2024-01-02 12:00:00', 1)
+        for i in range(1, rows + 1)
+    ])
+    fetched = conn.execute(f'SELECT {Questionnaire.COLUMNS} FROM questionnaires').fetchall()
+    conn.close()
+
+    def bytes_per_row(convert):
+        tracemalloc.start()
+        try:
+            converted = convert(fetched)
+            size = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        del converted
+        return size / rows
+
+    def listing(convert):
+        # What the questionnaire lists read: id, title and status of every row
+        return lambda i: [(q.id, q.title, q.status) for q in convert(fetched)]
+
+    variants = {'eager_dataclass': eager_questionnaires, 'lazy_model': lambda rows: from_rows(Questionnaire, rows)}
+    results = {}
+    for name, convert in variants.items():
+        results[f'{name}_convert'] = time_calls(lambda i: convert(fetched), repeat)
+        results[f'{name}_listing'] = time_calls(listing(convert), repeat)
+        results[f'{name}_bytes_per_row'] = bytes_per_row(convert)
+    for kind in ('convert', 'listing'):
+        results[f'{kind}_speedup'] = (results[f'eager_dataclass_{kind}']['median_ms']
+                                      / results[f'lazy_model_{kind}']['median_ms'])
+    results['memory_ratio'] = results['lazy_model_bytes_per_row'] / results['eager_dataclass_bytes_per_row']
+    return results
+
+
+def git_revision() -> str:
+    """Return the current commit hash, if available"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=Path(__file__).parent, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results: dict, baseline: dict):
+    """Print median timings next to a previous run"""
+    print(f"{'benchmark':<30} {'baseline ms':>12} {'current ms':>12} {'ratio':>8}")
+    for name, current in results['results'].items():
+        previous = baseline['results'].get(name, {})
+        if not isinstance(current, dict) or 'median_ms' not in current or 'median_ms' not in previous:
+            continue
+        ratio = current['median_ms'] / previous['median_ms'] if previous['median_ms'] else float('inf')
+        print(f"{name:<30} {previous['median_ms']:>12.3f} {current['median_ms']:>12.3f} {ratio:>7.2f}x")
+
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description='Benchmark the Database layer on synthetic data')
+    parser.add_argument('--questionnaires', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=10, help='questions per questionnaire')
+    parser.add_argument('--responses', type=int, default=1000000, help='total answer rows to generate')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--backend', choices=('sqlite', 'memory'), default='sqlite', help='storage backend')
+    parser.add_argument('--shards', type=int, default=0, help='store responses in this many shard files')
+    parser.add_argument('--db', help='keep the generated database at this path (overwritten) instead of a temp file')
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    parser.add_argument('--compare', help='JSON results from a previous run to compare against')
+    parser.add_argument('--startup', action='store_true', help='measure bot startup time instead of the Database')
+    parser.add_argument('--models', type=int, metavar='ROWS',
+                        help='measure converting a listing of this many rows to models instead of the Database')
+    args = parser.parse_args()
+
+    if args.startup:
+        print("⏱️ Measuring startup...", file=sys.stderr)
+        results = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'repeat': args.repeat,
+            },
+            'results': run_startup_benchmark(args.repeat),
+        }
+    elif args.models:
+        print(f"⏱️ Converting {args.models} rows to models...", file=sys.stderr)
+        results = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'repeat': args.repeat,
+                'rows': args.models,
+            },
+            'results': run_model_benchmark(args.models, args.repeat),
+        }
+    else:
+        results = run_database_suite(args)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+def run_database_suite(args) -> dict:
+    """Build the synthetic database and run the Database benchmarks"""
+    workdir = None
+    if args.db:
+        db_path = args.db
+        for path in [db_path] + glob.glob(f'{os.path.splitext(db_path)[0]}.shard*.db'):
+            os.remove(path)
+    else:
+        workdir = tempfile.mkdtemp(prefix='questionnaire_bench_')
+        db_path = os.path.join(workdir, 'bench.db')
+
+    try:
+        print(f"📦 Building dataset: {args.questionnaires} questionnaires, {args.responses} responses...",
+              file=sys.stderr)
+        start = time.perf_counter()
+        if args.backend == 'memory':
+            db = MemoryStorage()
+            dataset = build_storage_dataset(db, args.questionnaires, args.questions, args.responses, args.seed)
+        else:
+            dataset = build_dataset(db_path, args.questionnaires, args.questions, args.responses, args.seed)
+            # Opening with shards moves the generated responses into the shard files
+            db = Database(db_path, shards=args.shards)
+        build_seconds = time.perf_counter() - start
+        
+        print("⏱️ Running benchmarks...", file=sys.stderr)
+        results = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'build_seconds': build_seconds,
+                'database_bytes': db.database_size(),
+                'backend': args.backend,
+                'shards': args.shards,
+                'dataset': {k: v for k, v in dataset.items() if k != 'question_ids'},
+                'repeat': args.repeat,
+            },
+            'results': run_benchmarks(db, dataset, args.repeat),
+        }
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,201 @@
 import logging
 import json
+import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
+from telegram.ext import Application, ApplicationHandlerStop, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, TypeHandler, filters
 from telegram.constants import ParseMode
+from telegram.request import HTTPXRequest
 from datetime import datetime
 import os
+import threading
+import time
+from functools import partial
+from io import BytesIO
+from typing import List
 
 from config import Config
+from callbacks import CallbackRouter
+from compiled import QuestionnaireCache, branching_errors, parse_typed_answer, question_steps
+from metrics import ACTIVE_SESSIONS, API_REQUEST_LATENCY, DUPLICATE_UPDATES, EXPORT_DURATION, HANDLER_LATENCY, THROTTLED_UPDATES, start_metrics_server, timed
+from logging_config import log_sampled, make_handler_logger, set_update_context, setup_logging
+from profiling import SamplingProfiler
+from ratelimit import RateLimiter
+from retention import RetentionReport, run_retention
 from database import Database
-from models import QuestionType, QuestionnaireStatus
-from utils import *
-
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from storage import StorageBackend
+from dedup import UpdateDeduplicator
+from search import format_search_results, parse_query
+from definitions import (MAX_DEFINITION_BYTES, DefinitionError, dump_definition, export_definition,
+                         is_definition_file, load_definition)
+from models import NUMERIC_TYPES, Question, QuestionType, QuestionnaireStatus
+from utils import (
+    export_to_excel, format_questionnaire_info, format_response_summary,
+    generate_qr_code, generate_questionnaire_link, preload_heavy_modules
 )
+
 logger = logging.getLogger(__name__)
 
+# Question types offered by the chat creation flow, by callback name
+CREATION_QUESTION_TYPES = {
+    "single": QuestionType.SINGLE_CHOICE, "multiple": QuestionType.MULTIPLE_CHOICE, "text": QuestionType.TEXT,
+    "number": QuestionType.NUMBER, "rating": QuestionType.RATING, "date": QuestionType.DATE,
+}
+
+QUESTION_TYPE_ICONS = {"single_choice": "🔘", "multiple_choice": "☑️", "text": "📝",
+                       "number": "🔢", "rating": "⭐", "date": "📅"}
+
+# Per-update events are sampled; slow handlers are always logged
+LOG_SAMPLE_RATE = getattr(Config, 'LOG_SAMPLE_RATE', 0.01)
+log_handler_latency = make_handler_logger(LOG_SAMPLE_RATE, getattr(Config, 'SLOW_HANDLER_MS', 1000))
+
+def handler_timer(name: str):
+    """Record a handler's latency in /metrics and the structured log"""
+    return timed(HANDLER_LATENCY, name, on_complete=log_handler_latency)
+
+DEFAULT_PROFILE_SECONDS = 30
+MAX_PROFILE_SECONDS = 600
+
+# Minimum seconds between purge progress edits (Telegram rate-limits message edits)
+PURGE_PROGRESS_INTERVAL = 3
+
+# Answers shown per page of /search results
+SEARCH_PAGE_SIZE = 5
+
+# bot_state key holding the highest update_id seen, restored into the deduplicator on startup
+LAST_UPDATE_ID_KEY = "last_update_id"
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that records outbound Bot API latency per method"""
+    
+    async def do_request(self, url, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        finally:
+            API_REQUEST_LATENCY.observe(time.perf_counter() - start, url.rsplit('/', 1)[-1])
+
 class QuestionnaireBot:
-    def __init__(self):
+    def __init__(self, db: StorageBackend = None):
         if not Config.validate_config():
             raise ValueError("Invalid configuration. Please check your BOT_TOKEN and ADMIN_USER_IDS.")
         
-        self.db = Database()
-        self.app = Application.builder().token(Config.BOT_TOKEN).build()
+        self.db = db or Database()
+        self.app = (
+            Application.builder()
+            .token(Config.BOT_TOKEN)
+            .request(InstrumentedRequest())
+            .post_init(self.on_startup)
+            .post_shutdown(self.on_shutdown)
+            .build()
+        )
         self.bot_username = None  # Will be set when bot starts
-        self.setup_handlers()
+        self.router = CallbackRouter(on_complete=log_handler_latency)
         
         # Store user states for multi-step operations
         self.user_states = {}
+        # Last /search per admin: user_id -> (questionnaire_id, query), read by the page buttons
+        self.search_queries = {}
+        ACTIVE_SESSIONS.set_function(lambda: len(self.user_states))
+        
+        # Questions and prompts of the questionnaire versions respondents are answering
+        self.questionnaire_cache = QuestionnaireCache(self.db.get_questions, getattr(Config, 'QUESTIONNAIRE_CACHE_SIZE', 256))
+        
+        # Skip updates Telegram redelivers after a restart or webhook retry
+        self.deduplicator = UpdateDeduplicator(
+            capacity=getattr(Config, 'DEDUP_CAPACITY', 10000),
+            high_water_mark=int(self.db.get_state(LAST_UPDATE_ID_KEY, 0))
+        )
+        self.dedup_persist_interval = getattr(Config, 'DEDUP_PERSIST_INTERVAL', 1.0)
+        self.dedup_persisted_at = time.monotonic()
+        
+        # Inbound flood protection, checked before any handler touches the database
+        self.rate_limiter = RateLimiter(
+            user_rate=getattr(Config, 'RATE_LIMIT_USER_RATE', 1.0),
+            user_burst=getattr(Config, 'RATE_LIMIT_USER_BURST', 5),
+            global_rate=getattr(Config, 'RATE_LIMIT_GLOBAL_RATE', 50.0),
+            global_burst=getattr(Config, 'RATE_LIMIT_GLOBAL_BURST', 100)
+        )
+        
+        # Scheduled retention policies (incomplete attempts, stale users, archiving); see /retention
+        self.retention_task = None
+        self.retention_lock = None
+        self.retention_report = None
+        # Background purges of soft-deleted questionnaires
+        self.purge_tasks = set()
+        
+        # On-demand profiling session started by /profile
+        self.profiler = None
+        self.profile_update_limit = None
+        self.profile_done = None
+        
+        self.setup_handlers()
+    
+    async def on_startup(self, application: Application):
+        """Start retention and purge jobs and warm up lazily imported export/QR modules"""
+        # Finish purges interrupted by a restart
+        for questionnaire_id in self.db.get_deleted_questionnaires():
+            self.start_purge(questionnaire_id)
+        
+        self.retention_lock = asyncio.Lock()
+        retention_interval = getattr(Config, 'RETENTION_INTERVAL', 86400)
+        if retention_interval:
+            # A plain asyncio task: Application.create_task tasks are awaited on shutdown
+            self.retention_task = asyncio.get_running_loop().create_task(self.retention_loop(retention_interval))
+        
+        delay = getattr(Config, 'PRELOAD_HEAVY_MODULES_DELAY', 5)
+        if delay is None:
+            return
+        
+        # A timer thread keeps the imports off the event loop and after the first updates
+        timer = threading.Timer(delay, preload_heavy_modules)
+        timer.daemon = True
+        timer.start()
+    
+    async def on_shutdown(self, application: Application):
+        """Stop background jobs and save the last processed update_id so redeliveries after a restart are skipped"""
+        if self.retention_task:
+            self.retention_task.cancel()
+        for task in list(self.purge_tasks):
+            task.cancel()
+        self.persist_update_mark()
+    
+    async def retention_loop(self, interval: float):
+        """Apply the retention policies every interval seconds"""
+        while True:
+            await self.run_retention()
+            await asyncio.sleep(interval)
+    
+    async def run_retention(self) -> RetentionReport:
+        """Run the retention policies in a worker thread and keep the report for /retention"""
+        # Only one run at a time; a manual run waits for a scheduled one to finish
+        async with self.retention_lock:
+            report = await asyncio.to_thread(
+                run_retention, self.db,
+                incomplete_days=getattr(Config, 'RETENTION_INCOMPLETE_DAYS', 30),
+                stale_user_days=getattr(Config, 'RETENTION_STALE_USER_DAYS', 365),
+                archive_days=getattr(Config, 'ARCHIVE_AFTER_DAYS', 30),
+                batch_size=getattr(Config, 'PURGE_BATCH_SIZE', 500),
+                pause=getattr(Config, 'PURGE_BATCH_PAUSE', 0.05),
+                vacuum_pages=getattr(Config, 'PURGE_VACUUM_PAGES', 200)
+            )
+        self.retention_report = report
+        logger.info("Retention run: %s, archived %s, %s bytes reclaimed", report.rows, report.archived,
+                    report.bytes_reclaimed)
+        return report
+    
+    def persist_update_mark(self):
+        """Write the deduplicator's high-water mark to the database if it moved"""
+        if not self.deduplicator.dirty:
+            return
+        self.db.set_state(LAST_UPDATE_ID_KEY, str(self.deduplicator.high_water_mark))
+        self.deduplicator.mark_persisted()
+        self.dedup_persisted_at = time.monotonic()
     
     def setup_handlers(self):
         """Setup all command and callback handlers"""
+        # Tags logs, drops duplicate and throttled updates and counts updates for profiling; runs before every other group
+        self.app.add_handler(TypeHandler(Update, self.track_update), group=-1)
+        
         # Basic commands
         self.app.add_handler(CommandHandler("start", self.start_command))
         self.app.add_handler(CommandHandler("help", self.help_command))
@@ -44,17 +207,73 @@ class QuestionnaireBot:
         self.app.add_handler(CommandHandler("view_results", self.view_results))
         self.app.add_handler(CommandHandler("export_results", self.export_results))
         self.app.add_handler(CommandHandler("delete_questionnaire", self.delete_questionnaire_command))
+        self.app.add_handler(CommandHandler("profile", self.profile_command))
+        self.app.add_handler(CommandHandler("slow_queries", self.slow_queries_command))
+        self.app.add_handler(CommandHandler("retention", self.retention_command))
+        self.app.add_handler(CommandHandler("search", self.search_command))
+        self.app.add_handler(CommandHandler("import_questionnaire", self.import_questionnaire_command))
+        self.app.add_handler(CommandHandler("export_definition", self.export_definition_command))
+        self.app.add_handler(CommandHandler("templates", self.templates_command))
         
         # Callback handlers
-        self.app.add_handler(CallbackQueryHandler(self.handle_callback))
+        self.register_admin_routes()
+        self.register_creation_routes()
+        self.register_survey_routes()
+        self.app.add_handler(CallbackQueryHandler(self.router.dispatch))
         
         # Message handlers (for multi-step processes)
         self.app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text_message))
+        self.app.add_handler(MessageHandler(filters.Document.ALL, self.handle_definition_upload))
+    
+    def register_admin_routes(self):
+        """Register callback routes for the admin panel and questionnaire management"""
+        route = self.router.register
+        route("admin_create", "ac", self.create_questionnaire_start_from_callback, admin_only=True, legacy_prefix="admin_create")
+        route("admin_list", "al", self.list_my_questionnaires_from_callback, admin_only=True, legacy_prefix="admin_list")
+        route("admin_results", "ar", self.view_results_from_callback, admin_only=True, legacy_prefix="admin_results")
+        route("admin_export", "ae", self.export_results_from_callback, admin_only=True, legacy_prefix="admin_export")
+        route("admin_delete", "ad", self.delete_questionnaire_from_callback, admin_only=True, legacy_prefix="admin_delete")
+        route("admin_profile", "ap", self.profile_from_callback, admin_only=True)
+        route("activate", "a", self.handle_activate_questionnaire, admin_only=True, legacy_prefix="activate_")
+        route("close", "c", self.handle_close_questionnaire, admin_only=True, legacy_prefix="close_")
+        route("results", "r", self.handle_view_results_callback, admin_only=True, legacy_prefix="results_")
+        route("export", "e", self.handle_export_callback, admin_only=True, legacy_prefix="export_")
+        route("get_link", "l", self.handle_get_link_callback, admin_only=True, legacy_prefix="get_link_")
+        route("delete", "d", self.handle_delete_questionnaire_callback, admin_only=True, legacy_prefix="delete_")
+        route("confirm_delete", "dy", self.handle_confirm_delete_callback, admin_only=True, legacy_prefix="confirm_delete_")
+        route("cancel_delete", "dn", self.handle_cancel_delete_callback, admin_only=True, legacy_prefix="cancel_delete_")
+        route("search_page", "sp", self.handle_search_page_callback, admin_only=True)
+        route("admin_templates", "at", self.templates_from_callback, admin_only=True)
+        route("clone", "cl", self.handle_clone_questionnaire, admin_only=True)
+        route("save_template", "sv", self.handle_save_template, admin_only=True)
+        route("use_template", "ut", self.handle_use_template, admin_only=True)
+    
+    def register_creation_routes(self):
+        """Register callback routes for the questionnaire creation flow"""
+        route = self.router.register
+        route("cancel_creation", "cc", self.handle_cancel_creation, admin_only=True, legacy_prefix="cancel_creation")
+        route("restart_creation", "rc", self.handle_restart_creation, admin_only=True, legacy_prefix="restart_creation_")
+        route("add_question", "aq", self.handle_add_question, admin_only=True, legacy_prefix="add_question_")
+        route("back_to_menu", "bm", self.handle_back_to_menu, admin_only=True, legacy_prefix="back_to_menu_")
+        route("finish_questionnaire", "fq", self.handle_finish_questionnaire, admin_only=True, legacy_prefix="finish_questionnaire_")
+        route("finish_options", "fo", self.handle_finish_options, admin_only=True, legacy_prefix="finish_options_")
+        for question_type, code in (("single", "ts"), ("multiple", "tm"), ("text", "tt")):
+            route(f"question_type_{question_type}", code,
+                  partial(self.handle_question_type_selection, question_type=question_type),
+                  admin_only=True, legacy_prefix=f"question_type_{question_type}_")
+        for question_type, code in (("number", "tn"), ("rating", "tr"), ("date", "td")):
+            route(f"question_type_{question_type}", code,
+                  partial(self.handle_question_type_selection, question_type=question_type), admin_only=True)
     
+    def register_survey_routes(self):
+        """Register callback routes used by survey participants"""
+        self.router.register("restart_survey", "rs", self.handle_restart_survey, legacy_prefix="restart_survey_")
+    
+    @handler_timer("start")
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         user = update.effective_user
-        logger.info(f"Start command from user {user.id} with args: {context.args}")
+        log_sampled(logger, logging.INFO, LOG_SAMPLE_RATE, "Start command with args: %s", context.args)
         
         # Create or update user in database
         self.db.create_or_update_user(
@@ -71,7 +290,7 @@ class QuestionnaireBot:
                 await self.handle_direct_survey_access(update, context, questionnaire_id)
                 return
             except (ValueError, IndexError) as e:
-                logger.error(f"Error parsing survey link: {e}")
+                logger.error("Error parsing survey link: %s", e)
                 await update.message.reply_text("❌ Invalid survey link. Please check the link and try again.")
                 return
         
@@ -99,7 +318,8 @@ Use /help for more information."""
     async def handle_direct_survey_access(self, update: Update, context: ContextTypes.DEFAULT_TYPE, questionnaire_id: int):
         """Handle direct access to a survey via deep link"""
         user = update.effective_user
-        logger.info(f"Direct survey access: user {user.id}, questionnaire {questionnaire_id}")
+        log_sampled(logger, logging.INFO, LOG_SAMPLE_RATE, "Direct survey access to questionnaire %s",
+                    questionnaire_id, questionnaire_id=questionnaire_id)
         questionnaire = self.db.get_questionnaire(questionnaire_id)
         
         if not questionnaire:
@@ -110,59 +330,37 @@ Use /help for more information."""
             await update.message.reply_text("❌ This survey is not currently available.")
             return
         
-        questions = self.db.get_questions(questionnaire_id)
-        if not questions:
+        compiled = self.questionnaire_cache.get(questionnaire_id, questionnaire.version)
+        if not compiled:
             await update.message.reply_text("❌ This survey has no questions.")
             return
         
-        # Start questionnaire response
-        self.db.start_questionnaire_response(questionnaire_id, user.id)
+        # Start questionnaire response, pinned to the version shown
+        self.db.start_questionnaire_response(questionnaire_id, user.id, compiled.version)
         
         # Set user state for answering questions
         self.user_states[user.id] = {
             'action': 'answering_questionnaire',
             'questionnaire_id': questionnaire_id,
             'current_question_index': 0,
-            'questions': questions
+            'compiled': compiled
         }
         
         # Show survey info and first question
         intro_message = f"📋 {questionnaire.title}\n\n"
         intro_message += f"📝 {questionnaire.description or 'No description'}\n\n"
-        intro_message += f"❓ Total Questions: {len(questions)}\n\n"
+        intro_message += f"❓ Total Questions: {len(compiled.questions)}\n\n"
         intro_message += "Let's begin!\n\n"
         
-        first_question = questions[0]
-        question_text = self.format_question_for_display(first_question, 1, len(questions))
+        question_text = compiled.prompts[0]
         
-        keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=f"restart_survey_{questionnaire_id}")]]
+        keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=self.router.encode("restart_survey", questionnaire_id))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await update.message.reply_text(intro_message + question_text, 
                                       reply_markup=reply_markup)
     
-    def format_question_for_display(self, question, question_number: int, total_questions: int) -> str:
-        """Format question for display during questionnaire taking"""
-        question_text = f"📝 Question {question_number}/{total_questions}:\n{question.question_text}\n\n"
-        
-        if question.question_type == QuestionType.SINGLE_CHOICE and question.options:
-            question_text += "🔘 Select ONE option:\n"
-            for i, option in enumerate(question.options):
-                question_text += f"{i + 1}. {option}\n"
-            question_text += f"\nReply with the number of your choice (1-{len(question.options)})"
-        elif question.question_type == QuestionType.MULTIPLE_CHOICE and question.options:
-            question_text += "☑️ Select ONE or MORE options:\n"
-            for i, option in enumerate(question.options):
-                question_text += f"{i + 1}. {option}\n"
-            question_text += "\nReply with numbers separated by commas (e.g., 1,3,5)"
-        else:  # TEXT
-            question_text += "💬 Please type your answer:"
-        
-        if question.is_required:
-            question_text += "\n\n⚠️ This question is required."
-        
-        return question_text
-    
+    @handler_timer("help")
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /help command"""
         user = update.effective_user
@@ -177,6 +375,13 @@ Use /help for more information."""
 • `/view_results` - View response statistics and summaries
 • `/export_results` - Export detailed results to Excel
 • `/delete_questionnaire` - Delete questionnaires permanently
+• `/profile [seconds | N updates] [flame]` - Profile handlers and get a report
+• `/slow_queries [reset]` - Show the slowest database statements
+• `/retention [run]` - Show the last data retention report, or run the policies now
+• `/search <questionnaire_id> <keywords>` - Find text answers mentioning keywords (`word*` for prefixes)
+• `/import_questionnaire` - Create a questionnaire from an uploaded JSON/YAML definition
+• `/export_definition <questionnaire_id> [yaml]` - Download a questionnaire's definition
+• `/templates` - Start a new questionnaire from the template library
 
 📋 **How to create questionnaires:**
 1. Use `/create_questionnaire` to start
@@ -203,6 +408,7 @@ Use /help for more information."""
         
         await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN)
     
+    @handler_timer("admin")
     async def admin_panel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show admin control panel"""
         user = update.effective_user
@@ -212,11 +418,13 @@ Use /help for more information."""
             return
         
         keyboard = [
-            [InlineKeyboardButton("📝 Create Questionnaire", callback_data="admin_create")],
-            [InlineKeyboardButton("📋 My Questionnaires", callback_data="admin_list")],
-            [InlineKeyboardButton("📊 View Results", callback_data="admin_results")],
-            [InlineKeyboardButton("📤 Export Results", callback_data="admin_export")],
-            [InlineKeyboardButton("🗑️ Delete Questionnaire", callback_data="admin_delete")]
+            [InlineKeyboardButton("📝 Create Questionnaire", callback_data=self.router.encode("admin_create"))],
+            [InlineKeyboardButton("📋 My Questionnaires", callback_data=self.router.encode("admin_list"))],
+            [InlineKeyboardButton("📊 View Results", callback_data=self.router.encode("admin_results"))],
+            [InlineKeyboardButton("📤 Export Results", callback_data=self.router.encode("admin_export"))],
+            [InlineKeyboardButton("🗑️ Delete Questionnaire", callback_data=self.router.encode("admin_delete"))],
+            [InlineKeyboardButton("📚 Templates", callback_data=self.router.encode("admin_templates"))],
+            [InlineKeyboardButton(f"🔬 Profile ({DEFAULT_PROFILE_SECONDS}s)", callback_data=self.router.encode("admin_profile"))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -226,6 +434,7 @@ Use /help for more information."""
             parse_mode=ParseMode.MARKDOWN
         )
     
+    @handler_timer("create_questionnaire")
     async def create_questionnaire_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start questionnaire creation process"""
         user = update.effective_user
@@ -241,7 +450,7 @@ Use /help for more information."""
             'data': {}
         }
         
-        keyboard = [[InlineKeyboardButton("🔄 Cancel Creation", callback_data="cancel_creation")]]
+        keyboard = [[InlineKeyboardButton("🔄 Cancel Creation", callback_data=self.router.encode("cancel_creation"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await update.message.reply_text(
@@ -250,6 +459,7 @@ Use /help for more information."""
             reply_markup=reply_markup
         )
     
+    @handler_timer("my_questionnaires")
     async def list_my_questionnaires(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """List questionnaires created by admin"""
         user = update.effective_user
@@ -273,88 +483,27 @@ Use /help for more information."""
             # Add action buttons based on status
             keyboard = []
             if q.status == QuestionnaireStatus.DRAFT:
-                keyboard.append([InlineKeyboardButton("🚀 Activate", callback_data=f"activate_{q.id}")])
-                keyboard.append([InlineKeyboardButton("🔄 Restart Creation", callback_data=f"restart_creation_{q.id}")])
-                keyboard.append([InlineKeyboardButton("🗑️ Delete", callback_data=f"delete_{q.id}")])
+                keyboard.append([InlineKeyboardButton("🚀 Activate", callback_data=self.router.encode("activate", q.id))])
+                keyboard.append([InlineKeyboardButton("🔄 Restart Creation", callback_data=self.router.encode("restart_creation", q.id))])
+                keyboard.append([InlineKeyboardButton("🗑️ Delete", callback_data=self.router.encode("delete", q.id))])
             elif q.status == QuestionnaireStatus.ACTIVE:
-                keyboard.append([InlineKeyboardButton("🔗 Get Link & QR", callback_data=f"get_link_{q.id}")])
-                keyboard.append([InlineKeyboardButton("📊 Results", callback_data=f"results_{q.id}")])
-                keyboard.append([InlineKeyboardButton("🔒 Close", callback_data=f"close_{q.id}")])
-                keyboard.append([InlineKeyboardButton("🗑️ Delete", callback_data=f"delete_{q.id}")])
+                keyboard.append([InlineKeyboardButton("🔗 Get Link & QR", callback_data=self.router.encode("get_link", q.id))])
+                keyboard.append([InlineKeyboardButton("📊 Results", callback_data=self.router.encode("results", q.id))])
+                keyboard.append([InlineKeyboardButton("🔒 Close", callback_data=self.router.encode("close", q.id))])
+                keyboard.append([InlineKeyboardButton("🗑️ Delete", callback_data=self.router.encode("delete", q.id))])
             else:  # CLOSED
-                keyboard.append([InlineKeyboardButton("📊 Results", callback_data=f"results_{q.id}")])
-                keyboard.append([InlineKeyboardButton("📤 Export", callback_data=f"export_{q.id}")])
-                keyboard.append([InlineKeyboardButton("🗑️ Delete", callback_data=f"delete_{q.id}")])
+                keyboard.append([InlineKeyboardButton("📊 Results", callback_data=self.router.encode("results", q.id))])
+                keyboard.append([InlineKeyboardButton("📤 Export", callback_data=self.router.encode("export", q.id))])
+                keyboard.append([InlineKeyboardButton("🗑️ Delete", callback_data=self.router.encode("delete", q.id))])
+            keyboard.append([
+                InlineKeyboardButton("📑 Clone", callback_data=self.router.encode("clone", q.id)),
+                InlineKeyboardButton("📚 Save as Template", callback_data=self.router.encode("save_template", q.id))
+            ])
             
             reply_markup = InlineKeyboardMarkup(keyboard)
             await update.message.reply_text(message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
     
-    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle inline keyboard callbacks"""
-        query = update.callback_query
-        await query.answer()
-        
-        data = query.data
-        user = update.effective_user
-        
-        # Admin callbacks
-        if data.startswith("admin_"):
-            await self.handle_admin_callback(query, data, user)
-        elif data.startswith("activate_"):
-            await self.handle_activate_questionnaire(query, data, user, context)
-        elif data.startswith("close_"):
-            await self.handle_close_questionnaire(query, data, user)
-        elif data.startswith("results_"):
-            await self.handle_view_results_callback(query, data, user)
-        elif data.startswith("export_"):
-            await self.handle_export_callback(query, data, user, context)
-        elif data.startswith("get_link_"):
-            await self.handle_get_link_callback(query, data, user, context)
-        elif data.startswith("delete_"):
-            await self.handle_delete_questionnaire_callback(query, data, user)
-        elif data.startswith("confirm_delete_"):
-            await self.handle_confirm_delete_callback(query, data, user)
-        elif data.startswith("cancel_delete_"):
-            await self.handle_cancel_delete_callback(query, data, user)
-        
-        # Creation callbacks
-        elif data.startswith("cancel_creation"):
-            await self.handle_cancel_creation(query, user)
-        elif data.startswith("restart_creation_"):
-            await self.handle_restart_creation(query, data, user)
-        elif data.startswith("add_question_"):
-            await self.handle_add_question(query, data, user)
-        elif data.startswith("finish_questionnaire_"):
-            await self.handle_finish_questionnaire(query, data, user)
-        elif data.startswith("question_type_"):
-            await self.handle_question_type_selection(query, data, user)
-        elif data.startswith("add_option_"):
-            await self.handle_add_option(query, data, user)
-        elif data.startswith("finish_options_"):
-            await self.handle_finish_options(query, data, user)
-        
-        # Survey callbacks
-        elif data.startswith("restart_survey_"):
-            await self.handle_restart_survey(query, data, user)
-    
-    async def handle_admin_callback(self, query, data, user):
-        """Handle admin panel callbacks"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        if data == "admin_create":
-            await self.create_questionnaire_start_from_callback(query, user)
-        elif data == "admin_list":
-            await self.list_my_questionnaires_from_callback(query, user)
-        elif data == "admin_results":
-            await self.view_results_from_callback(query, user)
-        elif data == "admin_export":
-            await self.export_results_from_callback(query, user)
-        elif data == "admin_delete":
-            await self.delete_questionnaire_from_callback(query, user)
-    
-    async def create_questionnaire_start_from_callback(self, query, user):
+    async def create_questionnaire_start_from_callback(self, query, user, context):
         """Start questionnaire creation from callback"""
         self.user_states[user.id] = {
             'action': 'creating_questionnaire',
@@ -362,7 +511,7 @@ Use /help for more information."""
             'data': {}
         }
         
-        keyboard = [[InlineKeyboardButton("🔄 Cancel Creation", callback_data="cancel_creation")]]
+        keyboard = [[InlineKeyboardButton("🔄 Cancel Creation", callback_data=self.router.encode("cancel_creation"))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(
@@ -371,26 +520,27 @@ Use /help for more information."""
             reply_markup=reply_markup
         )
     
-    async def handle_cancel_creation(self, query, user):
+    async def handle_cancel_creation(self, query, user, context):
         """Handle creation cancellation"""
         if user.id in self.user_states:
             del self.user_states[user.id]
         
         await query.edit_message_text("❌ Questionnaire creation cancelled.")
     
-    async def handle_restart_creation(self, query, data, user):
+    async def handle_restart_creation(self, query, user, context, questionnaire_id: int):
         """Handle restarting questionnaire creation"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        questionnaire_id = int(data.split("_")[-1])
         questionnaire = self.db.get_questionnaire(questionnaire_id)
         
         if not questionnaire:
             await query.edit_message_text("❌ Questionnaire not found.")
             return
         
+        if questionnaire.status != QuestionnaireStatus.DRAFT:
+            # Each chat edit of an activated questionnaire would be a version of its own
+            await query.edit_message_text("❌ Only draft questionnaires can be edited here. To change this one, "
+                                          "upload an updated definition file with its ID as the caption.")
+            return
+        
         # Set up state for continuing creation
         self.user_states[user.id] = {
             'action': 'creating_questionnaire',
@@ -402,11 +552,37 @@ Use /help for more information."""
             }
         }
         
-        await self.show_questions_menu(query, questionnaire_id)
+        await self.show_questions_menu(query, questionnaire_id, user.id)
     
-    async def show_questions_menu(self, query, questionnaire_id):
-        """Show the questions management menu"""
+    def creation_questions(self, user_id: int, questionnaire_id: int) -> List[Question]:
+        """Questions of a questionnaire being edited, followed by additions waiting to be published"""
         questions = self.db.get_questions(questionnaire_id)
+        state = self.user_states.get(user_id)
+        if not state or state['action'] != 'creating_questionnaire':
+            return questions
+        pending = state['data'].get('pending_questions', [])
+        return questions + [
+            Question._make((None, questionnaire_id, question_text, question_type.value, options, is_required,
+                            len(questions) + position, branches))
+            for position, (question_text, question_type, options, is_required, branches) in enumerate(pending, start=1)
+        ]
+    
+    def add_created_question(self, user_id: int, questionnaire_id: int, question_text: str,
+                             question_type: QuestionType, options: List[str] = None):
+        """Store a question from the chat flow"""
+        questionnaire = self.db.get_questionnaire(questionnaire_id)
+        if questionnaire.status == QuestionnaireStatus.DRAFT:
+            self.db.add_question(questionnaire_id=questionnaire_id, question_text=question_text,
+                                 question_type=question_type, options=options, is_required=True)
+            return
+        # Activated while the admin was still adding questions: every add_question would be a new
+        # version, so the additions are kept here and published as one when creation finishes
+        state = self.user_states[user_id]
+        state['data'].setdefault('pending_questions', []).append((question_text, question_type, options, True, None))
+    
+    async def show_questions_menu(self, query, questionnaire_id, user_id: int):
+        """Show the questions management menu"""
+        questions = self.creation_questions(user_id, questionnaire_id)
         questionnaire = self.db.get_questionnaire(questionnaire_id)
         
         message = f"📝 **{questionnaire.title}**\n\n"
@@ -416,37 +592,42 @@ Use /help for more information."""
         if questions:
             message += "**Questions:**\n"
             for i, q in enumerate(questions):
-                type_icon = {"single_choice": "🔘", "multiple_choice": "☑️", "text": "📝"}.get(q.question_type.value, "❓")
+                type_icon = QUESTION_TYPE_ICONS.get(q.question_type.value, "❓")
                 message += f"{i+1}. {type_icon} {q.question_text}\n"
             message += "\n"
         
         keyboard = [
-            [InlineKeyboardButton("➕ Add Question", callback_data=f"add_question_{questionnaire_id}")],
-            [InlineKeyboardButton("✅ Finish Questionnaire", callback_data=f"finish_questionnaire_{questionnaire_id}")],
-            [InlineKeyboardButton("🔄 Cancel", callback_data="cancel_creation")]
+            [InlineKeyboardButton("➕ Add Question", callback_data=self.router.encode("add_question", questionnaire_id))],
+            [InlineKeyboardButton("✅ Finish Questionnaire", callback_data=self.router.encode("finish_questionnaire", questionnaire_id))],
+            [InlineKeyboardButton("🔄 Cancel", callback_data=self.router.encode("cancel_creation"))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
     
-    async def handle_add_question(self, query, data, user):
-        """Handle adding a new question"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        questionnaire_id = int(data.split("_")[-1])
+    async def handle_back_to_menu(self, query, user, context, questionnaire_id: int):
+        """Return to the questions menu, dropping any half-entered question"""
+        state = self.user_states.get(user.id)
+        if state and state['action'] == 'creating_questionnaire':
+            state['step'] = 'questions_menu'
         
+        await self.show_questions_menu(query, questionnaire_id, user.id)
+    
+    async def handle_add_question(self, query, user, context, questionnaire_id: int):
+        """Handle adding a new question"""
         # Update user state
         if user.id in self.user_states:
             self.user_states[user.id]['step'] = 'question_type'
             self.user_states[user.id]['data']['current_questionnaire_id'] = questionnaire_id
         
         keyboard = [
-            [InlineKeyboardButton("🔘 Single Choice", callback_data=f"question_type_single_{questionnaire_id}")],
-            [InlineKeyboardButton("☑️ Multiple Choice", callback_data=f"question_type_multiple_{questionnaire_id}")],
-            [InlineKeyboardButton("📝 Text Answer", callback_data=f"question_type_text_{questionnaire_id}")],
-            [InlineKeyboardButton("🔙 Back to Menu", callback_data=f"back_to_menu_{questionnaire_id}")]
+            [InlineKeyboardButton("🔘 Single Choice", callback_data=self.router.encode("question_type_single", questionnaire_id))],
+            [InlineKeyboardButton("☑️ Multiple Choice", callback_data=self.router.encode("question_type_multiple", questionnaire_id))],
+            [InlineKeyboardButton("📝 Text Answer", callback_data=self.router.encode("question_type_text", questionnaire_id))],
+            [InlineKeyboardButton("🔢 Number", callback_data=self.router.encode("question_type_number", questionnaire_id)),
+             InlineKeyboardButton("⭐ Rating", callback_data=self.router.encode("question_type_rating", questionnaire_id)),
+             InlineKeyboardButton("📅 Date", callback_data=self.router.encode("question_type_date", questionnaire_id))],
+            [InlineKeyboardButton("🔙 Back to Menu", callback_data=self.router.encode("back_to_menu", questionnaire_id))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -454,32 +635,28 @@ Use /help for more information."""
             "❓ **Select Question Type:**\n\n"
             "🔘 **Single Choice** - User selects one option\n"
             "☑️ **Multiple Choice** - User can select multiple options\n"
-            "📝 **Text Answer** - User types a free-form answer",
+            "📝 **Text Answer** - User types a free-form answer\n"
+            "🔢 **Number** - User replies with a number\n"
+            "⭐ **Rating** - User picks a point on a scale whose labels you enter\n"
+            "📅 **Date** - User replies with a date",
             reply_markup=reply_markup,
             parse_mode=ParseMode.MARKDOWN
         )
     
-    async def handle_question_type_selection(self, query, data, user):
-        """Handle question type selection"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        parts = data.split("_")
-        question_type = parts[2]  # single, multiple, or text
-        questionnaire_id = int(parts[3])
-        
+    async def handle_question_type_selection(self, query, user, context, questionnaire_id: int, question_type: str):
+        """Handle question type selection (question_type is a CREATION_QUESTION_TYPES key)"""
         # Update user state
         if user.id in self.user_states:
             self.user_states[user.id]['step'] = 'question_text'
             self.user_states[user.id]['data']['current_question_type'] = question_type
             self.user_states[user.id]['data']['current_questionnaire_id'] = questionnaire_id
         
-        type_name = {"single": "Single Choice", "multiple": "Multiple Choice", "text": "Text Answer"}[question_type]
+        type_name = {"single": "Single Choice", "multiple": "Multiple Choice", "text": "Text Answer",
+                     "number": "Number", "rating": "Rating", "date": "Date"}[question_type]
         
         keyboard = [
-            [InlineKeyboardButton("🔄 Change Type", callback_data=f"add_question_{questionnaire_id}")],
-            [InlineKeyboardButton("🔙 Back to Menu", callback_data=f"back_to_menu_{questionnaire_id}")]
+            [InlineKeyboardButton("🔄 Change Type", callback_data=self.router.encode("add_question", questionnaire_id))],
+            [InlineKeyboardButton("🔙 Back to Menu", callback_data=self.router.encode("back_to_menu", questionnaire_id))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -490,6 +667,7 @@ Use /help for more information."""
             parse_mode=ParseMode.MARKDOWN
         )
     
+    @handler_timer("text_message")
     async def handle_text_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle text messages based on user state"""
         user = update.effective_user
@@ -507,9 +685,10 @@ Use /help for more information."""
             elif state['action'] == 'answering_questionnaire':
                 await self.handle_questionnaire_answering(update, context, state, message_text)
         except Exception as e:
-            logger.error(f"Error handling text message: {e}")
+            logger.exception("Error handling text message: %s", e)
             await update.message.reply_text("❌ An error occurred. Please try again.")
     
+    @handler_timer("creation")
     async def handle_questionnaire_creation(self, update, context, state, message_text):
         """Handle questionnaire creation steps"""
         user = update.effective_user
@@ -518,7 +697,7 @@ Use /help for more information."""
             state['data']['title'] = message_text
             state['step'] = 'description'
             
-            keyboard = [[InlineKeyboardButton("🔄 Cancel Creation", callback_data="cancel_creation")]]
+            keyboard = [[InlineKeyboardButton("🔄 Cancel Creation", callback_data=self.router.encode("cancel_creation"))]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
             await update.message.reply_text(
@@ -547,9 +726,9 @@ Use /help for more information."""
             
             # Show questions menu
             keyboard = [
-                [InlineKeyboardButton("➕ Add Question", callback_data=f"add_question_{questionnaire_id}")],
-                [InlineKeyboardButton("✅ Finish Questionnaire", callback_data=f"finish_questionnaire_{questionnaire_id}")],
-                [InlineKeyboardButton("🔄 Cancel", callback_data="cancel_creation")]
+                [InlineKeyboardButton("➕ Add Question", callback_data=self.router.encode("add_question", questionnaire_id))],
+                [InlineKeyboardButton("✅ Finish Questionnaire", callback_data=self.router.encode("finish_questionnaire", questionnaire_id))],
+                [InlineKeyboardButton("🔄 Cancel", callback_data=self.router.encode("cancel_creation"))]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
@@ -569,14 +748,14 @@ Use /help for more information."""
             
             state['data']['current_question_text'] = message_text
             
-            if question_type in ['single', 'multiple']:
-                # Need to collect options
+            if question_type in ['single', 'multiple', 'rating']:
+                # Need to collect options (the scale labels, lowest first, for ratings)
                 state['step'] = 'question_options'
                 state['data']['current_options'] = []
                 
                 keyboard = [
-                    [InlineKeyboardButton("🔄 Change Question", callback_data=f"add_question_{questionnaire_id}")],
-                    [InlineKeyboardButton("🔙 Back to Menu", callback_data=f"back_to_menu_{questionnaire_id}")]
+                    [InlineKeyboardButton("🔄 Change Question", callback_data=self.router.encode("add_question", questionnaire_id))],
+                    [InlineKeyboardButton("🔙 Back to Menu", callback_data=self.router.encode("back_to_menu", questionnaire_id))]
                 ]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 
@@ -589,18 +768,12 @@ Use /help for more information."""
                     parse_mode=ParseMode.MARKDOWN
                 )
             else:
-                # Text question - save directly
-                question_type_enum = QuestionType.TEXT
+                # Text, number and date questions - save directly
+                question_type_enum = CREATION_QUESTION_TYPES[question_type]
                 
-                question_id = self.db.add_question(
-                    questionnaire_id=questionnaire_id,
-                    question_text=message_text,
-                    question_type=question_type_enum,
-                    options=None,
-                    is_required=True
-                )
+                self.add_created_question(user.id, questionnaire_id, message_text, question_type_enum)
                 
-                await update.message.reply_text(f"✅ Text question added successfully!")
+                await update.message.reply_text(f"✅ {question_type_enum.value.title()} question added successfully!")
                 
                 # Return to questions menu
                 await self.show_questions_menu_after_creation(update, questionnaire_id)
@@ -615,9 +788,9 @@ Use /help for more information."""
             options_text = "\n".join([f"{i+1}. {opt}" for i, opt in enumerate(options)])
             
             keyboard = [
-                [InlineKeyboardButton("✅ Finish Options", callback_data=f"finish_options_{questionnaire_id}")],
-                [InlineKeyboardButton("🔄 Restart Question", callback_data=f"add_question_{questionnaire_id}")],
-                [InlineKeyboardButton("🔙 Back to Menu", callback_data=f"back_to_menu_{questionnaire_id}")]
+                [InlineKeyboardButton("✅ Finish Options", callback_data=self.router.encode("finish_options", questionnaire_id))],
+                [InlineKeyboardButton("🔄 Restart Question", callback_data=self.router.encode("add_question", questionnaire_id))],
+                [InlineKeyboardButton("🔙 Back to Menu", callback_data=self.router.encode("back_to_menu", questionnaire_id))]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
@@ -632,7 +805,7 @@ Use /help for more information."""
     
     async def show_questions_menu_after_creation(self, update, questionnaire_id):
         """Show questions menu after creating a question"""
-        questions = self.db.get_questions(questionnaire_id)
+        questions = self.creation_questions(update.effective_user.id, questionnaire_id)
         questionnaire = self.db.get_questionnaire(questionnaire_id)
         
         message = f"📝 **{questionnaire.title}**\n\n"
@@ -641,27 +814,21 @@ Use /help for more information."""
         if questions:
             message += "**Recent Questions:**\n"
             for i, q in enumerate(questions[-3:]):  # Show last 3
-                type_icon = {"single_choice": "🔘", "multiple_choice": "☑️", "text": "📝"}.get(q.question_type.value, "❓")
+                type_icon = QUESTION_TYPE_ICONS.get(q.question_type.value, "❓")
                 message += f"{len(questions)-2+i}. {type_icon} {q.question_text}\n"
             message += "\n"
         
         keyboard = [
-            [InlineKeyboardButton("➕ Add Another Question", callback_data=f"add_question_{questionnaire_id}")],
-            [InlineKeyboardButton("✅ Finish Questionnaire", callback_data=f"finish_questionnaire_{questionnaire_id}")],
-            [InlineKeyboardButton("🔄 Cancel", callback_data="cancel_creation")]
+            [InlineKeyboardButton("➕ Add Another Question", callback_data=self.router.encode("add_question", questionnaire_id))],
+            [InlineKeyboardButton("✅ Finish Questionnaire", callback_data=self.router.encode("finish_questionnaire", questionnaire_id))],
+            [InlineKeyboardButton("🔄 Cancel", callback_data=self.router.encode("cancel_creation"))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await update.message.reply_text(message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
     
-    async def handle_finish_options(self, query, data, user):
+    async def handle_finish_options(self, query, user, context, questionnaire_id: int):
         """Handle finishing options for a question"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        questionnaire_id = int(data.split("_")[-1])
-        
         if user.id not in self.user_states:
             await query.edit_message_text("❌ No active question creation session.")
             return
@@ -670,31 +837,25 @@ Use /help for more information."""
         options = state['data']['current_options']
         
         if len(options) < 2:
-            await query.edit_message_text("❌ You need at least 2 options for choice questions.")
+            await query.edit_message_text("❌ You need at least 2 options for choice and rating questions.")
             return
         
         # Save the question
         question_type = state['data']['current_question_type']
         question_text = state['data']['current_question_text']
         
-        question_type_enum = QuestionType.SINGLE_CHOICE if question_type == 'single' else QuestionType.MULTIPLE_CHOICE
+        question_type_enum = CREATION_QUESTION_TYPES[question_type]
         
-        question_id = self.db.add_question(
-            questionnaire_id=questionnaire_id,
-            question_text=question_text,
-            question_type=question_type_enum,
-            options=options,
-            is_required=True
-        )
+        self.add_created_question(user.id, questionnaire_id, question_text, question_type_enum, options)
         
         await query.edit_message_text(f"✅ {question_type_enum.value.replace('_', ' ').title()} question added successfully!")
         
         # Return to questions menu
-        await self.show_questions_menu_after_callback(query, questionnaire_id)
+        await self.show_questions_menu_after_callback(query, questionnaire_id, user.id)
     
-    async def show_questions_menu_after_callback(self, query, questionnaire_id):
+    async def show_questions_menu_after_callback(self, query, questionnaire_id, user_id: int):
         """Show questions menu after callback action"""
-        questions = self.db.get_questions(questionnaire_id)
+        questions = self.creation_questions(user_id, questionnaire_id)
         questionnaire = self.db.get_questionnaire(questionnaire_id)
         
         message = f"📝 **{questionnaire.title}**\n\n"
@@ -703,32 +864,50 @@ Use /help for more information."""
         if questions:
             message += "**Questions:**\n"
             for i, q in enumerate(questions):
-                type_icon = {"single_choice": "🔘", "multiple_choice": "☑️", "text": "📝"}.get(q.question_type.value, "❓")
+                type_icon = QUESTION_TYPE_ICONS.get(q.question_type.value, "❓")
                 message += f"{i+1}. {type_icon} {q.question_text}\n"
             message += "\n"
         
         keyboard = [
-            [InlineKeyboardButton("➕ Add Question", callback_data=f"add_question_{questionnaire_id}")],
-            [InlineKeyboardButton("✅ Finish Questionnaire", callback_data=f"finish_questionnaire_{questionnaire_id}")],
-            [InlineKeyboardButton("🔄 Cancel", callback_data="cancel_creation")]
+            [InlineKeyboardButton("➕ Add Question", callback_data=self.router.encode("add_question", questionnaire_id))],
+            [InlineKeyboardButton("✅ Finish Questionnaire", callback_data=self.router.encode("finish_questionnaire", questionnaire_id))],
+            [InlineKeyboardButton("🔄 Cancel", callback_data=self.router.encode("cancel_creation"))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
     
-    async def handle_finish_questionnaire(self, query, data, user):
+    async def handle_finish_questionnaire(self, query, user, context, questionnaire_id: int):
         """Handle finishing questionnaire creation"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        questionnaire_id = int(data.split("_")[-1])
-        questions = self.db.get_questions(questionnaire_id)
+        questions = self.creation_questions(user.id, questionnaire_id)
         
         if not questions:
             await query.edit_message_text("❌ You must add at least one question before finishing.")
             return
         
+        state = self.user_states.get(user.id)
+        if state and state['data'].get('pending_questions'):
+            # Additions to a questionnaire activated meanwhile go live together, as a single new version
+            errors = branching_errors(question_steps(questions))
+            if errors:
+                await query.edit_message_text("❌ Cannot publish, the branching needs fixing:\n" +
+                                              "\n".join(f"• {error}" for error in errors[:10]))
+                return
+            questionnaire = self.db.get_questionnaire(questionnaire_id)
+            version = self.db.update_questionnaire(
+                questionnaire_id, questionnaire.title, questionnaire.description,
+                [(q.question_text, q.question_type, q.options, q.is_required, q.branches) for q in questions]
+            )
+            del self.user_states[user.id]
+            await query.edit_message_text(
+                f"✅ **Questions Published**\n\n"
+                f"📋 **{questionnaire.title}**\n"
+                f"❓ Questions: {len(questions)}\n"
+                f"🔢 Version: {version}\n\n"
+                f"People already answering keep the version they started."
+            )
+            return
+        
         # Clean up user state
         if user.id in self.user_states:
             del self.user_states[user.id]
@@ -743,28 +922,30 @@ Use /help for more information."""
             f"Your questionnaire is ready! Use /my_questionnaires to activate it and get the sharing link."
         )
     
-    async def handle_activate_questionnaire(self, query, data, user, context):
+    async def handle_activate_questionnaire(self, query, user, context, questionnaire_id: int):
         """Handle questionnaire activation with link generation"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        questionnaire_id = int(data.split("_")[-1])
-        
         # Check if questionnaire has questions
         questions = self.db.get_questions(questionnaire_id)
         if not questions:
             await query.edit_message_text("❌ Cannot activate questionnaire without questions.")
             return
         
+        # Branching must reach every question and always lead to the end
+        errors = branching_errors(question_steps(questions))
+        if errors:
+            await query.edit_message_text("❌ Cannot activate, the branching needs fixing:\n" +
+                                          "\n".join(f"• {error}" for error in errors[:10]))
+            return
+        
         # Get bot username if not cached
         if not self.bot_username:
             bot_info = await context.bot.get_me()
             self.bot_username = bot_info.username
         
-        # Activate questionnaire
+        # Activate questionnaire and compile the version respondents will get
         self.db.update_questionnaire_status(questionnaire_id, QuestionnaireStatus.ACTIVE)
         questionnaire = self.db.get_questionnaire(questionnaire_id)
+        self.questionnaire_cache.get(questionnaire_id, questionnaire.version)
         
         # Generate link and QR code
         survey_link = generate_questionnaire_link(self.bot_username, questionnaire_id)
@@ -786,13 +967,8 @@ Use /help for more information."""
         
         await query.edit_message_text("🎉 Questionnaire activated! Check the message above for the link and QR code.")
     
-    async def handle_get_link_callback(self, query, data, user, context):
+    async def handle_get_link_callback(self, query, user, context, questionnaire_id: int):
         """Handle getting link and QR code for active questionnaire"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        questionnaire_id = int(data.split("_")[-1])
         questionnaire = self.db.get_questionnaire(questionnaire_id)
         
         if questionnaire.status != QuestionnaireStatus.ACTIVE:
@@ -823,13 +999,8 @@ Use /help for more information."""
         
         await query.edit_message_text("📤 Link and QR code sent! Check the message above.")
     
-    async def handle_delete_questionnaire_callback(self, query, data, user):
+    async def handle_delete_questionnaire_callback(self, query, user, context, questionnaire_id: int):
         """Handle delete questionnaire callback - show confirmation"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        questionnaire_id = int(data.split("_")[-1])
         questionnaire = self.db.get_questionnaire(questionnaire_id)
         
         if not questionnaire:
@@ -854,20 +1025,15 @@ Use /help for more information."""
         warning_message += f"Are you sure you want to delete this questionnaire?"
         
         keyboard = [
-            [InlineKeyboardButton("🗑️ Yes, Delete Forever", callback_data=f"confirm_delete_{questionnaire_id}")],
-            [InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_delete_{questionnaire_id}")]
+            [InlineKeyboardButton("🗑️ Yes, Delete Forever", callback_data=self.router.encode("confirm_delete", questionnaire_id))],
+            [InlineKeyboardButton("❌ Cancel", callback_data=self.router.encode("cancel_delete", questionnaire_id))]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(warning_message, reply_markup=reply_markup)
     
-    async def handle_confirm_delete_callback(self, query, data, user):
+    async def handle_confirm_delete_callback(self, query, user, context, questionnaire_id: int):
         """Handle confirmed delete action"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        questionnaire_id = int(data.split("_")[-1])
         questionnaire = self.db.get_questionnaire(questionnaire_id)
         
         if not questionnaire:
@@ -881,20 +1047,80 @@ Use /help for more information."""
             if success:
                 await query.edit_message_text(
                     f"✅ Questionnaire Deleted Successfully\n\n"
-                    f"📋 '{questionnaire.title}' has been permanently deleted.\n"
-                    f"All associated questions, responses, and data have been removed.\n\n"
+                    f"📋 '{questionnaire.title}' has been deleted.\n"
+                    f"Its questions, responses, and data are being removed in the background.\n\n"
                     f"Use /my_questionnaires to view your remaining questionnaires."
                 )
+                self.start_purge(questionnaire_id, questionnaire.title, query)
             else:
                 await query.edit_message_text("❌ Failed to delete questionnaire. You may not have permission.")
                 
         except Exception as e:
-            logger.error(f"Error deleting questionnaire {questionnaire_id}: {e}")
+            logger.error("Error deleting questionnaire %s: %s", questionnaire_id, e)
             await query.edit_message_text("❌ An error occurred while deleting the questionnaire. Please try again.")
     
-    async def handle_cancel_delete_callback(self, query, data, user):
+    def start_purge(self, questionnaire_id: int, title: str = None, query=None):
+        """Purge a soft-deleted questionnaire in the background"""
+        # Plain asyncio tasks so shutdown can cancel them; each batch is its own transaction
+        task = asyncio.get_running_loop().create_task(self.purge_questionnaire(questionnaire_id, title, query))
+        self.purge_tasks.add(task)
+        task.add_done_callback(self.purge_tasks.discard)
+    
+    async def purge_questionnaire(self, questionnaire_id: int, title: str = None, query=None):
+        """Delete a questionnaire's rows in bounded batches, then reclaim the freed pages"""
+        batch_size = getattr(Config, 'PURGE_BATCH_SIZE', 500)
+        pause = getattr(Config, 'PURGE_BATCH_PAUSE', 0.05)
+        vacuum_pages = getattr(Config, 'PURGE_VACUUM_PAGES', 200)
+        
+        try:
+            total = await asyncio.to_thread(self.db.count_questionnaire_rows, questionnaire_id)
+            purged = 0
+            reported_at = time.monotonic()
+            
+            while True:
+                deleted = await asyncio.to_thread(self.db.purge_questionnaire_batch, questionnaire_id, batch_size)
+                if not deleted:
+                    break
+                purged += deleted
+                
+                if query and time.monotonic() - reported_at >= PURGE_PROGRESS_INTERVAL:
+                    reported_at = time.monotonic()
+                    await self.report_purge(query, f"🗑️ Deleting '{title}'...\n\n"
+                                                   f"{purged}/{total} rows removed ({purged * 100 // max(total, 1)}%)")
+                # Let respondents' writes take the lock between batches
+                await asyncio.sleep(pause)
+            
+            free_pages = None
+            while vacuum_pages:
+                remaining = await asyncio.to_thread(self.db.incremental_vacuum, vacuum_pages)
+                # Stop once nothing is left or a step frees nothing (auto_vacuum not in effect)
+                if not remaining or (free_pages is not None and remaining >= free_pages):
+                    break
+                free_pages = remaining
+                await asyncio.sleep(pause)
+            
+            logger.info("Purged questionnaire %s (%s rows)", questionnaire_id, purged,
+                        extra={'questionnaire_id': questionnaire_id})
+            if query:
+                await self.report_purge(query, f"✅ Questionnaire Deleted Successfully\n\n"
+                                               f"📋 '{title}' has been permanently deleted.\n"
+                                               f"All {purged} associated rows have been removed.\n\n"
+                                               f"Use /my_questionnaires to view your remaining questionnaires.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The questionnaire stays soft-deleted and is picked up again on the next start
+            logger.error("Purging questionnaire %s failed: %s", questionnaire_id, e, exc_info=True)
+    
+    async def report_purge(self, query, text: str):
+        """Edit the deletion message with purge progress"""
+        try:
+            await query.edit_message_text(text)
+        except Exception as e:
+            logger.warning("Could not report purge progress: %s", e)
+    
+    async def handle_cancel_delete_callback(self, query, user, context, questionnaire_id: int):
         """Handle cancelled delete action"""
-        questionnaire_id = int(data.split("_")[-1])
         questionnaire = self.db.get_questionnaire(questionnaire_id)
         
         if questionnaire:
@@ -906,12 +1132,15 @@ Use /help for more information."""
         else:
             await query.edit_message_text("❌ Deletion cancelled.")
     
+    @handler_timer("answering")
     async def handle_questionnaire_answering(self, update, context, state, message_text):
         """Handle questionnaire answering process"""
         user = update.effective_user
-        questions = state['questions']
+        compiled = state['compiled']
+        questions = compiled.questions
         current_index = state['current_question_index']
         current_question = questions[current_index]
+        selected_option = None
         
         try:
             if current_question.question_type == QuestionType.SINGLE_CHOICE:
@@ -930,7 +1159,7 @@ Use /help for more information."""
                     else:
                         raise ValueError("Invalid option")
                 except ValueError:
-                    keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=f"restart_survey_{state['questionnaire_id']}")]]
+                    keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=self.router.encode("restart_survey", state['questionnaire_id']))]]
                     reply_markup = InlineKeyboardMarkup(keyboard)
                     
                     await update.message.reply_text(
@@ -962,7 +1191,7 @@ Use /help for more information."""
                         selected_options=selected_options
                     )
                 except ValueError:
-                    keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=f"restart_survey_{state['questionnaire_id']}")]]
+                    keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=self.router.encode("restart_survey", state['questionnaire_id']))]]
                     reply_markup = InlineKeyboardMarkup(keyboard)
                     
                     await update.message.reply_text(
@@ -972,9 +1201,26 @@ Use /help for more information."""
                     )
                     return
                     
+            elif current_question.question_type in NUMERIC_TYPES:
+                try:
+                    typed_answer = parse_typed_answer(current_question, message_text)
+                except ValueError as e:
+                    keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=self.router.encode("restart_survey", state['questionnaire_id']))]]
+                    reply_markup = InlineKeyboardMarkup(keyboard)
+                    
+                    await update.message.reply_text(f"❌ {e}", reply_markup=reply_markup)
+                    return
+                
+                self.db.save_response(
+                    questionnaire_id=state['questionnaire_id'],
+                    user_id=user.id,
+                    question_id=current_question.id,
+                    **typed_answer
+                )
+                    
             else:  # TEXT question
                 if not message_text.strip():
-                    keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=f"restart_survey_{state['questionnaire_id']}")]]
+                    keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=self.router.encode("restart_survey", state['questionnaire_id']))]]
                     reply_markup = InlineKeyboardMarkup(keyboard)
                     
                     await update.message.reply_text(
@@ -990,8 +1236,8 @@ Use /help for more information."""
                     answer_text=message_text.strip()
                 )
             
-            # Move to next question or complete
-            next_index = current_index + 1
+            # Move to the question the answer branches to, or complete
+            next_index = compiled.next_index(current_index, selected_option)
             
             if next_index >= len(questions):
                 # Complete questionnaire
@@ -1006,17 +1252,16 @@ Use /help for more information."""
             else:
                 # Show next question
                 state['current_question_index'] = next_index
-                next_question = questions[next_index]
-                question_text = self.format_question_for_display(next_question, next_index + 1, len(questions))
+                question_text = compiled.prompts[next_index]
                 
-                keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=f"restart_survey_{state['questionnaire_id']}")]]
+                keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=self.router.encode("restart_survey", state['questionnaire_id']))]]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 
                 await update.message.reply_text(question_text, reply_markup=reply_markup)
                 
         except Exception as e:
-            logger.error(f"Error saving response: {e}")
-            keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=f"restart_survey_{state['questionnaire_id']}")]]
+            logger.exception("Error saving response: %s", e)
+            keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=self.router.encode("restart_survey", state['questionnaire_id']))]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
             await update.message.reply_text(
@@ -1024,10 +1269,8 @@ Use /help for more information."""
                 reply_markup=reply_markup
             )
     
-    async def handle_restart_survey(self, query, data, user):
+    async def handle_restart_survey(self, query, user, context, questionnaire_id: int):
         """Handle survey restart"""
-        questionnaire_id = int(data.split("_")[-1])
-        
         # Clear any existing state
         if user.id in self.user_states:
             del self.user_states[user.id]
@@ -1039,27 +1282,27 @@ Use /help for more information."""
             await query.edit_message_text("❌ This survey is not currently available.")
             return
         
-        questions = self.db.get_questions(questionnaire_id)
-        if not questions:
+        # A restart starts over on the current version
+        compiled = self.questionnaire_cache.get(questionnaire_id, questionnaire.version)
+        if not compiled:
             await query.edit_message_text("❌ This survey has no questions.")
             return
         
         # Start fresh questionnaire response
-        self.db.start_questionnaire_response(questionnaire_id, user.id)
+        self.db.start_questionnaire_response(questionnaire_id, user.id, compiled.version)
         
         # Set user state for answering questions
         self.user_states[user.id] = {
             'action': 'answering_questionnaire',
             'questionnaire_id': questionnaire_id,
             'current_question_index': 0,
-            'questions': questions
+            'compiled': compiled
         }
         
         # Show first question
-        first_question = questions[0]
-        question_text = self.format_question_for_display(first_question, 1, len(questions))
+        question_text = compiled.prompts[0]
         
-        keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=f"restart_survey_{questionnaire_id}")]]
+        keyboard = [[InlineKeyboardButton("🔄 Restart Survey", callback_data=self.router.encode("restart_survey", questionnaire_id))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(
@@ -1068,12 +1311,8 @@ Use /help for more information."""
         )
     
     # Additional admin methods (simplified for brevity)
-    async def list_my_questionnaires_from_callback(self, query, user):
+    async def list_my_questionnaires_from_callback(self, query, user, context):
         """List questionnaires from callback - simplified"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
         questionnaires = self.db.get_questionnaires_by_admin(user.id)
         
         if not questionnaires:
@@ -1088,12 +1327,8 @@ Use /help for more information."""
         
         await query.edit_message_text(message, parse_mode=ParseMode.MARKDOWN)
     
-    async def view_results_from_callback(self, query, user):
+    async def view_results_from_callback(self, query, user, context):
         """View results from callback - simplified"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
         questionnaires = self.db.get_questionnaires_by_admin(user.id)
         
         if not questionnaires:
@@ -1106,17 +1341,13 @@ Use /help for more information."""
         for q in questionnaires:
             stats = self.db.get_questionnaire_stats(q.id)
             message += f"📋 {q.title} - {stats['total_completed']} responses\n"
-            keyboard.append([InlineKeyboardButton(f"📊 {q.title}", callback_data=f"results_{q.id}")])
+            keyboard.append([InlineKeyboardButton(f"📊 {q.title}", callback_data=self.router.encode("results", q.id))])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
     
-    async def export_results_from_callback(self, query, user):
+    async def export_results_from_callback(self, query, user, context):
         """Export results from callback - simplified"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
         questionnaires = self.db.get_questionnaires_by_admin(user.id)
         
         if not questionnaires:
@@ -1129,48 +1360,50 @@ Use /help for more information."""
         for q in questionnaires:
             stats = self.db.get_questionnaire_stats(q.id)
             message += f"📋 {q.title} - {stats['total_completed']} responses\n"
-            keyboard.append([InlineKeyboardButton(f"📤 {q.title}", callback_data=f"export_{q.id}")])
+            keyboard.append([InlineKeyboardButton(f"📤 {q.title}", callback_data=self.router.encode("export", q.id))])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(message, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
     
-    async def handle_close_questionnaire(self, query, data, user):
+    async def handle_close_questionnaire(self, query, user, context, questionnaire_id: int):
         """Handle questionnaire closing"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        questionnaire_id = int(data.split("_")[-1])
         self.db.update_questionnaire_status(questionnaire_id, QuestionnaireStatus.CLOSED)
         await query.edit_message_text("🔒 Questionnaire closed successfully!")
     
-    async def handle_view_results_callback(self, query, data, user):
+    async def handle_view_results_callback(self, query, user, context, questionnaire_id: int):
         """Handle view results callback"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        questionnaire_id = int(data.split("_")[-1])
+        # Reads and formatting run in a worker thread so answers keep flowing meanwhile
+        summary = await asyncio.to_thread(self.build_results_summary, questionnaire_id)
+        await query.edit_message_text(summary, parse_mode=ParseMode.MARKDOWN)
+    
+    def build_results_summary(self, questionnaire_id: int) -> str:
+        """Read a questionnaire's results and format the summary message (blocking)"""
         questionnaire = self.db.get_questionnaire(questionnaire_id)
         responses = self.db.get_questionnaire_responses(questionnaire_id)
+        questions = self.db.get_question_history(questionnaire_id)
+        top_terms = self.db.get_top_terms(questionnaire_id, limit=getattr(Config, 'TEXT_TOP_TERMS', 5))
+        option_stats = self.db.get_option_stats(questionnaire_id)
+        numeric_stats = self.db.get_numeric_stats(questionnaire_id)
         
-        summary = format_response_summary(responses, questionnaire.title)
-        await query.edit_message_text(summary, parse_mode=ParseMode.MARKDOWN)
+        return format_response_summary(responses, questionnaire.title, questions, top_terms, option_stats,
+                                       numeric_stats)
     
-    async def handle_export_callback(self, query, data, user, context):
-        """Handle export callback"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
-        questionnaire_id = int(data.split("_")[-1])
+    def build_export(self, questionnaire_id: int):
+        """Read a questionnaire's results and write the Excel export (blocking)"""
         questionnaire = self.db.get_questionnaire(questionnaire_id)
-        questions = self.db.get_questions(questionnaire_id)
+        questions = self.db.get_question_history(questionnaire_id)
         responses = self.db.get_questionnaire_responses(questionnaire_id)
         
+        export_started = time.perf_counter()
+        filepath = export_to_excel(questionnaire.title, responses, questions)
+        EXPORT_DURATION.observe(time.perf_counter() - export_started)
+        return questionnaire, filepath
+    
+    async def handle_export_callback(self, query, user, context, questionnaire_id: int):
+        """Handle export callback"""
         try:
-            # Export to Excel
-            filepath = export_to_excel(questionnaire.title, responses, questions)
+            # Every read and the workbook build run in a worker thread, off the event loop
+            questionnaire, filepath = await asyncio.to_thread(self.build_export, questionnaire_id)
             
             # Send file
             await query.edit_message_text("📤 Preparing export...")
@@ -1186,10 +1419,11 @@ Use /help for more information."""
             await query.edit_message_text("✅ Export completed and sent!")
             
         except Exception as e:
-            logger.error(f"Export error: {e}")
+            logger.exception("Export error: %s", e)
             await query.edit_message_text("❌ Error creating export file.")
     
     # Simplified admin commands for direct access
+    @handler_timer("view_results")
     async def view_results(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """View questionnaire results (admin only)"""
         user = update.effective_user
@@ -1200,6 +1434,7 @@ Use /help for more information."""
         
         await update.message.reply_text("Use /admin panel for better interface, or see individual questionnaire results in /my_questionnaires")
     
+    @handler_timer("export_results")
     async def export_results(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Export questionnaire results (admin only)"""
         user = update.effective_user
@@ -1210,6 +1445,7 @@ Use /help for more information."""
         
         await update.message.reply_text("Use /admin panel for better interface, or export from /my_questionnaires")
     
+    @handler_timer("delete_questionnaire")
     async def delete_questionnaire_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Delete questionnaire command (admin only)"""
         user = update.effective_user
@@ -1231,17 +1467,13 @@ Use /help for more information."""
             stats = self.db.get_questionnaire_stats(q.id)
             status_icon = {'draft': '📝', 'active': '✅', 'closed': '🔒'}.get(q.status.value, '❓')
             message += f"{status_icon} {q.title} - {stats['total_completed']} responses\n"
-            keyboard.append([InlineKeyboardButton(f"🗑️ {q.title}", callback_data=f"delete_{q.id}")])
+            keyboard.append([InlineKeyboardButton(f"🗑️ {q.title}", callback_data=self.router.encode("delete", q.id))])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         await update.message.reply_text(message, reply_markup=reply_markup)
     
-    async def delete_questionnaire_from_callback(self, query, user):
+    async def delete_questionnaire_from_callback(self, query, user, context):
         """Delete questionnaire from admin callback"""
-        if not Config.is_admin(user.id):
-            await query.edit_message_text("❌ Access denied. Admin privileges required.")
-            return
-        
         questionnaires = self.db.get_questionnaires_by_admin(user.id)
         
         if not questionnaires:
@@ -1255,23 +1487,485 @@ Use /help for more information."""
             stats = self.db.get_questionnaire_stats(q.id)
             status_icon = {'draft': '📝', 'active': '✅', 'closed': '🔒'}.get(q.status.value, '❓')
             message += f"{status_icon} {q.title} - {stats['total_completed']} responses\n"
-            keyboard.append([InlineKeyboardButton(f"🗑️ {q.title}", callback_data=f"delete_{q.id}")])
+            keyboard.append([InlineKeyboardButton(f"🗑️ {q.title}", callback_data=self.router.encode("delete", q.id))])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(message, reply_markup=reply_markup)
     
+    @handler_timer("profile")
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Profile update handling for N seconds or N updates (admin only)"""
+        user = update.effective_user
+        
+        if not Config.is_admin(user.id):
+            await update.message.reply_text("❌ Access denied. Admin privileges required.")
+            return
+        
+        args = [arg.lower() for arg in context.args or []]
+        flame = 'flame' in args
+        args = [arg for arg in args if arg != 'flame']
+        
+        try:
+            if len(args) == 2 and args[1] == 'updates':
+                seconds, max_updates = MAX_PROFILE_SECONDS, int(args[0])
+            elif len(args) <= 1:
+                seconds, max_updates = int(args[0]) if args else DEFAULT_PROFILE_SECONDS, None
+            else:
+                raise ValueError("Invalid arguments")
+            if not 0 < seconds <= MAX_PROFILE_SECONDS or (max_updates is not None and max_updates <= 0):
+                raise ValueError("Out of range")
+        except ValueError:
+            await update.message.reply_text(
+                f"❌ Usage: /profile [seconds] [flame] or /profile <N> updates [flame]\n"
+                f"Seconds must be between 1 and {MAX_PROFILE_SECONDS}."
+            )
+            return
+        
+        if not self.start_profiling(update.message.chat_id, context, seconds, max_updates, flame):
+            await update.message.reply_text("❌ A profiling session is already running.")
+            return
+        
+        limit = f"{max_updates} updates" if max_updates else f"{seconds} seconds"
+        await update.message.reply_text(f"🔬 Profiling started for {limit}. The report will be sent here.")
+    
+    async def profile_from_callback(self, query, user, context):
+        """Start a default-length profiling session from the admin panel"""
+        if not self.start_profiling(query.message.chat_id, context, DEFAULT_PROFILE_SECONDS, None, True):
+            await query.edit_message_text("❌ A profiling session is already running.")
+            return
+        
+        await query.edit_message_text(
+            f"🔬 Profiling started for {DEFAULT_PROFILE_SECONDS} seconds. The report will be sent here."
+        )
+    
+    @handler_timer("retention")
+    async def retention_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show the last retention report or run the policies now (admin only)"""
+        user = update.effective_user
+        
+        if not Config.is_admin(user.id):
+            await update.message.reply_text("❌ Access denied. Admin privileges required.")
+            return
+        
+        if context.args and context.args[0].lower() == 'run':
+            await update.message.reply_text("🧹 Running retention policies...")
+            report = await self.run_retention()
+        else:
+            report = self.retention_report
+        
+        if not report:
+            await update.message.reply_text("📋 No retention run yet. Use /retention run to start one.")
+            return
+        
+        await update.message.reply_text(report.format())
+    
+    @handler_timer("search")
+    async def search_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Full-text search a questionnaire's text answers (admin only)"""
+        user = update.effective_user
+        
+        if not Config.is_admin(user.id):
+            await update.message.reply_text("❌ Access denied. Admin privileges required.")
+            return
+        
+        args = context.args or []
+        query = ' '.join(args[1:])
+        if len(args) < 2 or not args[0].isdigit() or not parse_query(query):
+            await update.message.reply_text("❌ Usage: /search <questionnaire_id> <keywords>")
+            return
+        
+        questionnaire_id = int(args[0])
+        questionnaire = self.db.get_questionnaire(questionnaire_id)
+        if not questionnaire:
+            await update.message.reply_text("❌ Questionnaire not found.")
+            return
+        
+        self.search_queries[user.id] = (questionnaire_id, query)
+        text, reply_markup = self.search_results_page(questionnaire, query, 0)
+        await update.message.reply_text(text, reply_markup=reply_markup)
+    
+    async def handle_search_page_callback(self, query, user, context, questionnaire_id: int, page: int):
+        """Show another page of the admin's last search"""
+        questionnaire = self.db.get_questionnaire(questionnaire_id)
+        last_search = self.search_queries.get(user.id)
+        if not questionnaire or not last_search or last_search[0] != questionnaire_id:
+            await query.edit_message_text("❌ This search has expired. Please run /search again.")
+            return
+        
+        text, reply_markup = self.search_results_page(questionnaire, last_search[1], page)
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    
+    def search_results_page(self, questionnaire, query: str, page: int):
+        """Render one page of search results with previous/next buttons"""
+        total, results = self.db.search_responses(
+            questionnaire.id, query, limit=SEARCH_PAGE_SIZE, offset=page * SEARCH_PAGE_SIZE
+        )
+        text = format_search_results(questionnaire.title, query, total, results, parse_query(query),
+                                     page, SEARCH_PAGE_SIZE)
+        
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton(
+                "◀️ Previous", callback_data=self.router.encode("search_page", questionnaire.id, page - 1)))
+        if (page + 1) * SEARCH_PAGE_SIZE < total:
+            buttons.append(InlineKeyboardButton(
+                "Next ▶️", callback_data=self.router.encode("search_page", questionnaire.id, page + 1)))
+        
+        # Telegram messages are limited to 4096 characters
+        return text[:4096], InlineKeyboardMarkup([buttons]) if buttons else None
+    
+    @handler_timer("import_questionnaire")
+    async def import_questionnaire_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Explain the definition format for importing questionnaires (admin only)"""
+        user = update.effective_user
+        
+        if not Config.is_admin(user.id):
+            await update.message.reply_text("❌ Access denied. Admin privileges required.")
+            return
+        
+        await update.message.reply_text(
+            "📥 **Import Questionnaire**\n\n"
+            "Send a `.json`, `.yaml` or `.yml` file like this one:\n\n"
+            "```\n"
+            "title: Customer feedback\n"
+            "description: Tell us how we did\n"
+            "questions:\n"
+            "  - text: How did you hear about us?\n"
+            "    type: single_choice\n"
+            "    options: [Friend, Search, Ad]\n"
+            "    goto: {Ad: 3}\n"
+            "  - text: Who recommended us?\n"
+            "    type: text\n"
+            "    goto: end\n"
+            "  - text: Anything else?\n"
+            "    type: text\n"
+            "    required: false\n"
+            "```\n\n"
+            "Types: `single_choice`, `multiple_choice`, `text`, `number`, `rating` (options are the scale labels), `date`. "
+            "`goto` is optional skip logic: a question number or `end`, per option for single choice "
+            "(`*` for the other options). "
+            "The questionnaire is created as a draft; `/export_definition` gives the file for an existing one.\n\n"
+            "To edit one of your questionnaires, send the changed file with its ID as the caption. "
+            "Active questionnaires get a new version; respondents already answering finish the old one.",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    @handler_timer("import_definition")
+    async def handle_definition_upload(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Create a draft questionnaire from an uploaded definition file, or edit the one named in the caption (admin only)"""
+        user = update.effective_user
+        document = update.message.document
+        
+        if not Config.is_admin(user.id) or not is_definition_file(document.file_name):
+            return
+        
+        caption = (update.message.caption or '').strip()
+        target = None
+        if caption:
+            target = self.db.get_questionnaire(int(caption)) if caption.isdigit() else None
+            if not target or target.created_by != user.id:
+                await update.message.reply_text("❌ The caption must be the ID of one of your questionnaires.")
+                return
+        
+        if document.file_size and document.file_size > MAX_DEFINITION_BYTES:
+            await update.message.reply_text(f"❌ Definition files are limited to {MAX_DEFINITION_BYTES // 1024} KB.")
+            return
+        
+        file = await document.get_file()
+        content = await file.download_as_bytearray()
+        try:
+            title, description, questions = load_definition(bytes(content).decode('utf-8'), document.file_name)
+        except UnicodeDecodeError:
+            await update.message.reply_text("❌ Definition files must be UTF-8 text.")
+            return
+        except DefinitionError as e:
+            await update.message.reply_text(f"❌ {document.file_name} was not imported:\n{e.format()}")
+            return
+        
+        if target:
+            version = self.db.update_questionnaire(target.id, title, description, questions)
+            if version is None:
+                await update.message.reply_text("❌ Questionnaire not found.")
+            elif target.status == QuestionnaireStatus.DRAFT:
+                await update.message.reply_text(f"✅ Updated draft '{title}' ({len(questions)} questions).")
+            else:
+                await update.message.reply_text(
+                    f"✅ '{title}' is now version {version} ({len(questions)} questions).\n"
+                    "Respondents already answering finish the version they started."
+                )
+            return
+        
+        questionnaire_id = self.db.import_questionnaire(title, description, user.id, questions)
+        
+        keyboard = [[InlineKeyboardButton("🚀 Activate", callback_data=self.router.encode("activate", questionnaire_id))]]
+        await update.message.reply_text(
+            f"✅ Imported '{title}' with {len(questions)} questions as a draft.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
+    @handler_timer("export_definition")
+    async def export_definition_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Send a questionnaire's definition as a JSON or YAML file (admin only)"""
+        user = update.effective_user
+        
+        if not Config.is_admin(user.id):
+            await update.message.reply_text("❌ Access denied. Admin privileges required.")
+            return
+        
+        args = context.args or []
+        if not args or not args[0].isdigit() or args[1:] not in ([], ['json'], ['yaml']):
+            await update.message.reply_text("❌ Usage: /export_definition <questionnaire_id> [yaml]")
+            return
+        
+        questionnaire = self.db.get_questionnaire(int(args[0]))
+        if not questionnaire:
+            await update.message.reply_text("❌ Questionnaire not found.")
+            return
+        
+        yaml_format = args[1:] == ['yaml']
+        definition = export_definition(questionnaire, self.db.get_questions(questionnaire.id))
+        try:
+            content = dump_definition(definition, yaml_format=yaml_format)
+        except ImportError:
+            await update.message.reply_text("❌ YAML export needs PyYAML (pip install pyyaml); use JSON instead.")
+            return
+        
+        await update.message.reply_document(
+            document=BytesIO(content.encode('utf-8')),
+            filename=f"questionnaire_{questionnaire.id}.{'yaml' if yaml_format else 'json'}",
+            caption=f"📄 Definition of '{questionnaire.title}'"
+        )
+    
+    async def handle_clone_questionnaire(self, query, user, context, questionnaire_id: int):
+        """Copy a questionnaire and its questions into a new draft"""
+        questionnaire = self.db.get_questionnaire(questionnaire_id)
+        if not questionnaire:
+            await query.edit_message_text("❌ Questionnaire not found.")
+            return
+        
+        if questionnaire.created_by != user.id:
+            await query.edit_message_text("❌ You can only clone questionnaires you created.")
+            return
+        
+        clone_id = self.db.clone_questionnaire(questionnaire_id, user.id, title=f"{questionnaire.title} (copy)")
+        await self.report_new_draft(query, clone_id, f"✅ Cloned '{questionnaire.title}'")
+    
+    async def handle_save_template(self, query, user, context, questionnaire_id: int):
+        """Copy a questionnaire into the template library"""
+        questionnaire = self.db.get_questionnaire(questionnaire_id)
+        if not questionnaire:
+            await query.edit_message_text("❌ Questionnaire not found.")
+            return
+        
+        if questionnaire.created_by != user.id:
+            await query.edit_message_text("❌ You can only save questionnaires you created as templates.")
+            return
+        
+        if not self.db.clone_questionnaire(questionnaire_id, user.id, as_template=True):
+            await query.edit_message_text("❌ Questionnaire not found.")
+            return
+        
+        await query.edit_message_text(f"📚 '{questionnaire.title}' saved to the template library. Use /templates to start from it.")
+    
+    async def handle_use_template(self, query, user, context, questionnaire_id: int):
+        """Start a new draft questionnaire from a template"""
+        # Templates are shared between admins; other questionnaires only through their owner's clone
+        if questionnaire_id not in {template.id for template in self.db.get_templates()}:
+            await query.edit_message_text("❌ Template not found.")
+            return
+        
+        clone_id = self.db.clone_questionnaire(questionnaire_id, user.id)
+        if not clone_id:
+            await query.edit_message_text("❌ Template not found.")
+            return
+        
+        await self.report_new_draft(query, clone_id, "✅ Created from template")
+    
+    async def report_new_draft(self, query, questionnaire_id: int, heading: str):
+        """Show a freshly copied draft with the buttons to finish it"""
+        questionnaire = self.db.get_questionnaire(questionnaire_id)
+        questions = self.db.get_questions(questionnaire_id)
+        keyboard = [
+            [InlineKeyboardButton("🚀 Activate", callback_data=self.router.encode("activate", questionnaire_id))],
+            [InlineKeyboardButton("➕ Add Questions", callback_data=self.router.encode("restart_creation", questionnaire_id))],
+            [InlineKeyboardButton("🗑️ Delete", callback_data=self.router.encode("delete", questionnaire_id))]
+        ]
+        await query.edit_message_text(
+            f"{heading}: draft '{questionnaire.title}' with {len(questions)} questions.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
+    def templates_page(self, user_id: int):
+        """Template library message and its buttons; only the admin's own templates can be deleted"""
+        templates = self.db.get_templates()
+        if not templates:
+            return ("📚 The template library is empty. Use 📚 Save as Template in /my_questionnaires to add one.",
+                    None)
+        
+        message = "📚 Template Library\n\nPick a template to start a new draft:\n\n"
+        keyboard = []
+        for template in templates:
+            questions = self.db.get_questions(template.id)
+            message += f"• {template.title} ({len(questions)} questions)\n"
+            row = [InlineKeyboardButton(f"📝 {template.title}", callback_data=self.router.encode("use_template", template.id))]
+            if template.created_by == user_id:
+                row.append(InlineKeyboardButton("🗑️", callback_data=self.router.encode("delete", template.id)))
+            keyboard.append(row)
+        return message, InlineKeyboardMarkup(keyboard)
+    
+    @handler_timer("templates")
+    async def templates_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """List the template library (admin only)"""
+        user = update.effective_user
+        
+        if not Config.is_admin(user.id):
+            await update.message.reply_text("❌ Access denied. Admin privileges required.")
+            return
+        
+        message, reply_markup = self.templates_page(user.id)
+        await update.message.reply_text(message, reply_markup=reply_markup)
+    
+    async def templates_from_callback(self, query, user, context):
+        """List the template library from the admin panel"""
+        message, reply_markup = self.templates_page(user.id)
+        await query.edit_message_text(message, reply_markup=reply_markup)
+    
+    @handler_timer("slow_queries")
+    async def slow_queries_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show the slowest SQL statement fingerprints (admin only)"""
+        user = update.effective_user
+        
+        if not Config.is_admin(user.id):
+            await update.message.reply_text("❌ Access denied. Admin privileges required.")
+            return
+        
+        query_log = self.db.query_log
+        
+        if context.args and context.args[0].lower() == 'reset':
+            query_log.reset()
+            await update.message.reply_text("✅ Slow query statistics reset.")
+            return
+        
+        top = query_log.top()
+        if not top:
+            await update.message.reply_text("📋 No statements recorded yet.")
+            return
+        
+        message = f"🐢 Slowest statements (threshold {query_log.threshold_ms:.0f}ms)\n\n"
+        for i, stats in enumerate(top):
+            message += (
+                f"{i+1}. max {stats.max_ms:.1f}ms, avg {stats.avg_ms:.2f}ms, "
+                f"{stats.count} runs, {stats.slow_count} slow\n"
+                f"{stats.fingerprint[:300]}\n"
+                f"params: {stats.params_shape}\n"
+            )
+            if stats.plan:
+                message += f"plan: {stats.plan}\n"
+            message += "\n"
+        
+        # Telegram messages are limited to 4096 characters
+        await update.message.reply_text(message[:4096])
+    
+    def start_profiling(self, chat_id, context, seconds, max_updates, flame) -> bool:
+        """Start the sampling profiler unless a session is already running"""
+        if self.profiler and self.profiler.running:
+            return False
+        
+        self.profiler = SamplingProfiler(handler_files=[__file__])
+        self.profile_update_limit = max_updates
+        self.profile_done = asyncio.Event()
+        self.profiler.start()
+        logger.info("Profiling started: %ss, update limit %s", seconds, max_updates)
+        
+        context.application.create_task(self.finish_profiling(chat_id, context.bot, seconds, flame))
+        return True
+    
+    async def finish_profiling(self, chat_id, bot, seconds, flame):
+        """Stop the profiler after the time or update limit and send the report"""
+        try:
+            await asyncio.wait_for(self.profile_done.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        
+        profiler = self.profiler
+        profiler.stop()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        try:
+            await bot.send_document(
+                chat_id=chat_id,
+                document=BytesIO(profiler.report().encode('utf-8')),
+                filename=f"profile_{timestamp}.txt",
+                caption=f"🔬 Profile: {profiler.samples} samples, {profiler.updates} updates"
+            )
+            if flame:
+                await bot.send_document(
+                    chat_id=chat_id,
+                    document=BytesIO(profiler.collapsed_stacks().encode('utf-8')),
+                    filename=f"profile_{timestamp}.collapsed",
+                    caption="🔥 Collapsed stacks (flamegraph.pl / speedscope)"
+                )
+        except Exception as e:
+            logger.error("Error sending profile report: %s", e)
+    
+    async def track_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Set the logging context, skip redeliveries, enforce rate limits and count the update while profiling"""
+        user = update.effective_user
+        set_update_context(update.update_id, user.id if user else None)
+        
+        if self.deduplicator.seen(update.update_id):
+            DUPLICATE_UPDATES.inc()
+            logger.info("Skipping duplicate update %s", update.update_id)
+            raise ApplicationHandlerStop
+        if time.monotonic() - self.dedup_persisted_at >= self.dedup_persist_interval:
+            self.persist_update_mark()
+        
+        throttled = self.rate_limiter.check(user.id if user else None, exempt=bool(user) and Config.is_admin(user.id))
+        if throttled:
+            THROTTLED_UPDATES.inc(throttled)
+            if throttled == 'user' and self.rate_limiter.should_warn(user.id):
+                await self.warn_throttled(update)
+            # Stop all remaining handler groups for this update
+            raise ApplicationHandlerStop
+        
+        profiler = self.profiler
+        if not profiler or not profiler.running:
+            return
+        
+        profiler.record_update()
+        if self.profile_update_limit and profiler.updates >= self.profile_update_limit:
+            self.profile_done.set()
+    
+    async def warn_throttled(self, update: Update):
+        """Tell a flooding user to slow down"""
+        message = "⏳ You're sending messages too fast. Please wait a moment."
+        try:
+            if update.callback_query:
+                await update.callback_query.answer(message)
+            elif update.effective_message:
+                await update.effective_message.reply_text(message)
+        except Exception as e:
+            logger.warning("Could not send throttle warning: %s", e)
+    
     def run(self):
         """Run the bot"""
         logger.info("Starting Questionnaire Bot...")
+        start_metrics_server(getattr(Config, 'METRICS_HOST', '127.0.0.1'), getattr(Config, 'METRICS_PORT', 0))
         self.app.run_polling()
 
 def main():
     """Main function"""
+    setup_logging(
+        level=getattr(Config, 'LOG_LEVEL', 'INFO'),
+        log_format=getattr(Config, 'LOG_FORMAT', 'json'),
+        log_file=getattr(Config, 'LOG_FILE', None)
+    )
+    
     try:
         bot = QuestionnaireBot()
         bot.run()
     except Exception as e:
-        logger.error(f"Failed to start bot: {e}")
+        logger.error("Failed to start bot: %s", e)
         print(f"Error: {e}")
         print("Please check your configuration in config.py")
 
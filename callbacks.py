@@ -0,0 +1,140 @@
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from config import Config
+from metrics import HANDLER_LATENCY
+
+# Bump when the wire format of callback data changes
+CALLBACK_VERSION = '1'
+
+# Telegram rejects callback_data longer than 64 bytes
+MAX_CALLBACK_DATA_LENGTH = 64
+
+ACCESS_DENIED_MESSAGE = "❌ Access denied. Admin privileges required."
+EXPIRED_BUTTON_MESSAGE = "❌ This button has expired. Please open the menu again."
+
+CallbackHandler = Callable[..., Awaitable[None]]
+
+
+class Route:
+    """A registered callback action"""
+    __slots__ = ('name', 'code', 'handler', 'admin_only', 'metric_label')
+
+    def __init__(self, name: str, code: str, handler: CallbackHandler, admin_only: bool):
+        self.name = name
+        self.code = code
+        self.handler = handler
+        self.admin_only = admin_only
+        self.metric_label = (f'callback:{name}',)
+
+
+class CallbackRouter:
+    """Encode inline keyboard callback data and dispatch it in O(1).
+
+    Callback data has the form ``<version><code>:<arg>.<arg>...`` where the
+    arguments are non-negative integers packed in base 36, e.g. ``1a:2s``.
+    """
+
+    def __init__(self, on_complete: Callable[[Tuple[str, ...], float], None] = None):
+        self.on_complete = on_complete
+        self._routes_by_code: Dict[str, Route] = {}
+        self._routes_by_name: Dict[str, Route] = {}
+        self._legacy_prefixes: List[Tuple[str, Route]] = []
+
+    def register(self, name: str, code: str, handler: CallbackHandler,
+                 admin_only: bool = False, legacy_prefix: str = None):
+        """Register a callback action under a short, stable code"""
+        if not code or ':' in code:
+            raise ValueError(f"Invalid callback code: {code!r}")
+        if code in self._routes_by_code:
+            raise ValueError(f"Callback code {code!r} already registered")
+        if name in self._routes_by_name:
+            raise ValueError(f"Callback action {name!r} already registered")
+
+        route = Route(name, code, handler, admin_only)
+        self._routes_by_code[code] = route
+        self._routes_by_name[name] = route
+
+        if legacy_prefix:
+            self._legacy_prefixes.append((legacy_prefix, route))
+            # Longest prefix first so e.g. "restart_survey_" wins over "restart_"
+            self._legacy_prefixes.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def encode(self, name: str, *args: int) -> str:
+        """Build callback data for a registered action"""
+        route = self._routes_by_name[name]
+        data = CALLBACK_VERSION + route.code + ':' + '.'.join(_to_base36(arg) for arg in args)
+
+        if len(data.encode('utf-8')) > MAX_CALLBACK_DATA_LENGTH:
+            raise ValueError(f"Callback data for {name!r} exceeds {MAX_CALLBACK_DATA_LENGTH} bytes")
+        return data
+
+    def decode(self, data: str) -> Optional[Tuple[Route, List[int]]]:
+        """Resolve callback data to its route and integer arguments"""
+        if not data:
+            return None
+
+        head, sep, tail = data.partition(':')
+        if sep and head[:1] == CALLBACK_VERSION:
+            route = self._routes_by_code.get(head[1:])
+            if route is None:
+                return None
+            try:
+                args = [int(arg, 36) for arg in tail.split('.')] if tail else []
+            except ValueError:
+                return None
+            return route, args
+
+        return self._decode_legacy(data)
+
+    def _decode_legacy(self, data: str) -> Optional[Tuple[Route, List[int]]]:
+        """Decode pre-versioned ``<prefix><id>`` data still attached to old messages"""
+        for prefix, route in self._legacy_prefixes:
+            if data.startswith(prefix):
+                rest = data[len(prefix):]
+                if not rest:
+                    return route, []
+                try:
+                    return route, [int(rest)]
+                except ValueError:
+                    return None
+        return None
+
+    async def dispatch(self, update, context):
+        """Answer the callback query and run its handler"""
+        query = update.callback_query
+        await query.answer()
+
+        user = update.effective_user
+        resolved = self.decode(query.data)
+
+        if resolved is None:
+            await query.edit_message_text(EXPIRED_BUTTON_MESSAGE)
+            return
+
+        route, args = resolved
+        if route.admin_only and not Config.is_admin(user.id):
+            await query.edit_message_text(ACCESS_DENIED_MESSAGE)
+            return
+
+        start = time.perf_counter()
+        try:
+            await route.handler(query, user, context, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            HANDLER_LATENCY.observe(elapsed, *route.metric_label)
+            if self.on_complete is not None:
+                self.on_complete(route.metric_label, elapsed)
+
+
+def _to_base36(value: int) -> str:
+    """Pack a non-negative integer into base 36"""
+    if value < 0:
+        raise ValueError("Callback arguments must be non-negative")
+    if value == 0:
+        return '0'
+
+    digits = []
+    while value:
+        value, remainder = divmod(value, 36)
+        digits.append('0123456789abcdefghijklmnopqrstuvwxyz'[remainder])
+    return ''.join(reversed(digits))
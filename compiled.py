@@ -0,0 +1,219 @@
+import math
+from collections import OrderedDict, deque
+from datetime import date
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from models import Question, QuestionType, parsed
+
+# Branch targets are question numbers (1-based positions in the version) or END_OF_SURVEY.
+# Keys are option indexes, as strings, of a single-choice question, or DEFAULT_BRANCH for any other answer:
+#     {"1": 4, "*": "end"}   option 2 jumps to question 4, every other answer ends the survey
+END_OF_SURVEY = 'end'
+DEFAULT_BRANCH = '*'
+
+# (question_type, options, branches) of each question, in order
+Step = Tuple[QuestionType, Optional[List[str]], Optional[dict]]
+
+
+class BranchingError(ValueError):
+    """Branches that point nowhere, loop or leave questions unreachable"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+def transition_table(steps: Sequence[Step]) -> Tuple[Tuple[int, ...], ...]:
+    """Compile branches into a next-step table.
+
+    Row i holds the index of the question after question i for each option of a
+    single-choice question, followed by the index after any other answer;
+    index len(steps) ends the survey. Without branches every row is (i + 1,).
+    """
+    end = len(steps)
+    errors = []
+
+    def target(value, number: int, key: str) -> int:
+        if value == END_OF_SURVEY:
+            return end
+        if isinstance(value, int) and not isinstance(value, bool) and 1 <= value <= end:
+            return value - 1
+        answer = 'answers go' if key == DEFAULT_BRANCH else f"option {int(key) + 1} goes"
+        errors.append(f"question {number}: {answer} to {value!r}, not a question number or '{END_OF_SURVEY}'")
+        return end
+
+    table = []
+    for index, (question_type, options, branches) in enumerate(steps):
+        number = index + 1
+        branches = branches or {}
+        option_count = len(options or ()) if question_type == QuestionType.SINGLE_CHOICE else 0
+        for key in branches:
+            if key != DEFAULT_BRANCH and not (key.isdigit() and int(key) < option_count):
+                errors.append(f"question {number}: no option {key!r} to branch on")
+
+        default = target(branches[DEFAULT_BRANCH], number, DEFAULT_BRANCH) if DEFAULT_BRANCH in branches else index + 1
+        row = [target(branches[str(option)], number, str(option)) if str(option) in branches else default
+               for option in range(option_count)]
+        row.append(default)
+        table.append(tuple(row))
+
+    if errors:
+        raise BranchingError(errors)
+    return tuple(table)
+
+
+def graph_errors(table: Sequence[Tuple[int, ...]]) -> List[str]:
+    """Loops and unreachable questions in a transition table"""
+    end = len(table)
+    if not end:
+        return []
+
+    # Questions reachable from the first one
+    reachable = [False] * end
+    reachable[0] = True
+    queue = deque([0])
+    while queue:
+        for following in set(table[queue.popleft()]):
+            if following < end and not reachable[following]:
+                reachable[following] = True
+                queue.append(following)
+    errors = [f"question {index + 1}: unreachable" for index in range(end) if not reachable[index]]
+
+    # Depth-first search; reaching a question still on the path closes a loop
+    state = [0] * end  # 0 unvisited, 1 on the current path, 2 done
+    for start in range(end):
+        if state[start]:
+            continue
+        path = [start]
+        pending = [iter(sorted(set(table[start])))]
+        state[start] = 1
+        while pending:
+            following = next(pending[-1], None)
+            if following is None:
+                state[path.pop()] = 2
+                pending.pop()
+            elif following < end and state[following] == 1:
+                loop = path[path.index(following):] + [following]
+                errors.append("questions " + ' → '.join(str(index + 1) for index in loop) + " loop")
+            elif following < end and not state[following]:
+                state[following] = 1
+                path.append(following)
+                pending.append(iter(sorted(set(table[following]))))
+    return errors
+
+
+def branching_errors(steps: Sequence[Step]) -> List[str]:
+    """Everything wrong with the branches of a question list, empty when it can be activated"""
+    try:
+        return graph_errors(transition_table(steps))
+    except BranchingError as e:
+        return e.errors
+
+
+def question_steps(questions: Sequence[Question]) -> List[Step]:
+    """Branching inputs of stored questions"""
+    return [(question.question_type, question.options, question.branches) for question in questions]
+
+
+def render_question(question: Question, question_number: int, total_questions: int) -> str:
+    """Prompt sent to a respondent for one question"""
+    question_text = f"📝 Question {question_number}/{total_questions}:\n{question.question_text}\n\n"
+
+    if question.question_type == QuestionType.SINGLE_CHOICE and question.options:
+        question_text += "🔘 Select ONE option:\n"
+        for i, option in enumerate(question.options):
+            question_text += f"{i + 1}. {option}\n"
+        question_text += f"\nReply with the number of your choice (1-{len(question.options)})"
+    elif question.question_type == QuestionType.MULTIPLE_CHOICE and question.options:
+        question_text += "☑️ Select ONE or MORE options:\n"
+        for i, option in enumerate(question.options):
+            question_text += f"{i + 1}. {option}\n"
+        question_text += "\nReply with numbers separated by commas (e.g., 1,3,5)"
+    elif question.question_type == QuestionType.RATING and question.options:
+        question_text += f"⭐ Rate from 1 to {len(question.options)}:\n"
+        for i, option in enumerate(question.options):
+            question_text += f"{i + 1}. {option}\n"
+        question_text += f"\nReply with a number from 1 to {len(question.options)}"
+    elif question.question_type == QuestionType.NUMBER:
+        question_text += "🔢 Please reply with a number:"
+    elif question.question_type == QuestionType.DATE:
+        question_text += "📅 Please reply with a date (YYYY-MM-DD):"
+    else:  # TEXT
+        question_text += "💬 Please type your answer:"
+
+    if question.is_required:
+        question_text += "\n\n⚠️ This question is required."
+
+    return question_text
+
+
+def parse_typed_answer(question: Question, text: str) -> dict:
+    """save_response arguments for a number, rating or date answer; ValueError with a reply if invalid"""
+    text = text.strip()
+    if question.question_type == QuestionType.DATE:
+        try:
+            return {'answer_date': date.fromisoformat(text).isoformat()}
+        except ValueError:
+            raise ValueError("Please enter a date as YYYY-MM-DD (e.g., 2024-05-31).")
+
+    try:
+        value = float(text)
+    except ValueError:
+        value = math.nan
+    if question.question_type == QuestionType.RATING:
+        scale = len(question.options or ())
+        if not value.is_integer() or not 1 <= value <= scale:
+            raise ValueError(f"Please select a number between 1 and {scale}.")
+        return {'answer_number': int(value)}
+    if not math.isfinite(value):
+        raise ValueError("Please enter a number (e.g., 42 or 3.5).")
+    return {'answer_number': value}
+
+
+class CompiledQuestionnaire:
+    """One questionnaire version with everything the answer flow derives from it, built once"""
+    __slots__ = ('questionnaire_id', 'version', 'questions', 'prompts', 'transitions')
+
+    def __init__(self, questionnaire_id: int, version: int, questions: List[Question]):
+        self.questionnaire_id = questionnaire_id
+        self.version = version
+        # Parsed once here: the answer flow reads options and branches on every answer
+        questions = tuple(map(parsed, questions))
+        self.questions = questions
+        self.prompts = tuple(render_question(question, number, len(questions))
+                             for number, question in enumerate(questions, start=1))
+        self.transitions = transition_table(question_steps(questions))
+
+    def next_index(self, index: int, selected_option: Optional[int] = None) -> int:
+        """Index of the question after an answer; len(questions) when the survey ends"""
+        row = self.transitions[index]
+        return row[selected_option] if selected_option is not None and selected_option < len(row) - 1 else row[-1]
+
+
+class QuestionnaireCache:
+    """LRU of compiled questionnaires keyed by (questionnaire_id, version).
+
+    Only versions of activated questionnaires belong here: those never change, so
+    entries are evicted but never invalidated, and every process can keep its own.
+    """
+
+    def __init__(self, load: Callable[[int, int], List[Question]], capacity: int = 256):
+        self.load = load
+        self.capacity = capacity
+        self._entries = OrderedDict()
+
+    def get(self, questionnaire_id: int, version: int) -> Optional[CompiledQuestionnaire]:
+        """Compiled version, loading it on a miss; None if the version has no questions"""
+        key = (questionnaire_id, version)
+        compiled = self._entries.get(key)
+        if compiled is not None:
+            self._entries.move_to_end(key)
+            return compiled
+
+        questions = self.load(questionnaire_id, version)
+        if not questions:
+            return None
+        compiled = self._entries[key] = CompiledQuestionnaire(questionnaire_id, version, questions)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return compiled
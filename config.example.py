@@ -17,6 +17,74 @@ class Config:
     MAX_QUESTIONS_PER_QUESTIONNAIRE = 20
     MAX_OPTIONS_PER_QUESTION = 10
     
+    # Monitoring
+    # Prometheus-style metrics served at http://METRICS_HOST:METRICS_PORT/metrics (0 disables)
+    METRICS_HOST = '127.0.0.1'
+    METRICS_PORT = 0
+    
+    # Logging
+    LOG_LEVEL = 'INFO'
+    LOG_FORMAT = 'json'  # 'json' (one object per line) or 'text'
+    LOG_FILE = None  # Optional file in addition to stdout
+    LOG_SAMPLE_RATE = 0.01  # Fraction of routine per-update events logged
+    SLOW_HANDLER_MS = 1000  # Handlers slower than this are always logged
+    
+    # Inbound rate limits (token buckets: sustained updates per second and burst size; 0 rate disables)
+    # Admins are exempt from the per-user limit
+    RATE_LIMIT_USER_RATE = 1.0
+    RATE_LIMIT_USER_BURST = 5
+    RATE_LIMIT_GLOBAL_RATE = 50.0
+    RATE_LIMIT_GLOBAL_BURST = 100
+    
+    # Idle read-only connections kept per database file for results, summaries and exports
+    READ_POOL_SIZE = 4
+    
+    # Store responses in this many separate SQLite files (questionnaire_id % N) so large surveys
+    # don't share one write lock; 0 keeps everything in DATABASE_PATH. Cannot be changed later.
+    RESPONSE_SHARDS = 0
+    
+    # FTS5 tokenizer for /search over text answers. 'trigram' matches any substring of 3+ characters,
+    # which suits Chinese text without spaces; changing it rebuilds the index on the next start
+    SEARCH_TOKENIZER = 'unicode61 remove_diacritics 2'
+    
+    # Most frequent terms and phrases shown per text question in the results view
+    TEXT_TOP_TERMS = 5
+    
+    # Responses of questionnaires closed for longer than this many days move to compressed
+    # per-questionnaire archive files (None disables archiving)
+    ARCHIVE_AFTER_DAYS = 30
+    # Archive directory; None means an 'archive' folder next to the database file
+    ARCHIVE_DIR = None
+    # Unfinished attempts (and their partial answers) older than this many days are deleted
+    RETENTION_INCOMPLETE_DAYS = 30
+    # Users first seen this many days ago who never answered or created anything are deleted
+    RETENTION_STALE_USER_DAYS = 365
+    # Seconds between retention runs (archiving, the two policies above, incremental VACUUM); 0 disables
+    RETENTION_INTERVAL = 86400
+    
+    # Deleted questionnaires are hidden at once and purged in batches of this many rows
+    PURGE_BATCH_SIZE = 500
+    # Seconds to pause between purge batches so respondents' writes are not blocked
+    PURGE_BATCH_PAUSE = 0.05
+    # Free pages returned to the filesystem per incremental VACUUM step (0 disables)
+    PURGE_VACUUM_PAGES = 200
+    
+    # Recently processed update_ids remembered to skip Telegram redeliveries
+    DEDUP_CAPACITY = 10000
+    # Seconds between saves of the last processed update_id to the database
+    DEDUP_PERSIST_INTERVAL = 1.0
+    
+    # Seconds after startup to import the export/QR libraries in the background (None disables)
+    PRELOAD_HEAVY_MODULES_DELAY = 5
+    
+    # Statements slower than this are logged with their query plan
+    SLOW_QUERY_THRESHOLD_MS = 100
+    # Number of slowest statements shown by /slow_queries
+    SLOW_QUERY_TOP_N = 10
+    
+    # Questionnaire versions kept compiled (questions and rendered prompts) in memory
+    QUESTIONNAIRE_CACHE_SIZE = 256
+    
     @classmethod
     def is_admin(cls, user_id: int) -> bool:
         """Check if user is admin"""
@@ -1,26 +1,246 @@
 import sqlite3
 import json
-from typing import List, Optional, Tuple
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from models import *
 from config import Config
+from metrics import DB_CONNECTIONS, DB_QUERY_LATENCY, DB_TRANSACTIONS, timed
+from archive import ARCHIVE_COLUMNS, ResponseArchive
+from querylog import SlowQueryLog, format_query_plan, params_shape
+from search import SCOPE_TOKEN_SQL, match_expression, parse_query
+from text_analytics import PHRASE, TERM, answer_terms
+from storage import StorageBackend
 
-class Database:
-    def __init__(self, db_path: str = None):
+# bot_state key recording the shard count the response data was laid out with
+RESPONSE_SHARDS_KEY = 'response_shards'
+# bot_state key set once text_term_counts has been backfilled from existing answers
+TEXT_ANALYTICS_KEY = 'text_analytics'
+
+# Tables holding a questionnaire's rows, in purge order, with the key used to delete them in batches
+PURGE_TABLES = (
+    ('responses', 'id'),
+    ('text_term_counts', 'question_id, kind, term'),
+    ('questionnaire_responses', 'rowid'),
+    ('version_questions', 'questionnaire_id, version, position'),
+    ('questions', 'id'),
+)
+
+# Questions of one version read through its version_questions rows, in Question field order
+VERSION_QUESTION_COLUMNS = ('q.id, q.questionnaire_id, q.question_text, q.question_type, q.options, '
+                            'q.is_required, v.position AS order_index, q.branches')
+
+# Value aggregated for number, rating and date answers (models.answer_value in Python)
+ANSWER_VALUE_SQL = 'COALESCE(answer_number, julianday(answer_date))'
+
+TERM_COUNT_UPSERT = '''
+    INSERT INTO text_term_counts (questionnaire_id, question_id, kind, term, count)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (questionnaire_id, question_id, kind, term) DO UPDATE SET count = count + excluded.count
+'''
+
+# Triggers keeping the full-text index of answer_text in step with every write to responses
+# (answers, restores, archiving, purges and retention alike). The index is contentless, so a
+# removal has to repeat the indexed values, which the old row still holds
+SEARCH_TRIGGERS = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS responses_fts_insert AFTER INSERT ON responses
+    WHEN new.answer_text IS NOT NULL BEGIN
+        INSERT INTO responses_fts (rowid, answer_text, scope)
+        VALUES (new.id, new.answer_text, {SCOPE_TOKEN_SQL.format(row='new')});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS responses_fts_delete AFTER DELETE ON responses
+    WHEN old.answer_text IS NOT NULL BEGIN
+        INSERT INTO responses_fts (responses_fts, rowid, answer_text, scope)
+        VALUES ('delete', old.id, old.answer_text, {SCOPE_TOKEN_SQL.format(row='old')});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS responses_fts_update AFTER UPDATE OF answer_text, questionnaire_id ON responses BEGIN
+        INSERT INTO responses_fts (responses_fts, rowid, answer_text, scope)
+        SELECT 'delete', old.id, old.answer_text, {SCOPE_TOKEN_SQL.format(row='old')} WHERE old.answer_text IS NOT NULL;
+        INSERT INTO responses_fts (rowid, answer_text, scope)
+        SELECT new.id, new.answer_text, {SCOPE_TOKEN_SQL.format(row='new')} WHERE new.answer_text IS NOT NULL;
+    END
+    ''',
+)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """sqlite3 cursor that times every statement, including fetching its rows"""
+    
+    _pending = None
+    
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._pending = [sql, parameters, False, time.perf_counter() - start]
+        if self.description is None:
+            self._finish()  # No rows to fetch
+        return self
+    
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        seq_of_parameters = list(seq_of_parameters)
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._pending = [sql, seq_of_parameters, True, time.perf_counter() - start]
+        self._finish()
+        return self
+    
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._finish(time.perf_counter() - start)
+        return row
+    
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._finish(time.perf_counter() - start)
+        return rows
+    
+    def _finish(self, extra: float = 0.0):
+        """Report the pending statement to the connection's query log"""
+        pending, self._pending = self._pending, None
+        query_log = getattr(self.connection, 'query_log', None)
+        if pending is None or query_log is None:
+            return
+        
+        sql, parameters, many, elapsed = pending
+        connection = self.connection
+        
+        def explain():
+            explain_params = parameters[0] if many else parameters
+            rows = sqlite3.Cursor(connection).execute(f'EXPLAIN QUERY PLAN {sql}', explain_params).fetchall()
+            return format_query_plan(rows)
+        
+        query_log.record(sql, params_shape(parameters, many), (elapsed + extra) * 1000, explain)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection that counts committed transactions and times statements"""
+    
+    query_log = None
+    
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+    
+    def commit(self):
+        super().commit()
+        DB_TRANSACTIONS.inc()
+
+class ReadOnlyPool:
+    """Reusable read-only connections, kept per database file.
+    
+    A connection that raised is closed rather than reused, since it may still hold
+    an unfinished statement (and with it a WAL snapshot).
+    """
+    
+    def __init__(self, connect, size: int):
+        self.connect = connect
+        self.size = size
+        self._idle = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def connection(self, path: str):
+        with self._lock:
+            idle = self._idle.setdefault(path, [])
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = self.connect(path)
+        
+        try:
+            yield conn
+        except Exception:
+            conn.close()
+            raise
+        
+        with self._lock:
+            if len(idle) < self.size:
+                idle.append(conn)
+                return
+        conn.close()
+    
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+
+class Database(StorageBackend):
+    """SQLite storage backend"""
+    
+    def __init__(self, db_path: str = None, shards: int = None):
         self.db_path = db_path or Config.DATABASE_PATH
+        # Number of response shard files; 0 keeps everything in db_path
+        self.shards = shards if shards is not None else getattr(Config, 'RESPONSE_SHARDS', 0)
+        # FTS5 tokenizer for answer search; changing it rebuilds the index on the next start
+        self.search_tokenizer = getattr(Config, 'SEARCH_TOKENIZER', 'unicode61 remove_diacritics 2')
+        self.query_log = SlowQueryLog(
+            threshold_ms=getattr(Config, 'SLOW_QUERY_THRESHOLD_MS', 100),
+            top_n=getattr(Config, 'SLOW_QUERY_TOP_N', 10)
+        )
+        self.archive = ResponseArchive(
+            getattr(Config, 'ARCHIVE_DIR', None)
+            or os.path.join(os.path.dirname(os.path.abspath(self.db_path)), 'archive')
+        )
         self.init_database()
+        # Results, summaries and exports read through these so long scans never block answer writes
+        self.read_pool = ReadOnlyPool(self.connect_read_only, size=getattr(Config, 'READ_POOL_SIZE', 4))
     
-    def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
+    def get_connection(self, path: str = None):
+        """Get database connection (to the catalog unless another file is given)"""
+        conn = sqlite3.connect(path or self.db_path, factory=InstrumentedConnection)
+        DB_CONNECTIONS.inc()
+        conn.query_log = self.query_log
         conn.row_factory = sqlite3.Row
         return conn
     
+    def connect_read_only(self, path: str):
+        """Open a read-only (mode=ro, query_only) connection for the pool"""
+        conn = sqlite3.connect(f'{Path(path).absolute().as_uri()}?mode=ro', uri=True,
+                               factory=InstrumentedConnection, check_same_thread=False)
+        DB_CONNECTIONS.inc()
+        conn.query_log = self.query_log
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA query_only = 1')
+        if path != self.db_path:
+            conn.execute('ATTACH DATABASE ? AS catalog', (f'{Path(self.db_path).absolute().as_uri()}?mode=ro',))
+        return conn
+    
+    def read_connection(self, questionnaire_id: int):
+        """Borrow a pooled read-only connection for a questionnaire's response data"""
+        if not self.shards:
+            return self.read_pool.connection(self.db_path)
+        return self.read_pool.connection(self.shard_path(questionnaire_id % self.shards))
+    
     def init_database(self):
         """Initialize database tables"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
+        # Lets the purger hand freed pages back to the OS bit by bit
+        self.enable_incremental_vacuum(cursor)
+        # Persistent; readers see a snapshot and never block writers (or the other way round)
+        cursor.execute('PRAGMA journal_mode = WAL')
+        
         # Users table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -43,6 +263,10 @@ class Database:
                 status TEXT DEFAULT 'draft',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                archived_at TIMESTAMP,  -- set when responses were moved to cold storage
+                deleted_at TIMESTAMP,  -- set on delete; rows are purged in the background
+                is_template INTEGER NOT NULL DEFAULT 0,  -- template library entries, listed apart
+                version INTEGER NOT NULL DEFAULT 1,  -- version new respondents start
                 FOREIGN KEY (created_by) REFERENCES users (user_id)
             )
         ''')
@@ -57,10 +281,72 @@ class Database:
                 options TEXT,  -- JSON string for multiple choice options
                 is_required BOOLEAN DEFAULT TRUE,
                 order_index INTEGER NOT NULL,
+                branches TEXT,  -- JSON skip logic: {option index or "*": question number or "end"}
                 FOREIGN KEY (questionnaire_id) REFERENCES questionnaires (id)
             )
         ''')
         
+        # The ordered questions of each questionnaire version. A version is frozen once its questionnaire
+        # has been activated; edits then create the next version, reusing unchanged question rows
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'version_questions'")
+        backfill_versions = cursor.fetchone() is None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS version_questions (
+                questionnaire_id INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                question_id INTEGER NOT NULL,
+                PRIMARY KEY (questionnaire_id, version, position),
+                FOREIGN KEY (question_id) REFERENCES questions (id)
+            ) WITHOUT ROWID
+        ''')
+        if backfill_versions:
+            # Questions from before versioning make up version 1 of their questionnaire
+            cursor.execute('''
+                INSERT INTO version_questions (questionnaire_id, version, position, question_id)
+                SELECT questionnaire_id, 1, order_index, id FROM questions
+            ''')
+        
+        # Response tables also live here in unsharded mode
+        self.create_response_tables(cursor)
+        
+        # Columns added after the first release; older databases gain them here
+        cursor.execute('PRAGMA table_info(questionnaires)')
+        columns = {row['name'] for row in cursor.fetchall()}
+        for column in ('archived_at', 'deleted_at'):
+            if column not in columns:
+                cursor.execute(f'ALTER TABLE questionnaires ADD COLUMN {column} TIMESTAMP')
+        if 'is_template' not in columns:
+            cursor.execute('ALTER TABLE questionnaires ADD COLUMN is_template INTEGER NOT NULL DEFAULT 0')
+        if 'version' not in columns:
+            cursor.execute('ALTER TABLE questionnaires ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+        cursor.execute('PRAGMA table_info(questions)')
+        if 'branches' not in {row['name'] for row in cursor.fetchall()}:
+            cursor.execute('ALTER TABLE questions ADD COLUMN branches TEXT')
+        
+        # Bot state table (small key/value settings such as the last processed update_id)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bot_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        
+        conn.commit()
+        conn.close()
+        
+        configured = self.get_state(RESPONSE_SHARDS_KEY)
+        if configured is not None and int(configured) != self.shards:
+            raise ValueError(f"RESPONSE_SHARDS changed from {configured} to {self.shards}; resharding is not supported")
+        if self.shards:
+            self.init_shards(migrate=configured is None)
+        
+        if self.get_state(TEXT_ANALYTICS_KEY) is None:
+            self.backfill_text_analytics()
+            self.set_state(TEXT_ANALYTICS_KEY, '1')
+    
+    def create_response_tables(self, cursor):
+        """Create the responses and questionnaire_responses tables in the cursor's database"""
         # Responses table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS responses (
@@ -70,8 +356,10 @@ class Database:
                 question_id INTEGER NOT NULL,
                 answer_text TEXT,
                 selected_option INTEGER,
-                selected_options TEXT,  -- JSON string for multiple choice (multiple answers)
+                selected_mask INTEGER,  -- multiple choice: bit i set when option i was selected
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                answer_number REAL,  -- number and rating answers
+                answer_date TEXT,  -- date answers, ISO YYYY-MM-DD
                 FOREIGN KEY (questionnaire_id) REFERENCES questionnaires (id),
                 FOREIGN KEY (user_id) REFERENCES users (user_id),
                 FOREIGN KEY (question_id) REFERENCES questions (id)
@@ -86,16 +374,218 @@ class Database:
                 started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 completed_at TIMESTAMP,
                 is_completed BOOLEAN DEFAULT FALSE,
+                version INTEGER NOT NULL DEFAULT 1,  -- questionnaire version the respondent is answering
                 PRIMARY KEY (questionnaire_id, user_id),
                 FOREIGN KEY (questionnaire_id) REFERENCES questionnaires (id),
                 FOREIGN KEY (user_id) REFERENCES users (user_id)
             )
         ''')
         
+        cursor.execute('PRAGMA table_info(questionnaire_responses)')
+        if 'version' not in {row['name'] for row in cursor.fetchall()}:
+            cursor.execute('ALTER TABLE questionnaire_responses ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+        
+        # Multiple-choice selections used to be a JSON list in selected_options
+        cursor.execute('PRAGMA table_info(responses)')
+        columns = {row['name'] for row in cursor.fetchall()}
+        if 'selected_mask' not in columns:
+            cursor.execute('ALTER TABLE responses ADD COLUMN selected_mask INTEGER')
+        if 'answer_number' not in columns:
+            cursor.execute('ALTER TABLE responses ADD COLUMN answer_number REAL')
+            cursor.execute('ALTER TABLE responses ADD COLUMN answer_date TEXT')
+        if 'selected_options' in columns:
+            cursor.execute('''
+                UPDATE responses
+                SET selected_mask = (SELECT SUM(DISTINCT 1 << value) FROM json_each(responses.selected_options))
+                WHERE selected_options IS NOT NULL
+            ''')
+            if sqlite3.sqlite_version_info >= (3, 35, 0):
+                cursor.execute('ALTER TABLE responses DROP COLUMN selected_options')
+            else:
+                cursor.execute('UPDATE responses SET selected_options = NULL')
+        
+        # Answers mentioning each term / adjacent-term phrase per TEXT question, updated on every save
+        # so the results view reads the top-k off an index instead of re-tokenizing every answer
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS text_term_counts (
+                questionnaire_id INTEGER NOT NULL,
+                question_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,  -- 'term' or 'phrase'
+                term TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (questionnaire_id, question_id, kind, term)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_text_term_counts_top
+            ON text_term_counts (questionnaire_id, question_id, kind, count DESC, term)
+        ''')
+        
+        # One answer per question and respondent, overwritten by save_response. Its (questionnaire_id, user_id)
+        # prefix lets the purger and retention policies delete a questionnaire's (or one attempt's)
+        # responses in small batches without scanning the table; it supersedes the earlier indexes
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_responses_answer'")
+        if not cursor.fetchone():
+            # Restarts used to leave the abandoned attempt's answers behind: keep only the newest answer
+            # per question, given since the respondent's latest start
+            cursor.execute('''
+                SELECT id, questionnaire_id, question_id, answer_text FROM responses r
+                WHERE id < (SELECT MAX(id) FROM responses d WHERE d.questionnaire_id = r.questionnaire_id
+                            AND d.user_id = r.user_id AND d.question_id = r.question_id)
+                   OR created_at < (SELECT started_at FROM questionnaire_responses qr
+                                    WHERE qr.questionnaire_id = r.questionnaire_id AND qr.user_id = r.user_id)
+            ''')
+            stale = cursor.fetchall()
+            self._uncount_answers(cursor, [row for row in stale if row['answer_text'] is not None])
+            cursor.executemany('DELETE FROM responses WHERE id = ?', [(row['id'],) for row in stale])
+            cursor.execute('CREATE UNIQUE INDEX idx_responses_answer ON responses (questionnaire_id, user_id, question_id)')
+        cursor.execute('DROP INDEX IF EXISTS idx_responses_questionnaire')
+        cursor.execute('DROP INDEX IF EXISTS idx_responses_questionnaire_user')
+        
+        self.create_search_index(cursor)
+    
+    def create_search_index(self, cursor):
+        """Create the full-text index over answer_text, backfilling it from existing answers"""
+        table_sql = (
+            "CREATE VIRTUAL TABLE responses_fts USING fts5("
+            f"answer_text, scope, content='', prefix='2 3', tokenize='{self.search_tokenizer}')"
+        )
+        cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'responses_fts'")
+        row = cursor.fetchone()
+        if row and row['sql'] == table_sql:
+            return
+        
+        if row:
+            # Tokenizer changed; a contentless index cannot be re-tokenized in place
+            cursor.execute('DROP TABLE responses_fts')
+        cursor.execute(table_sql)
+        # Only answer_text counts towards bm25; every row of a questionnaire shares its scope token
+        cursor.execute("INSERT INTO responses_fts (responses_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')")
+        for trigger in SEARCH_TRIGGERS:
+            cursor.execute(trigger)
+        
+        cursor.execute(f'''
+            INSERT INTO responses_fts (rowid, answer_text, scope)
+            SELECT id, answer_text, {SCOPE_TOKEN_SQL.format(row='responses')} FROM responses
+            WHERE answer_text IS NOT NULL
+        ''')
+        cursor.execute("INSERT INTO responses_fts (responses_fts) VALUES ('optimize')")
+    
+    def enable_incremental_vacuum(self, cursor):
+        """Switch a database file to incremental auto-vacuum"""
+        if cursor.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            # The mode only sticks on an empty file or after a full VACUUM, so files created
+            # before it was enabled are rebuilt once here
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+    
+    def init_shards(self, migrate: bool):
+        """Create the shard files, moving responses out of the catalog when sharding is first enabled"""
+        for bucket in range(self.shards):
+            conn = self.get_connection(self.shard_path(bucket))
+            cursor = conn.cursor()
+            self.enable_incremental_vacuum(cursor)
+            cursor.execute('PRAGMA journal_mode = WAL')
+            self.create_response_tables(cursor)
+            conn.commit()
+            
+            if migrate:
+                # Existing catalog rows move to their shard in one transaction per shard
+                cursor.execute('ATTACH DATABASE ? AS catalog', (self.db_path,))
+                for table in ('responses', 'questionnaire_responses'):
+                    # By name: a migrated catalog table may have its columns in another order
+                    columns = ', '.join(row['name'] for row in cursor.execute(f'PRAGMA main.table_info({table})').fetchall())
+                    cursor.execute(f'''
+                        INSERT INTO main.{table} ({columns}) SELECT {columns} FROM catalog.{table}
+                        WHERE questionnaire_id % ? = ?
+                    ''', (self.shards, bucket))
+                    cursor.execute(f'DELETE FROM catalog.{table} WHERE questionnaire_id % ? = ?', (self.shards, bucket))
+                conn.commit()
+            conn.close()
+        
+        self.set_state(RESPONSE_SHARDS_KEY, str(self.shards))
+    
+    def backfill_text_analytics(self):
+        """Rebuild text_term_counts from every stored answer, archived ones included"""
+        conn = self.get_connection()
+        archived = [row['id'] for row in conn.execute('SELECT id FROM questionnaires WHERE archived_at IS NOT NULL')]
+        conn.close()
+        
+        for path in self.response_paths():
+            conn = self.get_connection(path)
+            cursor = conn.cursor()
+            
+            counts = {}
+            cursor.execute('SELECT questionnaire_id, question_id, answer_text FROM responses WHERE answer_text IS NOT NULL')
+            for row in cursor:
+                counts.setdefault((row['questionnaire_id'], row['question_id']), Counter()).update(answer_terms(row['answer_text']))
+            for questionnaire_id in archived:
+                if self.shards and self.shard_path(questionnaire_id % self.shards) != path:
+                    continue
+                for row in self.archive.read(questionnaire_id):
+                    if row['answer_text'] is not None:
+                        counts.setdefault((questionnaire_id, row['question_id']), Counter()).update(answer_terms(row['answer_text']))
+            
+            cursor.execute('DELETE FROM text_term_counts')
+            cursor.executemany(TERM_COUNT_UPSERT, (
+                (questionnaire_id, question_id, kind, term, count)
+                for (questionnaire_id, question_id), terms in counts.items()
+                for (kind, term), count in terms.items()
+            ))
+            conn.commit()
+            conn.close()
+    
+    def shard_path(self, bucket: int) -> str:
+        """File holding the response tables of one shard bucket"""
+        return f'{os.path.splitext(self.db_path)[0]}.shard{bucket}.db'
+    
+    def response_paths(self) -> List[str]:
+        """Every database file holding response tables"""
+        if not self.shards:
+            return [self.db_path]
+        return [self.shard_path(bucket) for bucket in range(self.shards)]
+    
+    def get_response_connection(self, questionnaire_id: int):
+        """Get a connection for a questionnaire's responses.
+        
+        In sharded mode the shard is the main database and the catalog is attached,
+        so unqualified table names resolve to the right file and only the shard's
+        write lock is taken when answers are saved.
+        """
+        if not self.shards:
+            return self.get_connection()
+        conn = self.get_connection(self.shard_path(questionnaire_id % self.shards))
+        conn.execute('ATTACH DATABASE ? AS catalog', (self.db_path,))
+        return conn
+    
+    # Bot state operations
+    @timed(DB_QUERY_LATENCY)
+    def get_state(self, key: str, default: str = None) -> Optional[str]:
+        """Get a bot state value"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT value FROM bot_state WHERE key = ?', (key,))
+        row = cursor.fetchone()
+        conn.close()
+        return row['value'] if row else default
+    
+    @timed(DB_QUERY_LATENCY)
+    def set_state(self, key: str, value: str):
+        """Set a bot state value"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO bot_state (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''', (key, value))
+        
         conn.commit()
         conn.close()
     
     # User operations
+    @timed(DB_QUERY_LATENCY)
     def create_or_update_user(self, user_id: int, username: str = None, 
                              first_name: str = None, last_name: str = None) -> User:
         """Create or update user"""
@@ -118,27 +608,20 @@ class Database:
         
         return User(user_id, username, first_name, last_name, is_admin, datetime.now())
     
+    @timed(DB_QUERY_LATENCY)
     def get_user(self, user_id: int) -> Optional[User]:
         """Get user by ID"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        cursor.execute(f'SELECT {User.COLUMNS} FROM users WHERE user_id = ?', (user_id,))
         row = cursor.fetchone()
         conn.close()
         
-        if row:
-            return User(
-                user_id=row['user_id'],
-                username=row['username'],
-                first_name=row['first_name'],
-                last_name=row['last_name'],
-                is_admin=row['is_admin'],
-                created_at=datetime.fromisoformat(row['created_at'])
-            )
-        return None
+        return User._make(row) if row else None
     
     # Questionnaire operations
+    @timed(DB_QUERY_LATENCY)
     def create_questionnaire(self, title: str, description: str, created_by: int) -> int:
         """Create new questionnaire"""
         conn = self.get_connection()
@@ -155,83 +638,150 @@ class Database:
         
         return questionnaire_id
     
+    @timed(DB_QUERY_LATENCY)
+    def import_questionnaire(self, title: str, description: str, created_by: int,
+                             questions: List[Tuple[str, QuestionType, Optional[List[str]], bool, Optional[dict]]]) -> int:
+        """Create a draft questionnaire with all its questions in one transaction"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                INSERT INTO questionnaires (title, description, created_by)
+                VALUES (?, ?, ?)
+            ''', (title, description, created_by))
+            questionnaire_id = cursor.lastrowid
+            
+            cursor.executemany('''
+                INSERT INTO questions 
+                (questionnaire_id, question_text, question_type, options, is_required, order_index, branches)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (questionnaire_id, question_text, question_type.value,
+                 json.dumps(options) if options else None, is_required, order_index, branches_to_json(branches))
+                for order_index, (question_text, question_type, options, is_required, branches)
+                in enumerate(questions, start=1)
+            ])
+            self._add_first_version(cursor, questionnaire_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return questionnaire_id
+    
+    @timed(DB_QUERY_LATENCY)
+    def clone_questionnaire(self, questionnaire_id: int, created_by: int, title: str = None,
+                            as_template: bool = False) -> Optional[int]:
+        """Copy a questionnaire and its questions into a new draft (or template) in one transaction"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                INSERT INTO questionnaires (title, description, created_by, is_template)
+                SELECT COALESCE(?, title), description, ?, ?
+                FROM questionnaires WHERE id = ? AND deleted_at IS NULL
+            ''', (title, created_by, int(as_template), questionnaire_id))
+            if not cursor.rowcount:
+                conn.rollback()
+                return None
+            clone_id = cursor.lastrowid
+            
+            # The copy starts at version 1 with the source's current questions
+            cursor.execute('''
+                INSERT INTO questions 
+                (questionnaire_id, question_text, question_type, options, is_required, order_index, branches)
+                SELECT ?, q.question_text, q.question_type, q.options, q.is_required, v.position, q.branches
+                FROM version_questions v JOIN questions q ON q.id = v.question_id
+                WHERE v.questionnaire_id = ? AND v.version = (SELECT version FROM questionnaires WHERE id = ?)
+                ORDER BY v.position
+            ''', (clone_id, questionnaire_id, questionnaire_id))
+            self._add_first_version(cursor, clone_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return clone_id
+    
+    @staticmethod
+    def _add_first_version(cursor, questionnaire_id: int):
+        """Make a new questionnaire's questions, numbered by order_index, its version 1"""
+        cursor.execute('''
+            INSERT INTO version_questions (questionnaire_id, version, position, question_id)
+            SELECT questionnaire_id, 1, order_index, id FROM questions WHERE questionnaire_id = ?
+        ''', (questionnaire_id,))
+    
+    @timed(DB_QUERY_LATENCY)
+    def get_templates(self) -> List[Questionnaire]:
+        """Get the template library, newest first"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT {Questionnaire.COLUMNS} FROM questionnaires 
+            WHERE is_template = 1 AND deleted_at IS NULL
+            ORDER BY created_at DESC
+        ''')
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return from_rows(Questionnaire, rows)
+    
+    @timed(DB_QUERY_LATENCY)
     def get_questionnaire(self, questionnaire_id: int) -> Optional[Questionnaire]:
         """Get questionnaire by ID"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM questionnaires WHERE id = ?', (questionnaire_id,))
+        cursor.execute(f'SELECT {Questionnaire.COLUMNS} FROM questionnaires WHERE id = ? AND deleted_at IS NULL',
+                       (questionnaire_id,))
         row = cursor.fetchone()
         conn.close()
         
-        if row:
-            return Questionnaire(
-                id=row['id'],
-                title=row['title'],
-                description=row['description'],
-                created_by=row['created_by'],
-                status=QuestionnaireStatus(row['status']),
-                created_at=datetime.fromisoformat(row['created_at']),
-                updated_at=datetime.fromisoformat(row['updated_at'])
-            )
-        return None
+        return Questionnaire._make(row) if row else None
     
+    @timed(DB_QUERY_LATENCY)
     def get_questionnaires_by_admin(self, admin_id: int) -> List[Questionnaire]:
         """Get all questionnaires created by admin"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM questionnaires 
-            WHERE created_by = ? 
+        cursor.execute(f'''
+            SELECT {Questionnaire.COLUMNS} FROM questionnaires 
+            WHERE created_by = ? AND deleted_at IS NULL AND is_template = 0
             ORDER BY created_at DESC
         ''', (admin_id,))
         
         rows = cursor.fetchall()
         conn.close()
         
-        questionnaires = []
-        for row in rows:
-            questionnaires.append(Questionnaire(
-                id=row['id'],
-                title=row['title'],
-                description=row['description'],
-                created_by=row['created_by'],
-                status=QuestionnaireStatus(row['status']),
-                created_at=datetime.fromisoformat(row['created_at']),
-                updated_at=datetime.fromisoformat(row['updated_at'])
-            ))
-        
-        return questionnaires
+        return from_rows(Questionnaire, rows)
     
+    @timed(DB_QUERY_LATENCY)
     def get_active_questionnaires(self) -> List[Questionnaire]:
         """Get all active questionnaires"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM questionnaires 
-            WHERE status = 'active' 
+        cursor.execute(f'''
+            SELECT {Questionnaire.COLUMNS} FROM questionnaires 
+            WHERE status = 'active' AND deleted_at IS NULL 
             ORDER BY created_at DESC
         ''')
         
         rows = cursor.fetchall()
         conn.close()
         
-        questionnaires = []
-        for row in rows:
-            questionnaires.append(Questionnaire(
-                id=row['id'],
-                title=row['title'],
-                description=row['description'],
-                created_by=row['created_by'],
-                status=QuestionnaireStatus(row['status']),
-                created_at=datetime.fromisoformat(row['created_at']),
-                updated_at=datetime.fromisoformat(row['updated_at'])
-            ))
-        
-        return questionnaires
+        return from_rows(Questionnaire, rows)
     
+    @timed(DB_QUERY_LATENCY)
     def update_questionnaire_status(self, questionnaire_id: int, status: QuestionnaireStatus):
         """Update questionnaire status"""
         conn = self.get_connection()
@@ -245,143 +795,359 @@ class Database:
         
         conn.commit()
         conn.close()
+        
+        # A reopened questionnaire takes new answers, so bring its archived ones back
+        if status == QuestionnaireStatus.ACTIVE and self.archive.exists(questionnaire_id):
+            self.restore_questionnaire(questionnaire_id)
     
+    @timed(DB_QUERY_LATENCY)
     def delete_questionnaire(self, questionnaire_id: int, admin_id: int) -> bool:
-        """Delete questionnaire and all related data (admin only)"""
+        """Soft-delete questionnaire (admin only); its rows are removed later by purge_questionnaire_batch"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
-            # Check if questionnaire exists and belongs to admin
+            # Only hides the questionnaire, so the write lock is held for a single-row update
             cursor.execute('''
-                SELECT created_by FROM questionnaires WHERE id = ?
-            ''', (questionnaire_id,))
-            result = cursor.fetchone()
-            
-            if not result:
-                return False  # Questionnaire not found
-            
-            if result['created_by'] != admin_id:
-                return False  # Not authorized to delete
+                UPDATE questionnaires SET deleted_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND created_by = ? AND deleted_at IS NULL
+            ''', (questionnaire_id, admin_id))
             
-            # Delete in correct order to maintain referential integrity
-            
-            # 1. Delete responses
-            cursor.execute('DELETE FROM responses WHERE questionnaire_id = ?', (questionnaire_id,))
+            conn.commit()
+            return cursor.rowcount > 0
             
-            # 2. Delete questionnaire responses tracking
-            cursor.execute('DELETE FROM questionnaire_responses WHERE questionnaire_id = ?', (questionnaire_id,))
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+    
+    @timed(DB_QUERY_LATENCY)
+    def get_deleted_questionnaires(self) -> List[int]:
+        """Get ids of soft-deleted questionnaires still waiting to be purged"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT id FROM questionnaires WHERE deleted_at IS NOT NULL ORDER BY id')
+        
+        ids = [row['id'] for row in cursor.fetchall()]
+        conn.close()
+        return ids
+    
+    @timed(DB_QUERY_LATENCY)
+    def count_questionnaire_rows(self, questionnaire_id: int) -> int:
+        """Count the rows purge_questionnaire_batch has to remove for a questionnaire"""
+        conn = self.get_response_connection(questionnaire_id)
+        cursor = conn.cursor()
+        
+        total = 0
+        for table, _ in PURGE_TABLES:
+            cursor.execute(f'SELECT COUNT(*) FROM {table} WHERE questionnaire_id = ?', (questionnaire_id,))
+            total += cursor.fetchone()[0]
+        
+        conn.close()
+        return total
+    
+    @timed(DB_QUERY_LATENCY)
+    def purge_questionnaire_batch(self, questionnaire_id: int, batch_size: int) -> int:
+        """Delete up to batch_size rows of a soft-deleted questionnaire; returns 0 once it is gone"""
+        conn = self.get_response_connection(questionnaire_id)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('SELECT deleted_at FROM questionnaires WHERE id = ?', (questionnaire_id,))
+            row = cursor.fetchone()
+            if not row or row['deleted_at'] is None:
+                return 0  # Already purged, or never deleted
             
-            # 3. Delete questions
-            cursor.execute('DELETE FROM questions WHERE questionnaire_id = ?', (questionnaire_id,))
+            # Children first to maintain referential integrity, one short transaction per batch
+            for table, key in PURGE_TABLES:
+                cursor.execute(f'''
+                    DELETE FROM {table} WHERE ({key}) IN (
+                        SELECT {key} FROM {table} WHERE questionnaire_id = ? LIMIT ?
+                    )
+                ''', (questionnaire_id, batch_size))
+                if cursor.rowcount:
+                    conn.commit()
+                    return cursor.rowcount
             
-            # 4. Delete questionnaire
             cursor.execute('DELETE FROM questionnaires WHERE id = ?', (questionnaire_id,))
-            
             conn.commit()
-            return True
             
         except Exception as e:
             conn.rollback()
             raise e
         finally:
             conn.close()
+        
+        self.archive.remove(questionnaire_id)
+        return 0
+    
+    @timed(DB_QUERY_LATENCY)
+    def incremental_vacuum(self, pages: int) -> int:
+        """Return up to `pages` free pages per database file to the filesystem; returns the free pages left"""
+        remaining = 0
+        for path in self.database_files():
+            conn = self.get_connection(path)
+            cursor = conn.cursor()
+            
+            # The pragma frees one page per step and execute() only steps a row-less statement once;
+            # executescript() runs it to completion
+            conn.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+            cursor.execute('PRAGMA freelist_count')
+            remaining += cursor.fetchone()[0]
+            
+            conn.close()
+        return remaining
     
     # Question operations
+    @timed(DB_QUERY_LATENCY)
     def add_question(self, questionnaire_id: int, question_text: str, 
                     question_type: QuestionType, options: List[str] = None, 
-                    is_required: bool = True) -> int:
-        """Add question to questionnaire"""
+                    is_required: bool = True, branches: dict = None) -> int:
+        """Add question to questionnaire (as a new version once it has been activated)"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Get next order index
-        cursor.execute('''
-            SELECT COALESCE(MAX(order_index), 0) + 1 
-            FROM questions 
-            WHERE questionnaire_id = ?
-        ''', (questionnaire_id,))
-        order_index = cursor.fetchone()[0]
+        try:
+            version = self._editable_version(cursor, questionnaire_id, copy=True)
+            
+            # Get next position in the version
+            cursor.execute('''
+                SELECT COALESCE(MAX(position), 0) + 1 
+                FROM version_questions 
+                WHERE questionnaire_id = ? AND version = ?
+            ''', (questionnaire_id, version))
+            order_index = cursor.fetchone()[0]
+            
+            options_json = json.dumps(options) if options else None
+            
+            cursor.execute('''
+                INSERT INTO questions 
+                (questionnaire_id, question_text, question_type, options, is_required, order_index, branches)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (questionnaire_id, question_text, question_type.value, options_json, is_required, order_index,
+                  branches_to_json(branches)))
+            question_id = cursor.lastrowid
+            
+            cursor.execute('INSERT INTO version_questions VALUES (?, ?, ?, ?)',
+                           (questionnaire_id, version, order_index, question_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return question_id
+    
+    @staticmethod
+    def _editable_version(cursor, questionnaire_id: int, copy: bool) -> int:
+        """Version an edit may change: the current one while still a draft, otherwise a new one.
         
-        options_json = json.dumps(options) if options else None
+        A new version starts as a copy of the current one's questions when copy is set,
+        empty otherwise, and becomes current when the transaction commits.
+        """
+        cursor.execute('SELECT status, version FROM questionnaires WHERE id = ?', (questionnaire_id,))
+        row = cursor.fetchone()
+        if not row or row['status'] == QuestionnaireStatus.DRAFT.value:
+            return row['version'] if row else 1
         
-        cursor.execute('''
-            INSERT INTO questions 
-            (questionnaire_id, question_text, question_type, options, is_required, order_index)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (questionnaire_id, question_text, question_type.value, options_json, is_required, order_index))
+        version = row['version'] + 1
+        if copy:
+            cursor.execute('''
+                INSERT INTO version_questions (questionnaire_id, version, position, question_id)
+                SELECT questionnaire_id, ?, position, question_id FROM version_questions
+                WHERE questionnaire_id = ? AND version = ?
+            ''', (version, questionnaire_id, row['version']))
+        cursor.execute('UPDATE questionnaires SET version = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                       (version, questionnaire_id))
+        return version
+    
+    @timed(DB_QUERY_LATENCY)
+    def update_questionnaire(self, questionnaire_id: int, title: str, description: str,
+                             questions: List[Tuple[str, QuestionType, Optional[List[str]], bool, Optional[dict]]]) -> Optional[int]:
+        """Replace a questionnaire's title, description and questions; returns the version now current.
         
-        question_id = cursor.lastrowid
-        conn.commit()
+        Drafts are rewritten in place. Once activated, the questions become a new version, so
+        respondents already answering keep theirs; unchanged questions keep their rows and results.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('SELECT version FROM questionnaires WHERE id = ? AND deleted_at IS NULL', (questionnaire_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            current = row['version']
+            
+            cursor.execute('''
+                SELECT q.id, q.question_text, q.question_type, q.options, q.is_required, q.branches
+                FROM version_questions v JOIN questions q ON q.id = v.question_id
+                WHERE v.questionnaire_id = ? AND v.version = ?
+                ORDER BY v.position
+            ''', (questionnaire_id, current))
+            reusable = {}
+            current_keys = []
+            for question in cursor.fetchall():
+                key = (question['question_text'], question['question_type'], question['options'],
+                       bool(question['is_required']), question['branches'])
+                reusable.setdefault(key, []).append(question['id'])
+                current_keys.append(key)
+            keys = [(question_text, question_type.value, json.dumps(options) if options else None, bool(is_required),
+                     branches_to_json(branches))
+                    for question_text, question_type, options, is_required, branches in questions]
+            
+            # Unchanged questions need neither a new version nor any writes
+            version = current
+            if keys != current_keys:
+                version = self._editable_version(cursor, questionnaire_id, copy=False)
+                if version == current:
+                    cursor.execute('DELETE FROM version_questions WHERE questionnaire_id = ? AND version = ?',
+                                   (questionnaire_id, version))
+                
+                members = []
+                for position, key in enumerate(keys, start=1):
+                    question_text, question_type, options_json, is_required, branches_json = key
+                    matches = reusable.get(key)
+                    if matches:
+                        question_id = matches.pop(0)
+                    else:
+                        cursor.execute('''
+                            INSERT INTO questions 
+                            (questionnaire_id, question_text, question_type, options, is_required, order_index, branches)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ''', (questionnaire_id, question_text, question_type, options_json, is_required, position,
+                              branches_json))
+                        question_id = cursor.lastrowid
+                    members.append((questionnaire_id, version, position, question_id))
+                cursor.executemany('INSERT INTO version_questions VALUES (?, ?, ?, ?)', members)
+                
+                if version == current:
+                    # Nobody can have answered a draft, so questions it no longer uses go
+                    cursor.execute('''
+                        DELETE FROM questions WHERE questionnaire_id = ? AND id NOT IN (
+                            SELECT question_id FROM version_questions WHERE questionnaire_id = ?
+                        )
+                    ''', (questionnaire_id, questionnaire_id))
+            
+            cursor.execute('''
+                UPDATE questionnaires SET title = ?, description = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (title, description, questionnaire_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return version
+    
+    @timed(DB_QUERY_LATENCY)
+    def get_questions(self, questionnaire_id: int, version: int = None) -> List[Question]:
+        """Get the questions of a questionnaire version (default: the current one)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT {VERSION_QUESTION_COLUMNS}
+            FROM version_questions v JOIN questions q ON q.id = v.question_id
+            WHERE v.questionnaire_id = ? 
+              AND v.version = COALESCE(?, (SELECT version FROM questionnaires WHERE id = ?))
+            ORDER BY v.position
+        ''', (questionnaire_id, version, questionnaire_id))
+        
+        rows = cursor.fetchall()
         conn.close()
         
-        return question_id
+        return from_rows(Question, rows)
     
-    def get_questions(self, questionnaire_id: int) -> List[Question]:
-        """Get all questions for questionnaire"""
+    @timed(DB_QUERY_LATENCY)
+    def get_question_history(self, questionnaire_id: int) -> List[Question]:
+        """Get every question any version of the questionnaire has used, oldest first"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM questions 
+        cursor.execute(f'''
+            SELECT {Question.COLUMNS} FROM questions 
             WHERE questionnaire_id = ? 
-            ORDER BY order_index
+            ORDER BY id
         ''', (questionnaire_id,))
         
         rows = cursor.fetchall()
         conn.close()
         
-        questions = []
-        for row in rows:
-            options = json.loads(row['options']) if row['options'] else None
-            questions.append(Question(
-                id=row['id'],
-                questionnaire_id=row['questionnaire_id'],
-                question_text=row['question_text'],
-                question_type=QuestionType(row['question_type']),
-                options=options,
-                is_required=row['is_required'],
-                order_index=row['order_index']
-            ))
-        
-        return questions
+        return from_rows(Question, rows)
     
     # Response operations
-    def start_questionnaire_response(self, questionnaire_id: int, user_id: int):
-        """Start questionnaire response"""
-        conn = self.get_connection()
+    @timed(DB_QUERY_LATENCY)
+    def start_questionnaire_response(self, questionnaire_id: int, user_id: int, version: int = None):
+        """Start questionnaire response, pinned to a version (default: the current one)"""
+        conn = self.get_response_connection(questionnaire_id)
         cursor = conn.cursor()
         
+        # A restart replaces the earlier attempt, answers (and their term counts) included
         cursor.execute('''
-            INSERT OR REPLACE INTO questionnaire_responses 
-            (questionnaire_id, user_id, started_at, is_completed)
-            VALUES (?, ?, CURRENT_TIMESTAMP, FALSE)
+            SELECT questionnaire_id, question_id, answer_text FROM responses
+            WHERE questionnaire_id = ? AND user_id = ? AND answer_text IS NOT NULL
         ''', (questionnaire_id, user_id))
+        self._uncount_answers(cursor, cursor.fetchall())
+        cursor.execute('DELETE FROM responses WHERE questionnaire_id = ? AND user_id = ?', (questionnaire_id, user_id))
+        cursor.execute('''
+            INSERT OR REPLACE INTO questionnaire_responses 
+            (questionnaire_id, user_id, started_at, is_completed, version)
+            VALUES (?, ?, CURRENT_TIMESTAMP, FALSE, COALESCE(?, (SELECT version FROM questionnaires WHERE id = ?)))
+        ''', (questionnaire_id, user_id, version, questionnaire_id))
         
         conn.commit()
         conn.close()
     
+    @timed(DB_QUERY_LATENCY)
     def save_response(self, questionnaire_id: int, user_id: int, question_id: int,
                      answer_text: str = None, selected_option: int = None, 
-                     selected_options: List[int] = None):
-        """Save response to question"""
-        conn = self.get_connection()
+                     selected_options: List[int] = None, answer_number: float = None,
+                     answer_date: str = None):
+        """Save response to question (answer_number for number and rating questions, answer_date for dates)"""
+        conn = self.get_response_connection(questionnaire_id)
         cursor = conn.cursor()
         
-        selected_options_json = json.dumps(selected_options) if selected_options else None
+        selected_mask = options_to_mask(selected_options)
+        
+        # An overwritten answer's terms stop counting
+        cursor.execute('''
+            SELECT questionnaire_id, question_id, answer_text FROM responses
+            WHERE questionnaire_id = ? AND user_id = ? AND question_id = ? AND answer_text IS NOT NULL
+        ''', (questionnaire_id, user_id, question_id))
+        self._uncount_answers(cursor, cursor.fetchall())
         
+        # An update rather than REPLACE, so the row keeps its id and the search triggers see the change
         cursor.execute('''
-            INSERT OR REPLACE INTO responses 
-            (questionnaire_id, user_id, question_id, answer_text, selected_option, selected_options)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (questionnaire_id, user_id, question_id, answer_text, selected_option, selected_options_json))
+            INSERT INTO responses 
+            (questionnaire_id, user_id, question_id, answer_text, selected_option, selected_mask,
+             answer_number, answer_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (questionnaire_id, user_id, question_id) DO UPDATE SET
+                answer_text = excluded.answer_text, selected_option = excluded.selected_option,
+                selected_mask = excluded.selected_mask, answer_number = excluded.answer_number,
+                answer_date = excluded.answer_date, created_at = CURRENT_TIMESTAMP
+        ''', (questionnaire_id, user_id, question_id, answer_text, selected_option, selected_mask,
+              answer_number, answer_date))
+        
+        if answer_text is not None:
+            cursor.executemany(TERM_COUNT_UPSERT, [
+                (questionnaire_id, question_id, kind, term, count)
+                for (kind, term), count in answer_terms(answer_text).items()
+            ])
         
         conn.commit()
         conn.close()
     
+    @timed(DB_QUERY_LATENCY)
     def complete_questionnaire_response(self, questionnaire_id: int, user_id: int):
         """Mark questionnaire response as completed"""
-        conn = self.get_connection()
+        conn = self.get_response_connection(questionnaire_id)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -393,49 +1159,54 @@ class Database:
         conn.commit()
         conn.close()
     
+    @timed(DB_QUERY_LATENCY)
     def get_questionnaire_stats(self, questionnaire_id: int) -> dict:
         """Get questionnaire statistics"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Get total responses
-        cursor.execute('''
-            SELECT COUNT(*) as total_started,
-                   COUNT(CASE WHEN is_completed = 1 THEN 1 END) as total_completed
-            FROM questionnaire_responses 
-            WHERE questionnaire_id = ?
-        ''', (questionnaire_id,))
-        
-        stats = cursor.fetchone()
-        conn.close()
+        with self.read_connection(questionnaire_id) as conn:
+            cursor = conn.cursor()
+            
+            # Get total responses
+            cursor.execute('''
+                SELECT COUNT(*) as total_started,
+                       COUNT(CASE WHEN is_completed = 1 THEN 1 END) as total_completed
+                FROM questionnaire_responses 
+                WHERE questionnaire_id = ?
+            ''', (questionnaire_id,))
+            
+            stats = cursor.fetchone()
         
         return {
             'total_started': stats['total_started'],
             'total_completed': stats['total_completed']
         }
     
+    @timed(DB_QUERY_LATENCY)
     def get_questionnaire_responses(self, questionnaire_id: int) -> List[dict]:
         """Get all responses for questionnaire"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT qr.user_id, u.username, u.first_name, u.last_name,
-                   qr.started_at, qr.completed_at, qr.is_completed,
-                   q.id as question_id, q.question_text, q.question_type, q.options,
-                   r.answer_text, r.selected_option
-            FROM questionnaire_responses qr
-            JOIN users u ON qr.user_id = u.user_id
-            LEFT JOIN questions q ON q.questionnaire_id = qr.questionnaire_id
-            LEFT JOIN responses r ON r.questionnaire_id = qr.questionnaire_id 
-                                  AND r.user_id = qr.user_id 
-                                  AND r.question_id = q.id
-            WHERE qr.questionnaire_id = ?
-            ORDER BY qr.user_id, q.order_index
-        ''', (questionnaire_id,))
+        with self.read_connection(questionnaire_id) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT qr.user_id, u.username, u.first_name, u.last_name,
+                       qr.started_at, qr.completed_at, qr.is_completed,
+                       q.id as question_id, q.question_text, q.question_type, q.options,
+                       r.answer_text, r.selected_option, r.selected_mask, r.answer_number, r.answer_date
+                FROM questionnaire_responses qr
+                JOIN users u ON qr.user_id = u.user_id
+                LEFT JOIN version_questions v ON v.questionnaire_id = qr.questionnaire_id
+                                              AND v.version = qr.version
+                LEFT JOIN questions q ON q.id = v.question_id
+                LEFT JOIN responses r ON r.questionnaire_id = qr.questionnaire_id 
+                                      AND r.user_id = qr.user_id 
+                                      AND r.question_id = q.id
+                WHERE qr.questionnaire_id = ?
+                ORDER BY qr.user_id, v.position
+            ''', (questionnaire_id,))
+            
+            rows = cursor.fetchall()
         
-        rows = cursor.fetchall()
-        conn.close()
+        # Answers of archived questionnaires are read back from cold storage
+        archived = self.archive.answers(questionnaire_id) if self.archive.exists(questionnaire_id) else {}
         
         # Group responses by user
         user_responses = {}
@@ -456,20 +1227,424 @@ class Database:
                 }
             
             if row['question_id']:  # Only add if question exists
+                answer = row
+                if (archived and row['answer_text'] is None and row['selected_option'] is None
+                        and row['selected_mask'] is None and row['answer_number'] is None
+                        and row['answer_date'] is None):
+                    answer = archived.get((user_id, row['question_id']), row)
+                
                 response_data = {
                     'question_id': row['question_id'],
                     'question_text': row['question_text'],
                     'question_type': row['question_type'],
-                    'answer_text': row['answer_text'],
-                    'selected_option': row['selected_option']
+                    'answer_text': answer['answer_text'],
+                    'selected_option': answer['selected_option'],
+                    'answer_number': answer['answer_number'],
+                    'answer_date': answer['answer_date']
                 }
                 
                 if row['options']:
                     options = json.loads(row['options'])
                     response_data['options'] = options
-                    if row['selected_option'] is not None:
-                        response_data['selected_option_text'] = options[row['selected_option']]
+                    if row['question_type'] == QuestionType.RATING.value and answer['answer_number'] is not None:
+                        response_data['selected_option_text'] = options[int(answer['answer_number']) - 1]
+                    if answer['selected_option'] is not None:
+                        response_data['selected_option_text'] = options[answer['selected_option']]
+                    if answer['selected_mask'] is not None:
+                        response_data['selected_options'] = mask_to_options(answer['selected_mask'])
+                        response_data['selected_option_text'] = ', '.join(
+                            options[index] for index in response_data['selected_options'] if index < len(options))
                 
                 user_responses[user_id]['responses'].append(response_data)
         
-        return list(user_responses.values()) 
\ No newline at end of file
+        return list(user_responses.values()) 
+    
+    @timed(DB_QUERY_LATENCY)
+    def get_option_stats(self, questionnaire_id: int) -> Dict[int, dict]:
+        """Multiple-choice selections per question: {question_id: {'answers', 'tallies': [per option], 'pairs': {(i, j): n}}}"""
+        with self.read_connection(questionnaire_id) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT id, options FROM questions WHERE questionnaire_id = ? AND question_type = ? ORDER BY order_index',
+                           (questionnaire_id, QuestionType.MULTIPLE_CHOICE.value))
+            option_counts = {row['id']: len(json.loads(row['options'] or '[]')) for row in cursor.fetchall()}
+            stats = {question_id: {'answers': 0, 'tallies': [0] * count, 'pairs': {}}
+                     for question_id, count in option_counts.items()}
+            if not stats:
+                return stats
+            
+            # One pass groups answers by distinct mask (at most 2^options per question); the bit
+            # expansion then only touches those groups. first = second rows are the option tallies
+            cursor.execute('''
+                WITH RECURSIVE bits(i) AS (
+                    SELECT 0 UNION ALL SELECT i + 1 FROM bits WHERE i + 1 < ?
+                ),
+                masks AS (
+                    SELECT question_id, selected_mask AS mask, COUNT(*) AS answers FROM responses
+                    WHERE questionnaire_id = ? AND selected_mask IS NOT NULL
+                    GROUP BY question_id, selected_mask
+                )
+                SELECT m.question_id, a.i AS first, b.i AS second, SUM(m.answers) AS answers
+                FROM masks m
+                JOIN bits a ON (m.mask >> a.i) & 1
+                JOIN bits b ON b.i >= a.i AND (m.mask >> b.i) & 1
+                GROUP BY m.question_id, a.i, b.i
+                UNION ALL
+                SELECT question_id, NULL, NULL, SUM(answers) FROM masks GROUP BY question_id
+            ''', (max(option_counts.values()), questionnaire_id))
+            rows = cursor.fetchall()
+        
+        for row in rows:
+            question = stats.get(row['question_id'])
+            if question is None:
+                continue
+            if row['first'] is None:
+                question['answers'] += row['answers']
+            elif row['first'] >= len(question['tallies']) or row['second'] >= len(question['tallies']):
+                continue
+            elif row['first'] == row['second']:
+                question['tallies'][row['first']] += row['answers']
+            else:
+                question['pairs'][(row['first'], row['second'])] = row['answers']
+        
+        # Archived selections are counted from cold storage
+        if self.archive.exists(questionnaire_id):
+            archived = {}
+            for row in self.archive.answers(questionnaire_id).values():
+                if row['question_id'] in stats and row['selected_mask'] is not None:
+                    masks = archived.setdefault(row['question_id'], {})
+                    masks[row['selected_mask']] = masks.get(row['selected_mask'], 0) + 1
+            for question_id, mask_counts in archived.items():
+                question = stats[question_id]
+                extra = tally_masks(mask_counts, len(question['tallies']))
+                question['answers'] += extra['answers']
+                question['tallies'] = [hot + cold for hot, cold in zip(question['tallies'], extra['tallies'])]
+                for pair, answers in extra['pairs'].items():
+                    question['pairs'][pair] = question['pairs'].get(pair, 0) + answers
+        
+        return stats
+    
+    @timed(DB_QUERY_LATENCY)
+    def get_numeric_stats(self, questionnaire_id: int) -> Dict[int, dict]:
+        """Number, rating and date answers per question: {question_id: {'answers', 'mean', 'median', 'min', 'max',
+        'start', 'width', 'histogram': [answers per bucket]}}; dates are julian days (models.from_julian_day)"""
+        with self.read_connection(questionnaire_id) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT id, question_type, options FROM questions
+                WHERE questionnaire_id = ? AND question_type IN ({', '.join('?' * len(NUMERIC_TYPES))})
+                ORDER BY order_index
+            ''', (questionnaire_id, *(question_type.value for question_type in NUMERIC_TYPES)))
+            questions = {row['id']: (QuestionType(row['question_type']), len(json.loads(row['options'] or '[]')))
+                         for row in cursor.fetchall()}
+            stats = {question_id: {'answers': 0} for question_id in questions}
+            if not stats:
+                return stats
+            
+            # Archived questionnaires are summarised from their answer values in Python instead
+            if self.archive.exists(questionnaire_id):
+                cursor.execute('''
+                    SELECT question_id, answer_number, answer_date FROM responses
+                    WHERE questionnaire_id = ? AND (answer_number IS NOT NULL OR answer_date IS NOT NULL)
+                ''', (questionnaire_id,))
+                values = {}
+                # Archives written before answers were unique may still hold an attempt's earlier answers
+                for row in list(cursor.fetchall()) + list(self.archive.answers(questionnaire_id).values()):
+                    value = answer_value(row['answer_number'], row['answer_date'])
+                    if row['question_id'] in questions and value is not None:
+                        values.setdefault(row['question_id'], []).append(value)
+                for question_id, question_values in values.items():
+                    stats[question_id] = summarize_values(*questions[question_id], question_values)
+                return stats
+            
+            # Count, mean, range and median (the middle one or two rows by value) in one pass
+            cursor.execute(f'''
+                WITH ranked AS (
+                    SELECT question_id, {ANSWER_VALUE_SQL} AS value,
+                           ROW_NUMBER() OVER (PARTITION BY question_id ORDER BY {ANSWER_VALUE_SQL}) AS position,
+                           COUNT(*) OVER (PARTITION BY question_id) AS answers
+                    FROM responses
+                    WHERE questionnaire_id = ? AND (answer_number IS NOT NULL OR answer_date IS NOT NULL)
+                )
+                SELECT question_id, COUNT(*) AS answers, AVG(value) AS mean, MIN(value) AS low, MAX(value) AS high,
+                       AVG(CASE WHEN position IN ((answers + 1) / 2, (answers + 2) / 2) THEN value END) AS median
+                FROM ranked GROUP BY question_id
+            ''', (questionnaire_id,))
+            buckets = {}
+            for row in cursor.fetchall():
+                if row['question_id'] not in questions:
+                    continue
+                start, width, count = histogram_params(*questions[row['question_id']], row['low'], row['high'])
+                stats[row['question_id']] = {
+                    'answers': row['answers'], 'mean': row['mean'], 'median': row['median'],
+                    'min': row['low'], 'max': row['high'],
+                    'start': start, 'width': width, 'histogram': [0] * count,
+                }
+                buckets[str(row['question_id'])] = [start, width, count]
+            if not buckets:
+                return stats
+            
+            # Histogram: answers per bucket, bucket ranges passed in as JSON
+            cursor.execute(f'''
+                WITH ranges AS (
+                    SELECT CAST(key AS INTEGER) AS question_id, json_extract(value, '$[0]') AS start,
+                           json_extract(value, '$[1]') AS width, json_extract(value, '$[2]') AS buckets
+                    FROM json_each(?)
+                )
+                SELECT r.question_id,
+                       MIN(MAX(CAST(({ANSWER_VALUE_SQL} - g.start) / g.width AS INTEGER), 0), g.buckets - 1) AS bucket,
+                       COUNT(*) AS answers
+                FROM responses r JOIN ranges g ON g.question_id = r.question_id
+                WHERE r.questionnaire_id = ? AND (answer_number IS NOT NULL OR answer_date IS NOT NULL)
+                GROUP BY r.question_id, bucket
+            ''', (json.dumps(buckets), questionnaire_id))
+            for row in cursor.fetchall():
+                stats[row['question_id']]['histogram'][row['bucket']] = row['answers']
+        
+        return stats
+    
+    @timed(DB_QUERY_LATENCY)
+    def get_top_terms(self, questionnaire_id: int, limit: int = 5) -> Dict[int, Dict[str, List[Tuple[str, int]]]]:
+        """Most frequent terms and phrases per TEXT question: {question_id: {'term': [(term, answers)], 'phrase': [...]}}"""
+        with self.read_connection(questionnaire_id) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT id FROM questions WHERE questionnaire_id = ? AND question_type = ? ORDER BY order_index',
+                           (questionnaire_id, QuestionType.TEXT.value))
+            question_ids = [row['id'] for row in cursor.fetchall()]
+            
+            top = {}
+            for question_id in question_ids:
+                top[question_id] = {}
+                for kind in (TERM, PHRASE):
+                    # Reads the first `limit` entries of idx_text_term_counts_top; no sort
+                    cursor.execute('''
+                        SELECT term, count FROM text_term_counts
+                        WHERE questionnaire_id = ? AND question_id = ? AND kind = ?
+                        ORDER BY count DESC, term LIMIT ?
+                    ''', (questionnaire_id, question_id, kind, limit))
+                    top[question_id][kind] = [(row['term'], row['count']) for row in cursor.fetchall()]
+        
+        return top
+    
+    @timed(DB_QUERY_LATENCY)
+    def search_responses(self, questionnaire_id: int, query: str, limit: int,
+                         offset: int = 0) -> Tuple[int, List[dict]]:
+        """Full-text search a questionnaire's text answers; returns the match count and one ranked page"""
+        terms = parse_query(query)
+        if not terms:
+            return 0, []
+        expression = match_expression(questionnaire_id, terms)
+        
+        with self.read_connection(questionnaire_id) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT COUNT(*) FROM responses_fts WHERE responses_fts MATCH ?', (expression,))
+            total = cursor.fetchone()[0]
+            
+            # Rank and page inside the index first so only one page of rows is looked up
+            cursor.execute('''
+                SELECT r.id AS response_id, r.user_id, u.username, u.first_name, u.last_name,
+                       r.question_id, q.question_text, r.answer_text, r.created_at
+                FROM (
+                    SELECT rowid, rank FROM responses_fts
+                    WHERE responses_fts MATCH ?
+                    ORDER BY rank LIMIT ? OFFSET ?
+                ) m
+                JOIN responses r ON r.id = m.rowid
+                JOIN questions q ON q.id = r.question_id
+                LEFT JOIN users u ON u.user_id = r.user_id
+                ORDER BY m.rank
+            ''', (expression, limit, offset))
+            
+            results = [dict(row) for row in cursor.fetchall()]
+        
+        return total, results
+    
+    # Retention operations
+    @timed(DB_QUERY_LATENCY)
+    def purge_incomplete_attempts(self, older_than_days: float, batch_size: int) -> int:
+        """Delete up to batch_size unfinished attempts started before the cutoff, with their partial answers"""
+        for path in self.response_paths():
+            deleted = self._purge_incomplete_attempts(path, older_than_days, batch_size)
+            if deleted:
+                return deleted
+        return 0
+    
+    def _purge_incomplete_attempts(self, path: str, older_than_days: float, batch_size: int) -> int:
+        conn = self.get_connection(path)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                SELECT rowid, questionnaire_id, user_id FROM questionnaire_responses
+                WHERE is_completed = 0 AND started_at <= datetime('now', ?)
+                LIMIT ?
+            ''', (f'-{older_than_days} days', batch_size))
+            attempts = cursor.fetchall()
+            if not attempts:
+                return 0
+            
+            # Partial text answers stop counting towards the term statistics
+            placeholders = ', '.join('(?, ?)' for _ in attempts)
+            cursor.execute(f'''
+                SELECT questionnaire_id, question_id, answer_text FROM responses
+                WHERE (questionnaire_id, user_id) IN (VALUES {placeholders}) AND answer_text IS NOT NULL
+            ''', [value for row in attempts for value in (row['questionnaire_id'], row['user_id'])])
+            self._uncount_answers(cursor, cursor.fetchall())
+            
+            cursor.executemany('DELETE FROM responses WHERE questionnaire_id = ? AND user_id = ?',
+                               [(row['questionnaire_id'], row['user_id']) for row in attempts])
+            answers = cursor.rowcount
+            cursor.executemany('DELETE FROM questionnaire_responses WHERE rowid = ?',
+                               [(row['rowid'],) for row in attempts])
+            
+            conn.commit()
+            return len(attempts) + answers
+            
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+    
+    def _uncount_answers(self, cursor, rows):
+        """Subtract deleted answers (questionnaire_id, question_id, answer_text rows) from text_term_counts"""
+        decrements = {}
+        for row in rows:
+            for (kind, term), count in answer_terms(row['answer_text']).items():
+                key = (row['questionnaire_id'], row['question_id'], kind, term)
+                decrements[key] = decrements.get(key, 0) + count
+        
+        cursor.executemany('''
+            UPDATE text_term_counts SET count = count - ?
+            WHERE questionnaire_id = ? AND question_id = ? AND kind = ? AND term = ?
+        ''', [(count, *key) for key, count in decrements.items()])
+        cursor.executemany('''
+            DELETE FROM text_term_counts
+            WHERE questionnaire_id = ? AND question_id = ? AND kind = ? AND term = ? AND count <= 0
+        ''', list(decrements))
+    
+    @timed(DB_QUERY_LATENCY)
+    def purge_stale_users(self, older_than_days: float, batch_size: int) -> int:
+        """Delete up to batch_size non-admin users first seen before the cutoff who left no data behind"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        attempts = 'questionnaire_responses'
+        if self.shards:
+            # Attempts are spread over the shards; collect who has any into a temp table
+            cursor.execute('CREATE TEMP TABLE respondents (user_id INTEGER PRIMARY KEY)')
+            for path in self.response_paths():
+                shard = self.get_connection(path)
+                user_ids = shard.execute('SELECT DISTINCT user_id FROM questionnaire_responses').fetchall()
+                shard.close()
+                cursor.executemany('INSERT OR IGNORE INTO temp.respondents VALUES (?)', [tuple(row) for row in user_ids])
+            attempts = 'temp.respondents'
+        
+        # /start recreates the row, so a returning user only loses an empty profile
+        cursor.execute(f'''
+            DELETE FROM users WHERE user_id IN (
+                SELECT u.user_id FROM users u
+                WHERE u.is_admin = 0 AND u.created_at <= datetime('now', ?)
+                  AND NOT EXISTS (SELECT 1 FROM {attempts} qr WHERE qr.user_id = u.user_id)
+                  AND NOT EXISTS (SELECT 1 FROM questionnaires q WHERE q.created_by = u.user_id)
+                LIMIT ?
+            )
+        ''', (f'-{older_than_days} days', batch_size))
+        
+        deleted = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return deleted
+    
+    def database_files(self) -> List[str]:
+        """The catalog file followed by any shard files"""
+        return [self.db_path] + (self.response_paths() if self.shards else [])
+    
+    def database_size(self) -> int:
+        """Total size of the database files in bytes"""
+        return sum(os.path.getsize(path) for path in self.database_files() if os.path.exists(path))
+    
+    # Archive operations
+    @timed(DB_QUERY_LATENCY)
+    def get_archivable_questionnaires(self, older_than_days: float) -> List[int]:
+        """Get ids of questionnaires closed for longer than the given number of days"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT id FROM questionnaires
+            WHERE status = ? AND archived_at IS NULL AND deleted_at IS NULL AND updated_at <= datetime('now', ?)
+            ORDER BY id
+        ''', (QuestionnaireStatus.CLOSED.value, f'-{older_than_days} days'))
+        
+        ids = [row['id'] for row in cursor.fetchall()]
+        conn.close()
+        return ids
+    
+    @timed(DB_QUERY_LATENCY)
+    def archive_questionnaire(self, questionnaire_id: int) -> int:
+        """Move a questionnaire's responses to cold storage; returns the number of rows moved"""
+        conn = self.get_response_connection(questionnaire_id)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(f'''
+                SELECT {', '.join(ARCHIVE_COLUMNS)} FROM responses
+                WHERE questionnaire_id = ?
+                ORDER BY id
+            ''', (questionnaire_id,))
+            rows = cursor.fetchall()
+            
+            # The archive is written (and fsynced) before any hot row is deleted; rows
+            # that arrive meanwhile have higher ids and simply stay in the hot table
+            if rows:
+                self.archive.write(questionnaire_id, rows)
+                cursor.execute('DELETE FROM responses WHERE questionnaire_id = ? AND id <= ?',
+                               (questionnaire_id, rows[-1]['id']))
+            
+            cursor.execute('UPDATE questionnaires SET archived_at = CURRENT_TIMESTAMP WHERE id = ?',
+                           (questionnaire_id,))
+            conn.commit()
+            return len(rows)
+            
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+    
+    @timed(DB_QUERY_LATENCY)
+    def restore_questionnaire(self, questionnaire_id: int) -> int:
+        """Move a questionnaire's archived responses back into the hot table"""
+        rows = self.archive.answers(questionnaire_id)
+        conn = self.get_response_connection(questionnaire_id)
+        cursor = conn.cursor()
+        
+        try:
+            # Original ids are kept; AUTOINCREMENT never hands out a deleted id again
+            cursor.executemany(f'''
+                INSERT OR IGNORE INTO responses (questionnaire_id, {', '.join(ARCHIVE_COLUMNS)})
+                VALUES (?, {', '.join('?' * len(ARCHIVE_COLUMNS))})
+            ''', [(questionnaire_id, *(row[column] for column in ARCHIVE_COLUMNS)) for row in rows.values()])
+            
+            cursor.execute('UPDATE questionnaires SET archived_at = NULL WHERE id = ?', (questionnaire_id,))
+            conn.commit()
+            
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+        
+        self.archive.remove(questionnaire_id)
+        return len(rows)
+    
+    def archive_closed_questionnaires(self, older_than_days: float) -> List[Tuple[int, int]]:
+        """Archive every questionnaire closed for longer than the given days; returns (id, rows) pairs"""
+        return [
+            (questionnaire_id, self.archive_questionnaire(questionnaire_id))
+            for questionnaire_id in self.get_archivable_questionnaires(older_than_days)
+        ]
@@ -0,0 +1,42 @@
+from collections import deque
+
+
+class UpdateDeduplicator:
+    """Detect redelivered Telegram updates in O(1) without touching the database.
+
+    Recent update_ids are kept in a bounded ring buffer backed by a set. Anything
+    at or below ``floor`` counts as already processed: the floor starts at the
+    persisted high-water mark and rises as old ids fall out of the ring.
+    """
+
+    def __init__(self, capacity: int = 10000, high_water_mark: int = 0):
+        self.capacity = capacity
+        self.floor = high_water_mark
+        self.high_water_mark = high_water_mark
+        self.persisted_mark = high_water_mark
+        self._ring = deque()
+        self._seen = set()
+
+    def seen(self, update_id: int) -> bool:
+        """Return True if update_id was already processed, otherwise record it"""
+        if update_id <= self.floor or update_id in self._seen:
+            return True
+
+        self._seen.add(update_id)
+        self._ring.append(update_id)
+        if len(self._ring) > self.capacity:
+            evicted = self._ring.popleft()
+            self._seen.discard(evicted)
+            self.floor = max(self.floor, evicted)
+
+        if update_id > self.high_water_mark:
+            self.high_water_mark = update_id
+        return False
+
+    @property
+    def dirty(self) -> bool:
+        """Whether the high-water mark moved since it was last persisted"""
+        return self.high_water_mark != self.persisted_mark
+
+    def mark_persisted(self):
+        self.persisted_mark = self.high_water_mark
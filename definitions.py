@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Questionnaire definitions: a whole questionnaire as one JSON or YAML document.
+
+    title: Customer feedback
+    description: Tell us how we did
+    questions:
+      - text: How did you hear about us?
+        type: single_choice          # single_choice | multiple_choice | text | number | rating | date
+        options: [Friend, Search, Ad]
+        goto: {Ad: 3}                # optional: option -> question number or end, '*' for the rest
+      - text: Who recommended us?
+        type: text
+        goto: 3                      # optional: where every answer goes next
+      - text: How likely are you to recommend us?
+        type: rating
+        options: [Unlikely, Maybe, Likely]  # scale labels, lowest first; defaults to 1-5
+      - text: Anything else?
+        type: text
+        required: false              # optional, defaults to true
+
+Admins upload a definition file to the bot or use the command line:
+
+    python definitions.py import survey.yaml --admin 123456789
+    python definitions.py import survey.yaml --update 42
+    python definitions.py export 42 --format yaml --output survey.yaml
+"""
+
+import argparse
+import json
+import sys
+from typing import List, Optional, Tuple
+
+from compiled import DEFAULT_BRANCH, END_OF_SURVEY, branching_errors
+from config import Config
+from models import MAX_MASK_OPTIONS, Question, Questionnaire, QuestionType
+
+JSON_EXTENSIONS = ('.json',)
+YAML_EXTENSIONS = ('.yaml', '.yml')
+
+# Uploaded definition files larger than this are refused before downloading
+MAX_DEFINITION_BYTES = 1024 * 1024
+
+# Keep every question renderable in one Telegram message and options on a button
+MAX_TITLE_LENGTH = 256
+MAX_TEXT_LENGTH = 1024
+MAX_OPTION_LENGTH = 128
+
+# Scale of rating questions defined without labels
+DEFAULT_RATING_SCALE = ['1', '2', '3', '4', '5']
+
+# Validation errors reported back; the rest are summarised as a count
+MAX_REPORTED_ERRORS = 10
+
+QUESTION_TYPES = {question_type.value: question_type for question_type in QuestionType}
+# Names used by the chat creation flow
+QUESTION_TYPES.update({'single': QuestionType.SINGLE_CHOICE, 'multiple': QuestionType.MULTIPLE_CHOICE})
+
+DEFINITION_KEYS = {'title', 'description', 'questions'}
+QUESTION_KEYS = {'text', 'type', 'options', 'required', 'goto'}
+
+# (question_text, question_type, options, is_required, branches), the arguments of add_question
+QuestionSpec = Tuple[str, QuestionType, Optional[List[str]], bool, Optional[dict]]
+
+
+class DefinitionError(ValueError):
+    """A definition that cannot be parsed or fails validation"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+    def format(self) -> str:
+        """Bulleted error list for a chat reply"""
+        lines = [f"• {error}" for error in self.errors[:MAX_REPORTED_ERRORS]]
+        if len(self.errors) > MAX_REPORTED_ERRORS:
+            lines.append(f"… and {len(self.errors) - MAX_REPORTED_ERRORS} more")
+        return '\n'.join(lines)
+
+
+def is_definition_file(filename: str) -> bool:
+    """Whether a file name has a definition extension"""
+    return (filename or '').lower().endswith(JSON_EXTENSIONS + YAML_EXTENSIONS)
+
+
+def parse_definition(text: str, filename: str = '') -> dict:
+    """Parse a definition document, YAML for .yaml/.yml files and JSON otherwise"""
+    if filename.lower().endswith(YAML_EXTENSIONS):
+        try:
+            import yaml
+        except ImportError:
+            raise DefinitionError(["YAML definitions need PyYAML (pip install pyyaml); JSON works without it"])
+        try:
+            return yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise DefinitionError([f"Invalid YAML: {e}"])
+
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise DefinitionError([f"Invalid JSON: {e}"])
+
+
+def _text(value, path: str, limit: int, errors: List[str], required: bool = True) -> str:
+    if not required and value in (None, ''):
+        return ''
+    if not isinstance(value, str) or not value.strip():
+        errors.append(f"{path}: must be a non-empty string")
+        return ''
+    if len(value) > limit:
+        errors.append(f"{path}: longer than {limit} characters")
+    return value.strip()
+
+
+def _branches(goto, question_type: QuestionType, options: Optional[List[str]], path: str,
+              errors: List[str]) -> Optional[dict]:
+    """Stored branches of a goto field: option index (or '*') -> question number or 'end'"""
+    if goto is None:
+        return None
+    if not isinstance(goto, dict):
+        goto = {DEFAULT_BRANCH: goto}
+    elif question_type is not QuestionType.SINGLE_CHOICE:
+        errors.append(f"{path}.goto: only single_choice questions branch by option; use one target")
+        return None
+
+    branches = {}
+    for option, target in goto.items():
+        if option == DEFAULT_BRANCH:
+            key = DEFAULT_BRANCH
+        elif options and option in options:
+            key = str(options.index(option))
+        else:
+            errors.append(f"{path}.goto: {option!r} is not one of the options")
+            continue
+        if target != END_OF_SURVEY and (not isinstance(target, int) or isinstance(target, bool)):
+            errors.append(f"{path}.goto: target must be a question number or '{END_OF_SURVEY}'")
+            continue
+        branches[key] = target
+    return branches or None
+
+
+def validate_definition(data) -> Tuple[str, str, List[QuestionSpec]]:
+    """Check a parsed definition against the questionnaire limits; returns (title, description, questions).
+
+    Every problem is collected, so one upload reports all of them.
+    """
+    if not isinstance(data, dict):
+        raise DefinitionError(["The definition must be a mapping with title, description and questions"])
+
+    errors = [f"{key}: unknown field" for key in sorted(set(data) - DEFINITION_KEYS, key=str)]
+    title = _text(data.get('title'), 'title', MAX_TITLE_LENGTH, errors)
+    description = _text(data.get('description'), 'description', MAX_TEXT_LENGTH, errors, required=False)
+
+    questions = data.get('questions')
+    max_questions = getattr(Config, 'MAX_QUESTIONS_PER_QUESTIONNAIRE', 20)
+    if not isinstance(questions, list) or not questions:
+        errors.append("questions: must be a non-empty list")
+        questions = []
+    elif len(questions) > max_questions:
+        errors.append(f"questions: {len(questions)} questions, at most {max_questions} allowed")
+
+    max_options = min(getattr(Config, 'MAX_OPTIONS_PER_QUESTION', 10), MAX_MASK_OPTIONS)
+    specs = []
+    for number, question in enumerate(questions, start=1):
+        path = f"questions[{number}]"
+        if not isinstance(question, dict):
+            errors.append(f"{path}: must be a mapping with text and type")
+            continue
+        errors.extend(f"{path}.{key}: unknown field" for key in sorted(set(question) - QUESTION_KEYS, key=str))
+
+        question_text = _text(question.get('text'), f"{path}.text", MAX_TEXT_LENGTH, errors)
+        question_type = question.get('type')
+        question_type = QUESTION_TYPES.get(question_type) if isinstance(question_type, str) else None
+        if question_type is None:
+            errors.append(f"{path}.type: must be one of {', '.join(t.value for t in QuestionType)}")
+
+        is_required = question.get('required', True)
+        if not isinstance(is_required, bool):
+            errors.append(f"{path}.required: must be true or false")
+
+        options = question.get('options')
+        if question_type in (QuestionType.TEXT, QuestionType.NUMBER, QuestionType.DATE, None):
+            if options is not None and question_type is not None:
+                errors.append(f"{path}.options: {question_type.value} questions have no options")
+            options = None
+        elif question_type is QuestionType.RATING and options is None:
+            options = list(DEFAULT_RATING_SCALE)
+        elif not isinstance(options, list) or len(options) < 2:
+            errors.append(f"{path}.options: {question_type.value} questions need at least 2 options")
+            options = None
+        else:
+            if len(options) > max_options:
+                errors.append(f"{path}.options: {len(options)} options, at most {max_options} allowed")
+            options = [_text(option, f"{path}.options[{i}]", MAX_OPTION_LENGTH, errors)
+                       for i, option in enumerate(options, start=1)]
+            if len(set(options)) < len(options):
+                errors.append(f"{path}.options: duplicate options")
+
+        branches = _branches(question.get('goto'), question_type, options, path, errors)
+        specs.append((question_text, question_type, options, is_required, branches))
+
+    # Branch targets, loops and unreachable questions, once every question is well-formed
+    if not errors:
+        errors.extend(branching_errors([(question_type, options, branches)
+                                        for _, question_type, options, _, branches in specs]))
+
+    if errors:
+        raise DefinitionError(errors)
+    return title, description, specs
+
+
+def load_definition(text: str, filename: str = '') -> Tuple[str, str, List[QuestionSpec]]:
+    """Parse and validate a definition document"""
+    return validate_definition(parse_definition(text, filename))
+
+
+def export_definition(questionnaire: Questionnaire, questions: List[Question]) -> dict:
+    """Definition of an existing questionnaire, importable as a copy"""
+    definition_questions = []
+    for question in questions:
+        item = {'text': question.question_text, 'type': question.question_type.value}
+        if question.options:
+            item['options'] = question.options
+        if not question.is_required:
+            item['required'] = False
+        branches = question.branches
+        if branches and set(branches) == {DEFAULT_BRANCH}:
+            item['goto'] = branches[DEFAULT_BRANCH]
+        elif branches:
+            item['goto'] = {question.options[int(key)] if key != DEFAULT_BRANCH else key: target
+                            for key, target in branches.items()}
+        definition_questions.append(item)
+    return {
+        'title': questionnaire.title,
+        'description': questionnaire.description or '',
+        'questions': definition_questions,
+    }
+
+
+def dump_definition(definition: dict, yaml_format: bool = False) -> str:
+    """Serialise a definition as JSON or YAML"""
+    if yaml_format:
+        import yaml
+        return yaml.safe_dump(definition, allow_unicode=True, sort_keys=False)
+    return json.dumps(definition, ensure_ascii=False, indent=2) + '\n'
+
+
+def main():
+    """Import or export questionnaire definitions from the command line"""
+    parser = argparse.ArgumentParser(description='Import or export questionnaire definitions')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='create a draft questionnaire from a definition file')
+    import_parser.add_argument('file')
+    import_parser.add_argument('--admin', type=int, help='owner user id (default: first ADMIN_USER_IDS entry)')
+    import_parser.add_argument('--update', type=int, metavar='QUESTIONNAIRE_ID',
+                               help='replace this questionnaire instead; active ones get a new version')
+    export_parser = subparsers.add_parser('export', help='write the definition of a questionnaire')
+    export_parser.add_argument('questionnaire_id', type=int)
+    export_parser.add_argument('--format', choices=('json', 'yaml'), default='json')
+    export_parser.add_argument('--output', help='write to this file (default: stdout)')
+    args = parser.parse_args()
+
+    from database import Database
+    db = Database()
+
+    if args.command == 'import':
+        admin_id = args.admin or (Config.ADMIN_USER_IDS[0] if Config.ADMIN_USER_IDS else None)
+        if admin_id is None and args.update is None:
+            parser.error('--admin is required when ADMIN_USER_IDS is empty')
+        with open(args.file, encoding='utf-8') as f:
+            text = f.read()
+        try:
+            title, description, questions = load_definition(text, args.file)
+        except DefinitionError as e:
+            print(f"❌ {args.file}:\n{e.format()}", file=sys.stderr)
+            sys.exit(1)
+        if args.update is not None:
+            version = db.update_questionnaire(args.update, title, description, questions)
+            if version is None:
+                print(f"❌ Questionnaire {args.update} not found", file=sys.stderr)
+                sys.exit(1)
+            print(f"✅ Updated questionnaire {args.update} to '{title}', version {version} ({len(questions)} questions)")
+            return
+        questionnaire_id = db.import_questionnaire(title, description, admin_id, questions)
+        print(f"✅ Imported '{title}' as draft questionnaire {questionnaire_id} ({len(questions)} questions)")
+        return
+
+    questionnaire = db.get_questionnaire(args.questionnaire_id)
+    if not questionnaire:
+        print(f"❌ Questionnaire {args.questionnaire_id} not found", file=sys.stderr)
+        sys.exit(1)
+    output = dump_definition(export_definition(questionnaire, db.get_questions(questionnaire.id)),
+                             yaml_format=args.format == 'yaml')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"✅ Definition written to {args.output}", file=sys.stderr)
+    else:
+        sys.stdout.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+End-to-end Load Harness
+
+Drives QuestionnaireBot handlers with simulated respondents and admins.
+Outbound Bot API calls go to an in-process fake Bot, so no network or real
+token is needed, only a valid config.py:
+
+    python loadtest.py --users 2000 --concurrency 200 --output load.json
+
+With --backend memory the bot runs on MemoryStorage, which separates handler
+and Bot API overhead from database time.
+
+Answers handled while an admin export is in flight are reported separately
+as answer_during_export, next to the event loop lag, so an export that blocks
+ingest shows up directly; --seed-responses makes the exports large enough
+to matter.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add current directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import Config
+from database import Database
+from memory_storage import MemoryStorage
+from models import QuestionType, QuestionnaireStatus
+from storage import StorageBackend
+
+FIRST_RESPONDENT_ID = 100000
+
+
+class FakeBot:
+    """Stand-in for telegram.Bot that records calls and simulates API latency"""
+
+    def __init__(self, latency: float = 0.0):
+        self.username = 'loadtest_bot'
+        self.latency = latency
+        self.calls = defaultdict(int)
+
+    async def _call(self, method: str):
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def get_me(self):
+        await self._call('getMe')
+        return SimpleNamespace(username=self.username)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call('sendMessage')
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        await self._call('sendPhoto')
+
+    async def send_document(self, chat_id, document, **kwargs):
+        document.read()
+        await self._call('sendDocument')
+
+
+class FakeMessage:
+    """Incoming message whose replies go through the fake Bot"""
+
+    def __init__(self, bot: FakeBot, chat_id: int, text: str = None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+        await self.bot._call('sendMessage')
+
+
+class FakeCallbackQuery:
+    """Callback query from an inline keyboard press"""
+
+    def __init__(self, bot: FakeBot, chat_id: int, data: str):
+        self.bot = bot
+        self.data = data
+        self.message = FakeMessage(bot, chat_id)
+        self.replies = self.message.replies
+
+    async def answer(self):
+        await self.bot._call('answerCallbackQuery')
+
+    async def edit_message_text(self, text, **kwargs):
+        self.replies.append(text)
+        await self.bot._call('editMessageText')
+
+
+class LoadHarness:
+    """Simulates respondents and admins against a QuestionnaireBot instance"""
+
+    def __init__(self, bot, fake_bot: FakeBot, rng: random.Random):
+        self.bot = bot
+        self.fake_bot = fake_bot
+        self.rng = rng
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.next_update_id = 1
+        self.exports_in_flight = 0
+        self.loop_lag = []
+
+    def make_update(self, user_id: int, message=None, callback_query=None):
+        """Build a minimal Update for the handlers"""
+        update = SimpleNamespace(
+            update_id=self.next_update_id,
+            effective_user=SimpleNamespace(id=user_id, username=f'user{user_id}',
+                                           first_name='Load', last_name=str(user_id)),
+            effective_chat=SimpleNamespace(id=user_id),
+            message=message,
+            callback_query=callback_query,
+        )
+        self.next_update_id += 1
+        return update
+
+    async def timed(self, name: str, handler, update, context, replies, expect_rejection: bool = False):
+        """Run one handler and record its latency and outcome"""
+        start = time.perf_counter()
+        try:
+            await handler(update, context)
+        except Exception:
+            self.errors[name] += 1
+        else:
+            if not expect_rejection and any(reply.startswith('❌') for reply in replies):
+                self.errors[name] += 1
+        finally:
+            self.latencies[name].append(time.perf_counter() - start)
+
+    async def send_text(self, user_id: int, text: str, handler_name: str = 'answer', expect_rejection: bool = False):
+        if handler_name == 'answer' and self.exports_in_flight:
+            handler_name = 'answer_during_export'
+        message = FakeMessage(self.fake_bot, user_id, text)
+        context = SimpleNamespace(args=[], bot=self.fake_bot)
+        await self.timed(handler_name, self.bot.handle_text_message,
+                         self.make_update(user_id, message=message), context, message.replies, expect_rejection)
+
+    async def send_start(self, user_id: int, questionnaire_id: int):
+        message = FakeMessage(self.fake_bot, user_id, f'/start survey_{questionnaire_id}')
+        context = SimpleNamespace(args=[f'survey_{questionnaire_id}'], bot=self.fake_bot)
+        await self.timed('start', self.bot.start_command,
+                         self.make_update(user_id, message=message), context, message.replies)
+
+    async def press_button(self, user_id: int, name: str, *args: int):
+        query = FakeCallbackQuery(self.fake_bot, user_id, self.bot.router.encode(name, *args))
+        context = SimpleNamespace(args=[], bot=self.fake_bot)
+        await self.timed(f'callback:{name}', self.bot.router.dispatch,
+                         self.make_update(user_id, callback_query=query), context, query.replies)
+
+    def answer_for(self, question) -> str:
+        """Produce a valid answer for the given question"""
+        if question.question_type == QuestionType.SINGLE_CHOICE:
+            return str(self.rng.randint(1, len(question.options)))
+        if question.question_type == QuestionType.MULTIPLE_CHOICE:
+            picked = self.rng.sample(range(1, len(question.options) + 1), self.rng.randint(1, len(question.options)))
+            return ','.join(str(n) for n in sorted(picked))
+        if question.question_type == QuestionType.RATING:
+            return str(self.rng.randint(1, len(question.options)))
+        if question.question_type == QuestionType.NUMBER:
+            return f'{self.rng.uniform(0, 1000):.2f}'
+        if question.question_type == QuestionType.DATE:
+            return f'2024-{self.rng.randint(1, 12):02d}-{self.rng.randint(1, 28):02d}'
+        return f'Free text answer {self.rng.random():.6f}'
+
+    async def respondent(self, user_id: int, questionnaire_id: int, restart_rate: float, invalid_rate: float):
+        """Take the survey from the deep link to completion"""
+        await self.send_start(user_id, questionnaire_id)
+        restarted = False
+
+        while True:
+            state = self.bot.user_states.get(user_id)
+            if not state or state.get('action') != 'answering_questionnaire':
+                break
+
+            question = state['compiled'].questions[state['current_question_index']]
+
+            if not restarted and self.rng.random() < restart_rate:
+                restarted = True
+                await self.press_button(user_id, 'restart_survey', questionnaire_id)
+                continue
+
+            if question.question_type != QuestionType.TEXT and self.rng.random() < invalid_rate:
+                await self.send_text(user_id, 'not a number', handler_name='answer_invalid', expect_rejection=True)
+                continue
+
+            await self.send_text(user_id, self.answer_for(question))
+
+    async def admin_exports(self, admin_id: int, questionnaire_id: int, exports: int, interval: float):
+        """Periodically export results while respondents are active"""
+        for _ in range(exports):
+            await asyncio.sleep(interval)
+            self.exports_in_flight += 1
+            try:
+                await self.press_button(admin_id, 'export', questionnaire_id)
+            finally:
+                self.exports_in_flight -= 1
+
+    async def watch_loop(self, interval: float = 0.005):
+        """Record how late the event loop wakes a sleeping task; a blocking handler shows up as lag"""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.append(time.perf_counter() - start - interval)
+
+    def report(self, wall_seconds: float) -> dict:
+        """Summarise per-handler latency, throughput and error rates"""
+        handlers = {}
+        total = 0
+        for name, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            total += len(ordered)
+            handlers[name] = {
+                'count': len(ordered),
+                'errors': self.errors[name],
+                'error_rate': self.errors[name] / len(ordered),
+                'p50_ms': ordered[len(ordered) // 2] * 1000,
+                'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+                'mean_ms': statistics.mean(ordered) * 1000,
+                'max_ms': ordered[-1] * 1000,
+            }
+
+        lag = sorted(self.loop_lag) or [0.0]
+        return {
+            'wall_seconds': wall_seconds,
+            'updates': total,
+            'throughput_per_second': total / wall_seconds if wall_seconds else 0.0,
+            'errors': sum(self.errors.values()),
+            'bot_api_calls': dict(self.fake_bot.calls),
+            'handlers': handlers,
+            'event_loop_lag': {
+                'p99_ms': lag[min(len(lag) - 1, int(len(lag) * 0.99))] * 1000,
+                'max_ms': lag[-1] * 1000,
+            },
+        }
+
+
+def seed_questionnaire(db: StorageBackend, admin_id: int) -> int:
+    """Create an active questionnaire covering every question type"""
+    db.create_or_update_user(admin_id, 'loadtest_admin', 'Load', 'Admin')
+    questionnaire_id = db.create_questionnaire('Load Test Survey', 'Synthetic load test', admin_id)
+    db.add_question(questionnaire_id, 'Pick one', QuestionType.SINGLE_CHOICE, ['Red', 'Green', 'Blue', 'Other'])
+    db.add_question(questionnaire_id, 'Pick any', QuestionType.MULTIPLE_CHOICE, ['A', 'B', 'C', 'D', 'E'])
+    db.add_question(questionnaire_id, 'Tell us more', QuestionType.TEXT)
+    db.add_question(questionnaire_id, 'Pick one again', QuestionType.SINGLE_CHOICE, ['Yes', 'No'])
+    db.add_question(questionnaire_id, 'Rate us', QuestionType.RATING, ['Poor', 'Fair', 'Good', 'Great'])
+    db.add_question(questionnaire_id, 'How many?', QuestionType.NUMBER)
+    db.add_question(questionnaire_id, 'When?', QuestionType.DATE)
+    db.update_questionnaire_status(questionnaire_id, QuestionnaireStatus.ACTIVE)
+    return questionnaire_id
+
+
+def seed_responses(db: StorageBackend, questionnaire_id: int, respondents: int, rng: random.Random):
+    """Store completed responses directly, so exports during the run have real work to do"""
+    questions = db.get_questions(questionnaire_id)
+    for i in range(respondents):
+        user_id = FIRST_RESPONDENT_ID - respondents + i
+        db.create_or_update_user(user_id, f'seed{user_id}', 'Seed', str(user_id))
+        db.start_questionnaire_response(questionnaire_id, user_id)
+        for question in questions:
+            if question.question_type == QuestionType.MULTIPLE_CHOICE:
+                db.save_response(questionnaire_id, user_id, question.id,
+                                 selected_options=rng.sample(range(len(question.options)), 2))
+            elif question.question_type == QuestionType.SINGLE_CHOICE:
+                db.save_response(questionnaire_id, user_id, question.id,
+                                 selected_option=rng.randrange(len(question.options)))
+            elif question.question_type == QuestionType.RATING:
+                db.save_response(questionnaire_id, user_id, question.id,
+                                 answer_number=rng.randint(1, len(question.options)))
+            elif question.question_type == QuestionType.NUMBER:
+                db.save_response(questionnaire_id, user_id, question.id, answer_number=rng.uniform(0, 1000))
+            elif question.question_type == QuestionType.DATE:
+                db.save_response(questionnaire_id, user_id, question.id, answer_date='2024-01-15')
+            else:
+                db.save_response(questionnaire_id, user_id, question.id, answer_text=f'Seeded answer {i}')
+        db.complete_questionnaire_response(questionnaire_id, user_id)
+
+
+async def run_load(args) -> dict:
+    """Run the simulated workload and return the report"""
+    from bot import QuestionnaireBot
+
+    if not args.verbose:
+        # Per-update INFO lines would dominate the measured handler time
+        logging.getLogger('bot').setLevel(logging.WARNING)
+
+    rng = random.Random(args.seed)
+    admin_id = Config.ADMIN_USER_IDS[0]
+    if args.backend == 'memory':
+        db = MemoryStorage()
+    else:
+        db = Database(os.path.join(args.workdir, 'loadtest.db'), shards=args.shards)
+    questionnaire_id = seed_questionnaire(db, admin_id)
+    seed_responses(db, questionnaire_id, args.seed_responses, rng)
+
+    fake_bot = FakeBot(latency=args.api_latency_ms / 1000)
+    harness = LoadHarness(QuestionnaireBot(db=db), fake_bot, rng)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(user_id):
+        async with semaphore:
+            await harness.respondent(user_id, questionnaire_id, args.restart_rate, args.invalid_rate)
+
+    watcher = asyncio.create_task(harness.watch_loop())
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(
+            harness.admin_exports(admin_id, questionnaire_id, args.exports, args.export_interval),
+            *(limited(FIRST_RESPONDENT_ID + i) for i in range(args.users))
+        )
+    finally:
+        watcher.cancel()
+    report = harness.report(time.perf_counter() - start)
+    report['stats'] = db.get_questionnaire_stats(questionnaire_id)
+    return report
+
+
+def print_report(report: dict):
+    """Print a human readable summary"""
+    print(f"⏱️ {report['updates']} updates in {report['wall_seconds']:.2f}s "
+          f"({report['throughput_per_second']:.1f}/s), {report['errors']} errors")
+    print(f"{'handler':<28} {'count':>8} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for name, row in report['handlers'].items():
+        print(f"{name:<28} {row['count']:>8} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+              f"{row['max_ms']:>9.2f} {row['errors']:>7}")
+    lag = report['event_loop_lag']
+    print(f"event loop lag: p99 {lag['p99_ms']:.2f} ms, max {lag['max_ms']:.2f} ms")
+
+
+def main():
+    """Main load test function"""
+    parser = argparse.ArgumentParser(description='Simulate respondents against QuestionnaireBot')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100, help='respondents in flight at once')
+    parser.add_argument('--restart-rate', type=float, default=0.05)
+    parser.add_argument('--invalid-rate', type=float, default=0.05)
+    parser.add_argument('--exports', type=int, default=3, help='admin exports during the run')
+    parser.add_argument('--export-interval', type=float, default=0.5, help='seconds between admin exports')
+    parser.add_argument('--seed-responses', type=int, default=0,
+                        help='completed respondents stored before the run, to size the exports')
+    parser.add_argument('--api-latency-ms', type=float, default=0.0, help='simulated Bot API round trip')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--backend', choices=('sqlite', 'memory'), default='sqlite', help='storage backend')
+    parser.add_argument('--shards', type=int, default=0, help='store responses in this many shard files')
+    parser.add_argument('--verbose', action='store_true', help='keep the bot INFO logging enabled')
+    parser.add_argument('--output', help='write JSON report to this file')
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    args.workdir = tempfile.mkdtemp(prefix='questionnaire_load_')
+    # Exports are written relative to the working directory
+    os.chdir(args.workdir)
+    try:
+        report = asyncio.run(run_load(args))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(args.workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
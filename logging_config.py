@@ -0,0 +1,118 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from datetime import datetime, timezone
+from typing import Optional, Sequence
+
+# Fields copied from the record into JSON output when present
+STRUCTURED_FIELDS = ('update_id', 'user_id', 'handler', 'latency_ms', 'questionnaire_id', 'sample_rate')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_update_context = contextvars.ContextVar('update_context', default=None)
+
+handler_logger = logging.getLogger('bot.handlers')
+
+
+def set_update_context(update_id: Optional[int], user_id: Optional[int]):
+    """Attach update_id/user_id to every record logged while handling this update"""
+    _update_context.set({'update_id': update_id, 'user_id': user_id})
+
+
+class UpdateContextFilter(logging.Filter):
+    """Copy the current update context onto records before they are queued"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _update_context.get()
+        if context:
+            for key, value in context.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the structured fields as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class PreformattedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers message formatting to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Message formatting happens in the listener thread; only exception info is
+        # rendered here because traceback objects keep the handler's frames alive.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def log_sampled(logger: logging.Logger, level: int, rate: float, msg: str, *args, **fields):
+    """Log roughly one in 1/rate events; skipped events cost a random() call"""
+    if rate < 1.0 and random.random() >= rate:
+        return
+    if logger.isEnabledFor(level):
+        fields['sample_rate'] = rate
+        logger.log(level, msg, *args, extra=fields)
+
+
+def make_handler_logger(sample_rate: float, slow_ms: float):
+    """Build an on_complete hook logging handler latency: slow calls always, others sampled"""
+    def log_handler_latency(labels: Sequence[str], seconds: float):
+        latency_ms = seconds * 1000
+        if latency_ms >= slow_ms:
+            handler_logger.warning("Slow handler %s took %.1fms", labels[0], latency_ms,
+                                   extra={'handler': labels[0], 'latency_ms': round(latency_ms, 2)})
+        else:
+            log_sampled(handler_logger, logging.INFO, sample_rate, "Handled %s in %.1fms", labels[0], latency_ms,
+                        handler=labels[0], latency_ms=round(latency_ms, 2))
+    return log_handler_latency
+
+
+def setup_logging(level: str = 'INFO', log_format: str = 'json', log_file: str = None):
+    """Route all logging through a queue drained by a background listener thread"""
+    formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+
+    outputs = [logging.StreamHandler()]
+    if log_file:
+        outputs.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for output in outputs:
+        output.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = PreformattedQueueHandler(log_queue)
+    queue_handler.addFilter(UpdateContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # PTB and httpx log every poll at INFO
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    listener = logging.handlers.QueueListener(log_queue, *outputs, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,664 @@
+import heapq
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from metrics import DB_QUERY_LATENCY, timed
+from models import (NUMERIC_TYPES, Question, Questionnaire, QuestionnaireStatus, QuestionType, User,
+                    answer_value, branches_to_json, mask_to_options, options_to_mask, summarize_values, tally_masks)
+from querylog import SlowQueryLog
+from search import matches, parse_query
+from text_analytics import PHRASE, TERM, answer_terms
+from storage import StorageBackend
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _now(offset_days: float = 0) -> str:
+    """Current UTC time formatted like SQLite's CURRENT_TIMESTAMP"""
+    return (datetime.now(timezone.utc) - timedelta(days=offset_days)).strftime(TIMESTAMP_FORMAT)
+
+
+def _trim_lists(lists: dict, batch_size: int) -> int:
+    """Remove up to batch_size items from the front of a dict of lists, dropping emptied keys"""
+    deleted = 0
+    for key in list(lists):
+        items = lists[key]
+        take = min(len(items), batch_size - deleted)
+        del items[:take]
+        deleted += take
+        if not items:
+            del lists[key]
+        if deleted == batch_size:
+            break
+    return deleted
+
+
+def _to_model(model, row: dict):
+    """Model over a stored row, values kept as stored like the SQLite backend's rows"""
+    return model._make(row[field] for field in model._fields)
+
+
+class MemoryStorage(StorageBackend):
+    """Storage backend keeping every table in Python dicts, for load tests and benchmarks.
+
+    Rows are indexed the way the bot reads them (attempts and answers by
+    questionnaire then user) and returned in the same shapes, types and order
+    as the SQLite backend. Nothing survives the process.
+    """
+
+    def __init__(self):
+        self.query_log = SlowQueryLog()  # No SQL here; keeps /slow_queries working
+        self._lock = threading.RLock()
+        self._state: Dict[str, str] = {}
+        self._users: Dict[int, dict] = {}
+        self._questionnaires: Dict[int, dict] = {}
+        self._questions: Dict[int, List[dict]] = {}
+        # questionnaire_id -> version -> question ids in order
+        self._versions: Dict[int, Dict[int, List[int]]] = {}
+        # questionnaire_id -> user_id -> attempt / list of answers
+        self._attempts: Dict[int, Dict[int, dict]] = {}
+        self._responses: Dict[int, Dict[int, List[dict]]] = {}
+        # questionnaire_id -> (question_id, kind, term) -> answers mentioning it
+        self._term_counts: Dict[int, Counter] = {}
+        self._next_id = {'questionnaires': 1, 'questions': 1, 'responses': 1}
+
+    def _new_id(self, table: str) -> int:
+        new_id = self._next_id[table]
+        self._next_id[table] += 1
+        return new_id
+
+    # Bot state operations
+    @timed(DB_QUERY_LATENCY)
+    def get_state(self, key: str, default: str = None) -> Optional[str]:
+        """Get a bot state value"""
+        return self._state.get(key, default)
+
+    @timed(DB_QUERY_LATENCY)
+    def set_state(self, key: str, value: str):
+        """Set a bot state value"""
+        with self._lock:
+            self._state[key] = value
+
+    # User operations
+    @timed(DB_QUERY_LATENCY)
+    def create_or_update_user(self, user_id: int, username: str = None,
+                              first_name: str = None, last_name: str = None) -> User:
+        """Create or update user"""
+        is_admin = Config.is_admin(user_id)
+
+        with self._lock:
+            existing = self._users.get(user_id)
+            self._users[user_id] = {
+                'user_id': user_id,
+                'username': username,
+                'first_name': first_name,
+                'last_name': last_name,
+                'is_admin': int(is_admin),
+                'created_at': existing['created_at'] if existing else _now(),
+            }
+
+        return User(user_id, username, first_name, last_name, is_admin, datetime.now())
+
+    @timed(DB_QUERY_LATENCY)
+    def get_user(self, user_id: int) -> Optional[User]:
+        """Get user by ID"""
+        row = self._users.get(user_id)
+        return _to_model(User, row) if row else None
+
+    # Questionnaire operations
+    @timed(DB_QUERY_LATENCY)
+    def create_questionnaire(self, title: str, description: str, created_by: int) -> int:
+        """Create new questionnaire"""
+        with self._lock:
+            questionnaire_id = self._new_id('questionnaires')
+            now = _now()
+            self._questionnaires[questionnaire_id] = {
+                'id': questionnaire_id,
+                'title': title,
+                'description': description,
+                'created_by': created_by,
+                'status': QuestionnaireStatus.DRAFT.value,
+                'created_at': now,
+                'updated_at': now,
+                'deleted_at': None,
+                'is_template': 0,
+                'version': 1,
+            }
+            self._questions[questionnaire_id] = []
+            self._versions[questionnaire_id] = {}
+            self._attempts[questionnaire_id] = {}
+            self._responses[questionnaire_id] = {}
+        return questionnaire_id
+
+    def _visible(self, questionnaire_id: int) -> Optional[dict]:
+        row = self._questionnaires.get(questionnaire_id)
+        return row if row and row['deleted_at'] is None else None
+
+    def _newest_first(self, rows) -> List[Questionnaire]:
+        # Stable sort: ties keep id order, as SQLite's ORDER BY created_at DESC does
+        rows = sorted(rows, key=lambda row: row['created_at'], reverse=True)
+        return [_to_model(Questionnaire, row) for row in rows]
+
+    @timed(DB_QUERY_LATENCY)
+    def import_questionnaire(self, title: str, description: str, created_by: int,
+                             questions: List[Tuple[str, QuestionType, Optional[List[str]], bool, Optional[dict]]]) -> int:
+        """Create a draft questionnaire with all its questions in one transaction"""
+        with self._lock:
+            questionnaire_id = self.create_questionnaire(title, description, created_by)
+            for question_text, question_type, options, is_required, branches in questions:
+                self.add_question(questionnaire_id, question_text, question_type, options, is_required, branches)
+        return questionnaire_id
+
+    @timed(DB_QUERY_LATENCY)
+    def clone_questionnaire(self, questionnaire_id: int, created_by: int, title: str = None,
+                            as_template: bool = False) -> Optional[int]:
+        """Copy a questionnaire and its questions into a new draft (or template) in one transaction"""
+        with self._lock:
+            source = self._visible(questionnaire_id)
+            if not source:
+                return None
+            clone_id = self.create_questionnaire(title if title is not None else source['title'],
+                                                 source['description'], created_by)
+            self._questionnaires[clone_id]['is_template'] = int(as_template)
+            # The copy starts at version 1 with the source's current questions
+            self._questions[clone_id] = [
+                dict(question, id=self._new_id('questions'), questionnaire_id=clone_id)
+                for question in self._version_rows(questionnaire_id, source['version'])
+            ]
+            self._versions[clone_id] = {1: [question['id'] for question in self._questions[clone_id]]}
+        return clone_id
+
+    @timed(DB_QUERY_LATENCY)
+    def get_templates(self) -> List[Questionnaire]:
+        """Get the template library, newest first"""
+        with self._lock:
+            rows = [row for row in self._questionnaires.values() if row['is_template'] and row['deleted_at'] is None]
+        return self._newest_first(rows)
+
+    @timed(DB_QUERY_LATENCY)
+    def get_questionnaire(self, questionnaire_id: int) -> Optional[Questionnaire]:
+        """Get questionnaire by ID"""
+        row = self._visible(questionnaire_id)
+        return _to_model(Questionnaire, row) if row else None
+
+    @timed(DB_QUERY_LATENCY)
+    def get_questionnaires_by_admin(self, admin_id: int) -> List[Questionnaire]:
+        """Get all questionnaires created by admin"""
+        with self._lock:
+            rows = [row for row in self._questionnaires.values()
+                    if row['created_by'] == admin_id and row['deleted_at'] is None and not row['is_template']]
+        return self._newest_first(rows)
+
+    @timed(DB_QUERY_LATENCY)
+    def get_active_questionnaires(self) -> List[Questionnaire]:
+        """Get all active questionnaires"""
+        with self._lock:
+            rows = [row for row in self._questionnaires.values()
+                    if row['status'] == QuestionnaireStatus.ACTIVE.value and row['deleted_at'] is None]
+        return self._newest_first(rows)
+
+    @timed(DB_QUERY_LATENCY)
+    def update_questionnaire_status(self, questionnaire_id: int, status: QuestionnaireStatus):
+        """Update questionnaire status"""
+        with self._lock:
+            row = self._questionnaires.get(questionnaire_id)
+            if row:
+                row['status'] = status.value
+                row['updated_at'] = _now()
+
+    @timed(DB_QUERY_LATENCY)
+    def delete_questionnaire(self, questionnaire_id: int, admin_id: int) -> bool:
+        """Soft-delete questionnaire (admin only); its rows are removed later by purge_questionnaire_batch"""
+        with self._lock:
+            row = self._visible(questionnaire_id)
+            if not row or row['created_by'] != admin_id:
+                return False
+            row['deleted_at'] = _now()
+            return True
+
+    @timed(DB_QUERY_LATENCY)
+    def get_deleted_questionnaires(self) -> List[int]:
+        """Get ids of soft-deleted questionnaires still waiting to be purged"""
+        with self._lock:
+            return sorted(q_id for q_id, row in self._questionnaires.items() if row['deleted_at'] is not None)
+
+    @timed(DB_QUERY_LATENCY)
+    def count_questionnaire_rows(self, questionnaire_id: int) -> int:
+        """Count the rows purge_questionnaire_batch has to remove for a questionnaire"""
+        with self._lock:
+            answers = sum(len(rows) for rows in self._responses.get(questionnaire_id, {}).values())
+            members = sum(len(ids) for ids in self._versions.get(questionnaire_id, {}).values())
+            return (answers + len(self._attempts.get(questionnaire_id, {})) + members
+                    + len(self._questions.get(questionnaire_id, [])))
+
+    @timed(DB_QUERY_LATENCY)
+    def purge_questionnaire_batch(self, questionnaire_id: int, batch_size: int) -> int:
+        """Delete up to batch_size rows of a soft-deleted questionnaire; returns 0 once it is gone"""
+        with self._lock:
+            row = self._questionnaires.get(questionnaire_id)
+            if not row or row['deleted_at'] is None:
+                return 0
+
+            # Same order and batch bounds as the SQLite purger
+            answers = self._responses.get(questionnaire_id, {})
+            if answers:
+                return _trim_lists(answers, batch_size)
+
+            term_counts = self._term_counts.get(questionnaire_id)
+            if term_counts:
+                keys = list(islice(term_counts, batch_size))
+                for key in keys:
+                    del term_counts[key]
+                return len(keys)
+
+            attempts = self._attempts.get(questionnaire_id, {})
+            if attempts:
+                deleted = min(len(attempts), batch_size)
+                for user_id in list(attempts)[:deleted]:
+                    del attempts[user_id]
+                return deleted
+
+            versions = self._versions.get(questionnaire_id, {})
+            if versions:
+                return _trim_lists(versions, batch_size)
+
+            questions = self._questions.get(questionnaire_id, [])
+            if questions:
+                deleted = min(len(questions), batch_size)
+                del questions[:deleted]
+                return deleted
+
+            for table in (self._questionnaires, self._questions, self._versions, self._attempts, self._responses,
+                          self._term_counts):
+                table.pop(questionnaire_id, None)
+            return 0
+
+    # Question operations
+    @timed(DB_QUERY_LATENCY)
+    def add_question(self, questionnaire_id: int, question_text: str,
+                     question_type: QuestionType, options: List[str] = None,
+                     is_required: bool = True, branches: dict = None) -> int:
+        """Add question to questionnaire (as a new version once it has been activated)"""
+        with self._lock:
+            version = self._editable_version(questionnaire_id, copy=True)
+            members = self._versions.setdefault(questionnaire_id, {}).setdefault(version, [])
+            question_id = self._add_question_row(questionnaire_id, question_text, question_type.value,
+                                                 options, is_required, branches_to_json(branches), len(members) + 1)
+            members.append(question_id)
+        return question_id
+
+    def _add_question_row(self, questionnaire_id: int, question_text: str, question_type: str,
+                          options: Optional[List[str]], is_required: bool, branches_json: Optional[str],
+                          order_index: int) -> int:
+        question_id = self._new_id('questions')
+        self._questions.setdefault(questionnaire_id, []).append({
+            'id': question_id,
+            'questionnaire_id': questionnaire_id,
+            'question_text': question_text,
+            'question_type': question_type,
+            'options': list(options) if options else None,
+            'is_required': int(is_required),
+            'order_index': order_index,
+            'branches': branches_json,
+        })
+        return question_id
+
+    def _editable_version(self, questionnaire_id: int, copy: bool) -> int:
+        """Version an edit may change: the current one while still a draft, otherwise a new
+        one (a copy of the current questions when copy is set); caller holds the lock"""
+        row = self._questionnaires.get(questionnaire_id)
+        if not row or row['status'] == QuestionnaireStatus.DRAFT.value:
+            return row['version'] if row else 1
+
+        versions = self._versions.setdefault(questionnaire_id, {})
+        version = row['version'] + 1
+        versions[version] = list(versions.get(row['version'], [])) if copy else []
+        row['version'] = version
+        row['updated_at'] = _now()
+        return version
+
+    def _version_rows(self, questionnaire_id: int, version: int) -> List[dict]:
+        """Copies of a version's question rows in order, order_index set to the position; caller holds the lock"""
+        by_id = {question['id']: question for question in self._questions.get(questionnaire_id, [])}
+        return [
+            dict(by_id[question_id], order_index=position,
+                 options=list(by_id[question_id]['options']) if by_id[question_id]['options'] else None)
+            for position, question_id in enumerate(self._versions.get(questionnaire_id, {}).get(version, []), start=1)
+        ]
+
+    @timed(DB_QUERY_LATENCY)
+    def update_questionnaire(self, questionnaire_id: int, title: str, description: str,
+                             questions: List[Tuple[str, QuestionType, Optional[List[str]], bool, Optional[dict]]]) -> Optional[int]:
+        """Replace a questionnaire's title, description and questions; returns the version now current"""
+        with self._lock:
+            row = self._visible(questionnaire_id)
+            if not row:
+                return None
+            current = row['version']
+
+            reusable = {}
+            current_keys = []
+            for question in self._version_rows(questionnaire_id, current):
+                key = (question['question_text'], question['question_type'],
+                       tuple(question['options']) if question['options'] else None, bool(question['is_required']),
+                       question['branches'])
+                reusable.setdefault(key, []).append(question['id'])
+                current_keys.append(key)
+            keys = [(question_text, question_type.value, tuple(options) if options else None, bool(is_required),
+                     branches_to_json(branches))
+                    for question_text, question_type, options, is_required, branches in questions]
+
+            # Unchanged questions need neither a new version nor any writes
+            version = current
+            if keys != current_keys:
+                version = self._editable_version(questionnaire_id, copy=False)
+                members = []
+                for position, key in enumerate(keys, start=1):
+                    matches = reusable.get(key)
+                    if matches:
+                        members.append(matches.pop(0))
+                    else:
+                        question_text, question_type, options, is_required, branches_json = key
+                        members.append(self._add_question_row(questionnaire_id, question_text, question_type,
+                                                              options, is_required, branches_json, position))
+                self._versions[questionnaire_id][version] = members
+
+                if version == current:
+                    # Nobody can have answered a draft, so questions it no longer uses go
+                    used = set(members)
+                    self._questions[questionnaire_id] = [question for question in self._questions[questionnaire_id]
+                                                         if question['id'] in used]
+
+            row['title'] = title
+            row['description'] = description
+            row['updated_at'] = _now()
+        return version
+
+    @timed(DB_QUERY_LATENCY)
+    def get_questions(self, questionnaire_id: int, version: int = None) -> List[Question]:
+        """Get the questions of a questionnaire version (default: the current one)"""
+        with self._lock:
+            if version is None:
+                row = self._questionnaires.get(questionnaire_id)
+                version = row['version'] if row else None
+            rows = self._version_rows(questionnaire_id, version)
+        return [_to_model(Question, row) for row in rows]
+
+    @timed(DB_QUERY_LATENCY)
+    def get_question_history(self, questionnaire_id: int) -> List[Question]:
+        """Get every question any version of the questionnaire has used, oldest first"""
+        with self._lock:
+            rows = sorted(self._questions.get(questionnaire_id, []), key=lambda q: q['id'])
+        # Copy options so callers never share a list with the stored row
+        return [_to_model(Question, dict(row, options=list(row['options']) if row['options'] else None))
+                for row in rows]
+
+    # Response operations
+    @timed(DB_QUERY_LATENCY)
+    def start_questionnaire_response(self, questionnaire_id: int, user_id: int, version: int = None):
+        """Start questionnaire response, pinned to a version (default: the current one)"""
+        with self._lock:
+            if version is None:
+                row = self._questionnaires.get(questionnaire_id)
+                version = row['version'] if row else None
+            # A restart replaces the earlier attempt, answers (and their term counts) included
+            for row in self._responses.get(questionnaire_id, {}).pop(user_id, []):
+                if row['answer_text'] is not None:
+                    self._count_answer(questionnaire_id, row['question_id'], row['answer_text'], -1)
+            attempts = self._attempts.setdefault(questionnaire_id, {})
+            attempts.pop(user_id, None)  # INSERT OR REPLACE moves the row to the end
+            attempts[user_id] = {'started_at': _now(), 'completed_at': None, 'is_completed': 0, 'version': version}
+
+    @timed(DB_QUERY_LATENCY)
+    def save_response(self, questionnaire_id: int, user_id: int, question_id: int,
+                      answer_text: str = None, selected_option: int = None,
+                      selected_options: List[int] = None, answer_number: float = None,
+                      answer_date: str = None):
+        """Save response to question (answer_number for number and rating questions, answer_date for dates)"""
+        with self._lock:
+            answers = self._responses.setdefault(questionnaire_id, {}).setdefault(user_id, [])
+            previous = next((row for row in answers if row['question_id'] == question_id), None)
+            row = {
+                'id': previous['id'] if previous else self._new_id('responses'),
+                'question_id': question_id,
+                'answer_text': answer_text,
+                'selected_option': selected_option,
+                'selected_mask': options_to_mask(selected_options),
+                'created_at': _now(),
+                'answer_number': answer_number,
+                'answer_date': answer_date,
+            }
+            # One answer per question; an overwrite keeps the row's id and place, like the SQL upsert
+            if previous:
+                answers[answers.index(previous)] = row
+                if previous['answer_text'] is not None:
+                    self._count_answer(questionnaire_id, question_id, previous['answer_text'], -1)
+            else:
+                answers.append(row)
+            if answer_text is not None:
+                self._count_answer(questionnaire_id, question_id, answer_text, 1)
+
+    def _count_answer(self, questionnaire_id: int, question_id: int, answer_text: str, sign: int):
+        """Add (sign=1) or remove (sign=-1) an answer's terms; caller holds the lock"""
+        term_counts = self._term_counts.setdefault(questionnaire_id, Counter())
+        for (kind, term), count in answer_terms(answer_text).items():
+            key = (question_id, kind, term)
+            term_counts[key] += sign * count
+            if term_counts[key] <= 0:
+                del term_counts[key]
+
+    @timed(DB_QUERY_LATENCY)
+    def complete_questionnaire_response(self, questionnaire_id: int, user_id: int):
+        """Mark questionnaire response as completed"""
+        with self._lock:
+            attempt = self._attempts.get(questionnaire_id, {}).get(user_id)
+            if attempt:
+                attempt['completed_at'] = _now()
+                attempt['is_completed'] = 1
+
+    @timed(DB_QUERY_LATENCY)
+    def get_questionnaire_stats(self, questionnaire_id: int) -> dict:
+        """Get questionnaire statistics"""
+        with self._lock:
+            attempts = list(self._attempts.get(questionnaire_id, {}).values())
+        return {
+            'total_started': len(attempts),
+            'total_completed': sum(1 for attempt in attempts if attempt['is_completed'])
+        }
+
+    @timed(DB_QUERY_LATENCY)
+    def get_questionnaire_responses(self, questionnaire_id: int) -> List[dict]:
+        """Get all responses for questionnaire"""
+        with self._lock:
+            attempts = sorted(self._attempts.get(questionnaire_id, {}).items())
+            # Each respondent sees the questions of the version they answered
+            questions_by_version = {version: self._version_rows(questionnaire_id, version)
+                                    for version in {attempt['version'] for _, attempt in attempts}}
+            answers = {user_id: list(rows) for user_id, rows in self._responses.get(questionnaire_id, {}).items()}
+            users = {user_id: self._users.get(user_id) for user_id, _ in attempts}
+
+        user_responses = []
+        for user_id, attempt in attempts:
+            user = users[user_id]
+            if user is None:
+                continue  # Inner join on users
+
+            by_question = {}
+            for row in answers.get(user_id, []):
+                by_question.setdefault(row['question_id'], []).append(row)
+
+            responses = []
+            for question in questions_by_version[attempt['version']]:
+                # A question answered twice yields two entries, like the SQL join
+                for answer in by_question.get(question['id']) or [None]:
+                    response_data = {
+                        'question_id': question['id'],
+                        'question_text': question['question_text'],
+                        'question_type': question['question_type'],
+                        'answer_text': answer['answer_text'] if answer else None,
+                        'selected_option': answer['selected_option'] if answer else None,
+                        'answer_number': answer['answer_number'] if answer else None,
+                        'answer_date': answer['answer_date'] if answer else None,
+                    }
+                    if question['options']:
+                        response_data['options'] = list(question['options'])
+                        if (question['question_type'] == QuestionType.RATING.value
+                                and response_data['answer_number'] is not None):
+                            response_data['selected_option_text'] = (
+                                question['options'][int(response_data['answer_number']) - 1])
+                        if response_data['selected_option'] is not None:
+                            response_data['selected_option_text'] = question['options'][response_data['selected_option']]
+                        if answer and answer['selected_mask'] is not None:
+                            response_data['selected_options'] = mask_to_options(answer['selected_mask'])
+                            response_data['selected_option_text'] = ', '.join(
+                                question['options'][index] for index in response_data['selected_options']
+                                if index < len(question['options']))
+                    responses.append(response_data)
+
+            user_responses.append({
+                'user_info': {
+                    'user_id': user_id,
+                    'username': user['username'],
+                    'first_name': user['first_name'],
+                    'last_name': user['last_name']
+                },
+                'started_at': attempt['started_at'],
+                'completed_at': attempt['completed_at'],
+                'is_completed': attempt['is_completed'],
+                'responses': responses
+            })
+
+        return user_responses
+
+    @timed(DB_QUERY_LATENCY)
+    def get_option_stats(self, questionnaire_id: int) -> Dict[int, dict]:
+        """Multiple-choice selections per question: {question_id: {'answers', 'tallies': [per option], 'pairs': {(i, j): n}}}"""
+        with self._lock:
+            questions = sorted(self._questions.get(questionnaire_id, []), key=lambda q: q['order_index'])
+            rows = [row for answers in self._responses.get(questionnaire_id, {}).values() for row in answers]
+
+        mask_counts = {}
+        for row in rows:
+            if row['selected_mask'] is not None:
+                masks = mask_counts.setdefault(row['question_id'], {})
+                masks[row['selected_mask']] = masks.get(row['selected_mask'], 0) + 1
+
+        return {
+            question['id']: tally_masks(mask_counts.get(question['id'], {}), len(question['options'] or []))
+            for question in questions if question['question_type'] == QuestionType.MULTIPLE_CHOICE.value
+        }
+
+    @timed(DB_QUERY_LATENCY)
+    def get_numeric_stats(self, questionnaire_id: int) -> Dict[int, dict]:
+        """Number, rating and date answers per question: {question_id: {'answers', 'mean', 'median', 'min', 'max',
+        'start', 'width', 'histogram': [answers per bucket]}}; dates are julian days (models.from_julian_day)"""
+        numeric_types = {question_type.value for question_type in NUMERIC_TYPES}
+        with self._lock:
+            questions = sorted(self._questions.get(questionnaire_id, []), key=lambda q: q['order_index'])
+            rows = [row for answers in self._responses.get(questionnaire_id, {}).values() for row in answers]
+
+        values = {}
+        for row in rows:
+            value = answer_value(row['answer_number'], row['answer_date'])
+            if value is not None:
+                values.setdefault(row['question_id'], []).append(value)
+
+        return {
+            question['id']: summarize_values(QuestionType(question['question_type']), len(question['options'] or []),
+                                             values.get(question['id'], []))
+            for question in questions if question['question_type'] in numeric_types
+        }
+
+    @timed(DB_QUERY_LATENCY)
+    def get_top_terms(self, questionnaire_id: int, limit: int = 5) -> Dict[int, Dict[str, List[Tuple[str, int]]]]:
+        """Most frequent terms and phrases per TEXT question: {question_id: {'term': [(term, answers)], 'phrase': [...]}}"""
+        with self._lock:
+            questions = sorted(self._questions.get(questionnaire_id, []), key=lambda q: q['order_index'])
+            term_counts = dict(self._term_counts.get(questionnaire_id, {}))
+
+        top = {}
+        for question in questions:
+            if question['question_type'] != QuestionType.TEXT.value:
+                continue
+            top[question['id']] = {}
+            for kind in (TERM, PHRASE):
+                candidates = [(term, count) for (question_id, term_kind, term), count in term_counts.items()
+                              if question_id == question['id'] and term_kind == kind]
+                top[question['id']][kind] = heapq.nsmallest(limit, candidates, key=lambda item: (-item[1], item[0]))
+        return top
+
+    @timed(DB_QUERY_LATENCY)
+    def search_responses(self, questionnaire_id: int, query: str, limit: int,
+                         offset: int = 0) -> Tuple[int, List[dict]]:
+        """Search a questionnaire's text answers by scanning them; ranked by term occurrences"""
+        terms = parse_query(query)
+        if not terms:
+            return 0, []
+        with self._lock:
+            rows = [(user_id, row) for user_id, answers in self._responses.get(questionnaire_id, {}).items()
+                    for row in answers if row['answer_text'] is not None]
+            questions = {q['id']: q for q in self._questions.get(questionnaire_id, [])}
+            users = dict(self._users)
+
+        scored = [(matches(row['answer_text'], terms), user_id, row) for user_id, row in rows]
+        scored = [item for item in scored if item[0] and item[2]['question_id'] in questions]
+        scored.sort(key=lambda item: (-item[0], item[2]['id']))
+
+        results = []
+        for _, user_id, row in scored[offset:offset + limit]:
+            user = users.get(user_id) or {}
+            results.append({
+                'response_id': row['id'],
+                'user_id': user_id,
+                'username': user.get('username'),
+                'first_name': user.get('first_name'),
+                'last_name': user.get('last_name'),
+                'question_id': row['question_id'],
+                'question_text': questions[row['question_id']]['question_text'],
+                'answer_text': row['answer_text'],
+                'created_at': row['created_at'],
+            })
+        return len(scored), results
+
+    # Retention operations
+    @timed(DB_QUERY_LATENCY)
+    def purge_incomplete_attempts(self, older_than_days: float, batch_size: int) -> int:
+        """Delete up to batch_size unfinished attempts started before the cutoff, with their partial answers"""
+        cutoff = _now(older_than_days)
+        with self._lock:
+            stale = list(islice(
+                ((questionnaire_id, user_id)
+                 for questionnaire_id, attempts in self._attempts.items()
+                 for user_id, attempt in attempts.items()
+                 if not attempt['is_completed'] and attempt['started_at'] <= cutoff),
+                batch_size
+            ))
+            answers = 0
+            for questionnaire_id, user_id in stale:
+                del self._attempts[questionnaire_id][user_id]
+                rows = self._responses.get(questionnaire_id, {}).pop(user_id, [])
+                for row in rows:
+                    if row['answer_text'] is not None:
+                        self._count_answer(questionnaire_id, row['question_id'], row['answer_text'], -1)
+                answers += len(rows)
+        return len(stale) + answers
+
+    @timed(DB_QUERY_LATENCY)
+    def purge_stale_users(self, older_than_days: float, batch_size: int) -> int:
+        """Delete up to batch_size non-admin users first seen before the cutoff who left no data behind"""
+        cutoff = _now(older_than_days)
+        with self._lock:
+            respondents = {user_id for attempts in self._attempts.values() for user_id in attempts}
+            creators = {row['created_by'] for row in self._questionnaires.values()}
+            stale = [
+                user_id for user_id, row in self._users.items()
+                if not row['is_admin'] and row['created_at'] <= cutoff
+                and user_id not in respondents and user_id not in creators
+            ][:batch_size]
+            for user_id in stale:
+                del self._users[user_id]
+        return len(stale)
@@ -0,0 +1,235 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    """Base class for metrics rendered in the Prometheus text format"""
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Updates come from the event loop and from worker threads (to_thread, the read pool)
+        self._lock = threading.Lock()
+
+    def _label_string(self, labels: Tuple[str, ...], extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in list(self._values.items()):
+            yield f'{self.name}{self._label_string(labels)} {value}'
+
+
+class Gauge(Metric):
+    """Value that can go up and down, or be read from a callback at scrape time"""
+    metric_type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def set_function(self, func: Callable[[], float], *labels: str):
+        self._functions[labels] = func
+
+    def samples(self):
+        values = dict(self._values)
+        for labels, func in list(self._functions.items()):
+            try:
+                values[labels] = func()
+            except Exception as e:
+                logger.warning("Gauge %s callback failed: %s", self.name, e)
+        for labels, value in values.items():
+            yield f'{self.name}{self._label_string(labels)} {value}'
+
+
+class Histogram(Metric):
+    """Bucketed distribution of observed values (typically seconds)"""
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[bucket] += 1
+            series[-1] += value
+
+    def samples(self):
+        # Copied under the lock so a scrape never shows a count without its sum
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f'{self.name}_bucket{self._label_string(labels, _le(bound))} {cumulative}'
+            cumulative += series[len(self.buckets)]
+            yield f'{self.name}_bucket{self._label_string(labels, _le("+Inf"))} {cumulative}'
+            yield f'{self.name}_sum{self._label_string(labels)} {series[-1]}'
+            yield f'{self.name}_count{self._label_string(labels)} {cumulative}'
+
+
+class MetricsRegistry:
+    """Collection of metrics exposed on /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    'bot_handler_seconds', 'Time spent handling an update, by handler', ('handler',)))
+DB_QUERY_LATENCY = REGISTRY.register(Histogram(
+    'bot_db_query_seconds', 'Time spent in Database methods, by method', ('method',)))
+DB_CONNECTIONS = REGISTRY.register(Counter(
+    'bot_db_connections_total', 'SQLite connections opened'))
+DB_TRANSACTIONS = REGISTRY.register(Counter(
+    'bot_db_transactions_total', 'SQLite transactions committed'))
+ACTIVE_SESSIONS = REGISTRY.register(Gauge(
+    'bot_active_sessions', 'Users with an in-progress multi-step operation (creating or answering)'))
+API_REQUEST_LATENCY = REGISTRY.register(Histogram(
+    'bot_api_request_seconds', 'Outbound Telegram Bot API request time, by method', ('method',)))
+THROTTLED_UPDATES = REGISTRY.register(Counter(
+    'bot_throttled_updates_total', 'Inbound updates dropped by the rate limiter, by scope', ('scope',)))
+DUPLICATE_UPDATES = REGISTRY.register(Counter(
+    'bot_duplicate_updates_total', 'Redelivered updates skipped by the deduplicator'))
+EXPORT_DURATION = REGISTRY.register(Histogram(
+    'bot_export_seconds', 'Time spent building result exports',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)))
+
+
+def timed(histogram: Histogram, *labels: str, on_complete: Callable[[Tuple[str, ...], float], None] = None):
+    """Decorator observing the wrapped call's duration; labels default to the function name"""
+    def decorator(func):
+        label_values = labels or (func.__name__,)
+
+        def record(elapsed):
+            histogram.observe(elapsed, *label_values)
+            if on_complete is not None:
+                on_complete(label_values, elapsed)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    record(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(time.perf_counter() - start)
+        return wrapper
+
+    return decorator
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serve the registry in the Prometheus text exposition format"""
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent; keep them out of the bot log
+        pass
+
+
+def start_metrics_server(host: str, port: int) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics from a daemon thread so scrapes never touch the event loop"""
+    if not port:
+        return None
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    logger.info("Metrics available at http://%s:%s/metrics", host, server.server_address[1])
+    return server
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _le(bound) -> str:
+    return f'le="{bound}"'
@@ -1,20 +1,56 @@
+import json
 from enum import Enum
-from dataclasses import dataclass
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from datetime import date, datetime
 
 class QuestionType(Enum):
     SINGLE_CHOICE = "single_choice"
     MULTIPLE_CHOICE = "multiple_choice"
     TEXT = "text"
+    NUMBER = "number"
+    RATING = "rating"  # options are the scale labels, answered 1..len(options)
+    DATE = "date"
+
+# Answered into responses.answer_number (answer_date for DATE) and aggregated in SQL
+NUMERIC_TYPES = (QuestionType.NUMBER, QuestionType.RATING, QuestionType.DATE)
 
 class QuestionnaireStatus(Enum):
     DRAFT = "draft"
     ACTIVE = "active"
     CLOSED = "closed"
 
-@dataclass
-class User:
+class _Parsed:
+    """Field read through a converter, so rows are kept as fetched and only the fields used get parsed"""
+    __slots__ = ('convert', 'index')
+
+    def __init__(self, convert):
+        self.convert = convert
+
+    def __set_name__(self, owner, name):
+        self.index = owner._fields.index(name)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return self.convert(instance[self.index])
+
+def _timestamp(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _interned(enum_type):
+    """Converter returning the shared enum member for a stored value (members pass through)"""
+    members = {member.value: member for member in enum_type}
+    return lambda value: members.get(value, value)
+
+def _json(value):
+    return json.loads(value) if isinstance(value, str) else value
+
+# Models are immutable tuples: no per-instance __dict__, and a row selected with
+# Model.COLUMNS becomes a model through Model._make(row) without touching each field.
+# Fields annotated with a parsed type hold the stored value until read, and are
+# converted again on every read; see parsed() for models read over and over.
+
+class _UserFields(NamedTuple):
     user_id: int
     username: Optional[str]
     first_name: Optional[str]
@@ -22,8 +58,13 @@ class User:
     is_admin: bool
     created_at: datetime
 
-@dataclass
-class Questionnaire:
+class User(_UserFields):
+    __slots__ = ()
+    COLUMNS = ', '.join(_UserFields._fields)
+    is_admin = _Parsed(bool)
+    created_at = _Parsed(_timestamp)
+
+class _QuestionnaireFields(NamedTuple):
     id: Optional[int]
     title: str
     description: str
@@ -31,31 +72,161 @@ class Questionnaire:
     status: QuestionnaireStatus
     created_at: datetime
     updated_at: datetime
+    version: int
 
-@dataclass
-class Question:
+class Questionnaire(_QuestionnaireFields):
+    __slots__ = ()
+    COLUMNS = ', '.join(_QuestionnaireFields._fields)
+    status = _Parsed(_interned(QuestionnaireStatus))
+    created_at = _Parsed(_timestamp)
+    updated_at = _Parsed(_timestamp)
+
+class _QuestionFields(NamedTuple):
     id: Optional[int]
     questionnaire_id: int
     question_text: str
     question_type: QuestionType
-    options: Optional[List[str]]  # For multiple choice questions
+    options: Optional[List[str]]  # Choice options, or the scale labels of rating questions
     is_required: bool
     order_index: int
+    branches: Optional[dict]  # Skip logic, see compiled.transition_table
+
+class Question(_QuestionFields):
+    __slots__ = ()
+    COLUMNS = ', '.join(_QuestionFields._fields)
+    question_type = _Parsed(_interned(QuestionType))
+    options = _Parsed(_json)
+    is_required = _Parsed(bool)
+    branches = _Parsed(_json)
 
-@dataclass
-class Response:
+class _ResponseFields(NamedTuple):
     id: Optional[int]
     questionnaire_id: int
     user_id: int
     question_id: int
     answer_text: Optional[str]
-    selected_option: Optional[int]  # Index of selected option for multiple choice
+    selected_option: Optional[int]  # Index of the selected option for single choice
+    selected_mask: Optional[int]  # Multiple choice selections, see options_to_mask
     created_at: datetime
+    answer_number: Optional[float]  # Number and rating answers
+    answer_date: Optional[str]  # Date answers, ISO YYYY-MM-DD
 
-@dataclass
-class QuestionnaireResponse:
+class Response(_ResponseFields):
+    __slots__ = ()
+    COLUMNS = ', '.join(_ResponseFields._fields)
+    created_at = _Parsed(_timestamp)
+
+    @property
+    def selected_options(self) -> List[int]:
+        """Indexes of the selected options of a multiple choice answer"""
+        return mask_to_options(self.selected_mask)
+
+class _QuestionnaireResponseFields(NamedTuple):
     questionnaire_id: int
     user_id: int
     started_at: datetime
     completed_at: Optional[datetime]
-    is_completed: bool 
\ No newline at end of file
+    is_completed: bool
+
+class QuestionnaireResponse(_QuestionnaireResponseFields):
+    __slots__ = ()
+    started_at = _Parsed(_timestamp)
+    completed_at = _Parsed(_timestamp)
+    is_completed = _Parsed(bool)
+
+def from_rows(model, rows) -> list:
+    """Map rows selected with model.COLUMNS to model objects"""
+    return list(map(model._make, rows))
+
+def parsed(model):
+    """Copy of a model holding every field already converted; converters pass converted values through"""
+    return model._make([getattr(model, name) for name in model._fields])
+
+# SQLite integers are signed 64-bit, so a selection bitmask holds up to 63 options
+MAX_MASK_OPTIONS = 63
+
+def options_to_mask(options: Optional[List[int]]) -> Optional[int]:
+    """Pack selected option indexes into a bitmask (bit i set = option i selected)"""
+    if not options:
+        return None
+    mask = 0
+    for index in options:
+        if not 0 <= index < MAX_MASK_OPTIONS:
+            raise ValueError(f"Option index {index} out of range")
+        mask |= 1 << index
+    return mask
+
+def branches_to_json(branches: Optional[dict]) -> Optional[str]:
+    """Stored form of question branches, canonical so equal branches compare equal"""
+    return json.dumps(branches, sort_keys=True) if branches else None
+
+def mask_to_options(mask: Optional[int]) -> List[int]:
+    """Unpack a selection bitmask into sorted option indexes"""
+    if not mask:
+        return []
+    return [index for index in range(mask.bit_length()) if mask >> index & 1]
+
+def tally_masks(mask_counts: Dict[int, int], option_count: int) -> dict:
+    """Option tallies and pair co-occurrence from {mask: answers}, shaped like Database.get_option_stats"""
+    tallies = [0] * option_count
+    pairs = {}
+    for mask, answers in mask_counts.items():
+        selected = [index for index in mask_to_options(mask) if index < option_count]
+        for position, first in enumerate(selected):
+            tallies[first] += answers
+            for second in selected[position + 1:]:
+                pairs[(first, second)] = pairs.get((first, second), 0) + answers
+    return {'answers': sum(mask_counts.values()), 'tallies': tallies, 'pairs': pairs}
+
+# Equal-width histogram ranges of number and date answers (ratings get one per scale point)
+HISTOGRAM_BUCKETS = 5
+
+# SQLite julianday() of a date is its proleptic ordinal plus this
+JULIAN_DAY_OFFSET = 1721424.5
+
+def julian_day(day: str) -> float:
+    """julianday() of an ISO date, so dates aggregate like numbers"""
+    return date.fromisoformat(day).toordinal() + JULIAN_DAY_OFFSET
+
+def from_julian_day(value: float) -> date:
+    """Date a julianday value (a mean, say) falls on"""
+    return date.fromordinal(int(value - JULIAN_DAY_OFFSET))
+
+def answer_value(answer_number: Optional[float], answer_date: Optional[str]) -> Optional[float]:
+    """Value aggregated for a typed answer: the number, or the julian day of the date"""
+    if answer_number is not None:
+        return answer_number
+    return julian_day(answer_date) if answer_date else None
+
+def histogram_params(question_type: QuestionType, option_count: int, low: float, high: float) -> Tuple[float, float, int]:
+    """(start, width, buckets) of a numeric question's histogram given its smallest and largest answer"""
+    if question_type == QuestionType.RATING:
+        return 1, 1, max(option_count, 1)
+    if high <= low:
+        return low, 1, 1
+    return low, (high - low) / HISTOGRAM_BUCKETS, HISTOGRAM_BUCKETS
+
+def histogram_bucket(value: float, start: float, width: float, buckets: int) -> int:
+    """Bucket of a value, as the SQL in Database.get_numeric_stats computes it"""
+    return min(max(int((value - start) / width), 0), buckets - 1)
+
+def summarize_values(question_type: QuestionType, option_count: int, values: Sequence[float]) -> dict:
+    """Numeric summary of answer values, shaped like Database.get_numeric_stats"""
+    values = sorted(values)
+    if not values:
+        return {'answers': 0}
+    answers = len(values)
+    start, width, buckets = histogram_params(question_type, option_count, values[0], values[-1])
+    histogram = [0] * buckets
+    for value in values:
+        histogram[histogram_bucket(value, start, width, buckets)] += 1
+    return {
+        'answers': answers,
+        'mean': sum(values) / answers,
+        'median': (values[(answers - 1) // 2] + values[answers // 2]) / 2,
+        'min': values[0],
+        'max': values[-1],
+        'start': start,
+        'width': width,
+        'histogram': histogram,
+    }
@@ -0,0 +1,144 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Iterable, Optional
+
+IDLE = '<idle>'
+# Busy in the event loop (polling, the Bot API client, ...) outside any handler
+LOOP = '<event loop>'
+
+# Every callback and task step the event loop runs is called from here; frames below it
+# (main(), run_polling(), run_forever()) are on every sample and say nothing
+_LOOP_CALLBACK = asyncio.events.Handle._run.__code__
+
+
+class SamplingProfiler:
+    """Statistical profiler that samples one thread's stack at a fixed interval.
+
+    Samples are attributed to the innermost frame above the event loop's callback
+    that lives in one of ``handler_files`` (the bot handler being executed). A
+    thread parked in the loop's select() with no callback running is idle.
+    """
+
+    def __init__(self, handler_files: Iterable[str], interval: float = 0.005,
+                 thread_id: Optional[int] = None):
+        self.handler_files = set(handler_files)
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self.updates = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start sampling in a background thread"""
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampler thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.stopped_at = time.perf_counter()
+
+    def record_update(self):
+        """Count an update processed while profiling"""
+        self.updates += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def _split(self, stack):
+        """Return (handler name, frames from the handler down) for a sampled stack"""
+        try:
+            start = stack.index(_LOOP_CALLBACK) + 1
+        except ValueError:
+            return IDLE, stack
+        for index in range(len(stack) - 1, start - 1, -1):
+            if stack[index].co_filename in self.handler_files:
+                return stack[index].co_name, stack[index:]
+        return LOOP, stack[start:]
+
+    def collapsed_stacks(self) -> str:
+        """Render busy samples in the collapsed format used by flamegraph.pl and speedscope"""
+        collapsed = Counter()
+        for stack, count in self.stacks.items():
+            handler, frames = self._split(stack)
+            if handler == IDLE:
+                continue
+            collapsed[';'.join(_frame_label(code) for code in frames)] += count
+
+        return ''.join(f'{line} {count}\n' for line, count in collapsed.most_common())
+
+    def report(self, top: int = 15) -> str:
+        """Render a text report of samples per handler and the hottest functions"""
+        duration = (self.stopped_at or time.perf_counter()) - (self.started_at or time.perf_counter())
+        per_handler = Counter()
+        inclusive = {}
+        self_time = Counter()
+
+        for stack, count in self.stacks.items():
+            handler, frames = self._split(stack)
+            per_handler[handler] += count
+            if handler == IDLE:
+                continue
+
+            self_time[_frame_label(frames[-1])] += count
+            handler_functions = inclusive.setdefault(handler, Counter())
+            for label in {_frame_label(code) for code in frames}:
+                handler_functions[label] += count
+
+        busy = self.samples - per_handler[IDLE]
+        lines = [
+            f"Profile: {duration:.1f}s, {self.samples} samples every {self.interval * 1000:.0f}ms, "
+            f"{self.updates} updates",
+            f"Busy samples: {busy} ({_share(busy, self.samples)}), idle: {per_handler[IDLE]}",
+            "",
+            "== Handlers (by samples) ==",
+        ]
+        for handler, count in per_handler.most_common():
+            if handler != IDLE:
+                lines.append(f"{count:>9}  {_share(count, busy):>6}  {handler}")
+
+        for handler, functions in sorted(inclusive.items(), key=lambda item: -per_handler[item[0]]):
+            lines += ["", f"== {handler}: top functions (inclusive) =="]
+            for label, count in functions.most_common(top):
+                lines.append(f"{count:>9}  {_share(count, per_handler[handler]):>6}  {label}")
+
+        lines += ["", "== Hottest functions (self) =="]
+        for label, count in self_time.most_common(top):
+            lines.append(f"{count:>9}  {_share(count, busy):>6}  {label}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename.replace('\\', '/').rsplit('/', 1)[-1]
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+def _share(count: int, total: int) -> str:
+    return f'{count / total * 100:.1f}%' if total else '0.0%'
@@ -0,0 +1,113 @@
+import logging
+import re
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+# The statement texts are a small fixed set; the bound covers SQL built with varying placeholder counts
+@lru_cache(maxsize=1024)
+def fingerprint(sql: str) -> str:
+    """Normalise a statement so executions with different literals group together"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def params_shape(params, many: bool = False) -> str:
+    """Describe parameter types without logging the (possibly personal) values"""
+    if many:
+        rows = list(params) if not isinstance(params, (list, tuple)) else params
+        first = params_shape(rows[0]) if rows else '()'
+        return f'{len(rows)} x {first}'
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in params.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+
+
+class StatementStats:
+    """Aggregated timings for one statement fingerprint"""
+    __slots__ = ('fingerprint', 'count', 'total_ms', 'max_ms', 'slow_count', 'params_shape', 'plan')
+
+    def __init__(self, statement: str):
+        self.fingerprint = statement
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.slow_count = 0
+        self.params_shape = None
+        self.plan = None
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+
+class SlowQueryLog:
+    """Times every statement and keeps details of those over a threshold"""
+
+    def __init__(self, threshold_ms: float = 100.0, top_n: int = 10, recent_size: int = 50):
+        self.threshold_ms = threshold_ms
+        self.top_n = top_n
+        self.recent = deque(maxlen=recent_size)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, params_description: str, elapsed_ms: float, explain=None):
+        """Record one execution; explain() is only called for slow statements"""
+        statement = fingerprint(sql)
+
+        with self._lock:
+            stats = self._stats.get(statement)
+            if stats is None:
+                stats = self._stats[statement] = StatementStats(statement)
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            if elapsed_ms > stats.max_ms:
+                stats.max_ms = elapsed_ms
+                stats.params_shape = params_description
+
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        if stats.plan is None and explain is not None:
+            try:
+                stats.plan = explain()
+            except Exception as e:
+                stats.plan = f'unavailable: {e}'
+
+        with self._lock:
+            stats.slow_count += 1
+            self.recent.append((statement, params_description, elapsed_ms))
+
+        logger.warning(
+            "Slow query %.1fms (threshold %.0fms): %s params=%s plan=%s",
+            elapsed_ms, self.threshold_ms, statement, params_description, stats.plan,
+            extra={'latency_ms': round(elapsed_ms, 2)}
+        )
+
+    def top(self, n: Optional[int] = None) -> List[StatementStats]:
+        """Slowest statement fingerprints by worst observed time"""
+        with self._lock:
+            stats = list(self._stats.values())
+        stats.sort(key=lambda s: s.max_ms, reverse=True)
+        return stats[:n or self.top_n]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.recent.clear()
+
+
+def format_query_plan(rows) -> str:
+    """Render EXPLAIN QUERY PLAN rows as a single line"""
+    return ' | '.join(row[-1] for row in rows) or 'no plan'
@@ -0,0 +1,82 @@
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second up to `burst`"""
+    __slots__ = ('tokens', 'updated', 'warned_at')
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+        self.warned_at = None
+
+    def take(self, rate: float, burst: float, now: float) -> bool:
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class RateLimiter:
+    """Per-user and global inbound token buckets.
+
+    A rate of 0 disables that limit. Buckets idle long enough to have refilled
+    completely are indistinguishable from new ones, so they are swept periodically.
+    """
+
+    SWEEP_INTERVAL = 60.0
+
+    def __init__(self, user_rate: float, user_burst: float, global_rate: float, global_burst: float,
+                 warn_interval: float = 10.0):
+        self.user_rate = user_rate
+        self.user_burst = max(1.0, user_burst)
+        self.global_rate = global_rate
+        self.global_burst = max(1.0, global_burst)
+        self.warn_interval = warn_interval
+        self._users: Dict[int, TokenBucket] = {}
+        self._global = TokenBucket(self.global_burst, time.monotonic())
+        self._last_sweep = time.monotonic()
+
+    def check(self, user_id: Optional[int], exempt: bool = False, now: float = None) -> Optional[str]:
+        """Return None if the update may proceed, else the scope ('user' or 'global') that throttled it"""
+        now = time.monotonic() if now is None else now
+
+        if self.user_rate and user_id is not None and not exempt:
+            bucket = self._users.get(user_id)
+            if bucket is None:
+                bucket = self._users[user_id] = TokenBucket(self.user_burst, now)
+            if not bucket.take(self.user_rate, self.user_burst, now):
+                return 'user'
+
+        if self.global_rate and not self._global.take(self.global_rate, self.global_burst, now):
+            return 'global'
+
+        if now - self._last_sweep > self.SWEEP_INTERVAL:
+            self._sweep(now)
+        return None
+
+    def should_warn(self, user_id: int, now: float = None) -> bool:
+        """Whether a throttled user should be told to slow down (at most once per warn_interval)"""
+        now = time.monotonic() if now is None else now
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            return False
+        if bucket.warned_at is not None and now - bucket.warned_at < self.warn_interval:
+            return False
+        bucket.warned_at = now
+        return True
+
+    def _sweep(self, now: float):
+        refill_time = self.user_burst / self.user_rate if self.user_rate else 0
+        self._users = {
+            user_id: bucket for user_id, bucket in self._users.items()
+            if now - bucket.updated < max(refill_time, self.warn_interval)
+        }
+        self._last_sweep = now
+
+    @property
+    def tracked_users(self) -> int:
+        return len(self._users)
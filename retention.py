@@ -0,0 +1,101 @@
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionReport:
+    """Rows removed per policy and bytes reclaimed by one retention run"""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.duration = 0.0
+        self.rows: Dict[str, int] = {}
+        self.archived: List[Tuple[int, int]] = []
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.errors: List[str] = []
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return max(0, self.bytes_before - self.bytes_after)
+
+    def format(self) -> str:
+        lines = [f"🧹 Retention run {self.started_at:%Y-%m-%d %H:%M} ({self.duration:.1f}s)", ""]
+        for policy, rows in self.rows.items():
+            lines.append(f"• {policy}: {rows} rows deleted")
+        if self.archived:
+            moved = sum(rows for _, rows in self.archived)
+            lines.append(f"• archived questionnaires: {len(self.archived)} ({moved} responses moved)")
+        lines.append(f"• database: {_size(self.bytes_before)} → {_size(self.bytes_after)} "
+                     f"({_size(self.bytes_reclaimed)} reclaimed)")
+        for error in self.errors:
+            lines.append(f"⚠️ {error}")
+        return '\n'.join(lines)
+
+
+def purge_in_batches(purge: Callable[[float, int], int], days: float, batch_size: int, pause: float) -> int:
+    """Call purge(days, batch_size) until it deletes nothing, sleeping between batches"""
+    total = 0
+    while True:
+        deleted = purge(days, batch_size)
+        if not deleted:
+            return total
+        total += deleted
+        # Each batch is its own transaction; the pause lets respondents' writes in
+        time.sleep(pause)
+
+
+def run_retention(db, incomplete_days: Optional[float], stale_user_days: Optional[float],
+                  archive_days: Optional[float], batch_size: int = 500, pause: float = 0.05,
+                  vacuum_pages: int = 200) -> RetentionReport:
+    """Apply every enabled retention policy (None disables one), then reclaim free pages.
+
+    Blocking; run it in a worker thread.
+    """
+    report = RetentionReport()
+    started = time.perf_counter()
+    report.bytes_before = db.database_size()
+
+    policies = (
+        ('incomplete attempts', incomplete_days, db.purge_incomplete_attempts),
+        ('stale users', stale_user_days, db.purge_stale_users),
+    )
+    for name, days, purge in policies:
+        if days is None:
+            continue
+        try:
+            report.rows[name] = purge_in_batches(purge, days, batch_size, pause)
+        except Exception as e:
+            logger.error("Retention policy '%s' failed: %s", name, e, exc_info=True)
+            report.errors.append(f"{name}: {e}")
+
+    if archive_days is not None:
+        try:
+            report.archived = db.archive_closed_questionnaires(archive_days)
+        except Exception as e:
+            logger.error("Archiving failed: %s", e, exc_info=True)
+            report.errors.append(f"archive: {e}")
+
+    free_pages = None
+    while vacuum_pages:
+        remaining = db.incremental_vacuum(vacuum_pages)
+        # Stop once nothing is left or a step frees nothing (auto_vacuum not in effect)
+        if not remaining or (free_pages is not None and remaining >= free_pages):
+            break
+        free_pages = remaining
+        time.sleep(pause)
+
+    report.bytes_after = db.database_size()
+    report.duration = time.perf_counter() - started
+    return report
+
+
+def _size(num_bytes: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if num_bytes < 1024:
+            return f'{num_bytes:.0f}{unit}' if unit == 'B' else f'{num_bytes:.1f}{unit}'
+        num_bytes /= 1024
+    return f'{num_bytes:.1f}GB'
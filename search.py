@@ -0,0 +1,81 @@
+import re
+from typing import List, Tuple
+
+# Index token scoping an answer to its questionnaire. The letters around the id make it
+# an exact token for unicode61 and an unambiguous substring for trigram ("q5x" is not in "q15x")
+SCOPE_TOKEN = 'q{}x'
+# The same token built in SQL by the index triggers, for a row alias such as new/old
+SCOPE_TOKEN_SQL = "'q' || {row}.questionnaire_id || 'x'"
+
+# Terms of a search query; a trailing * asks for a prefix match
+TERM_PATTERN = re.compile(r'[^\s"*]+\*?')
+WORD_PATTERN = re.compile(r'\w+')
+
+MAX_QUERY_TERMS = 16
+
+
+def scope_token(questionnaire_id: int) -> str:
+    """Token stored in the index's scope column for a questionnaire's answers"""
+    return SCOPE_TOKEN.format(questionnaire_id)
+
+
+def parse_query(query: str) -> List[Tuple[str, bool]]:
+    """Split a search query into (term, is_prefix) pairs; every term must match"""
+    terms = []
+    for match in TERM_PATTERN.findall(query or '')[:MAX_QUERY_TERMS]:
+        prefix = match.endswith('*')
+        terms.append((match.rstrip('*'), prefix))
+    return terms
+
+
+def match_expression(questionnaire_id: int, terms: List[Tuple[str, bool]]) -> str:
+    """FTS5 MATCH expression for the terms within one questionnaire.
+
+    Terms are quoted so user input can never be parsed as FTS5 operators.
+    """
+    parts = [f'scope : "{scope_token(questionnaire_id)}"']
+    for term, prefix in terms:
+        parts.append('answer_text : "' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' AND '.join(parts)
+
+
+def matches(text: str, terms: List[Tuple[str, bool]]) -> int:
+    """Count term occurrences in text if every term occurs, else 0 (the in-memory backend's ranking)"""
+    words = [word.lower() for word in WORD_PATTERN.findall(text or '')]
+    total = 0
+    for term, prefix in terms:
+        term = term.lower()
+        hits = sum(1 for word in words if (word.startswith(term) if prefix else word == term))
+        if not hits:
+            return 0
+        total += hits
+    return total
+
+
+def excerpt(text: str, terms: List[Tuple[str, bool]], width: int = 80) -> str:
+    """Window of the answer around the first term occurrence"""
+    text = ' '.join((text or '').split())
+    if len(text) <= width:
+        return text
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term, _ in terms]
+    positions = [position for position in positions if position >= 0]
+    start = max(0, min(positions, default=0) - width // 3)
+    end = min(len(text), start + width)
+    start = max(0, end - width)
+    return ('…' if start else '') + text[start:end] + ('…' if end < len(text) else '')
+
+
+def format_search_results(title: str, query: str, total: int, results: List[dict],
+                          terms: List[Tuple[str, bool]], page: int, page_size: int) -> str:
+    """Render one page of search results"""
+    if not total:
+        return f"🔎 No answers in '{title}' match \"{query}\"."
+
+    pages = (total + page_size - 1) // page_size
+    lines = [f"🔎 \"{query}\" in '{title}': {total} answers (page {page + 1}/{pages})", ""]
+    for i, result in enumerate(results, start=page * page_size + 1):
+        name = result['first_name'] or result['username'] or str(result['user_id'])
+        lines.append(f"{i}. {name} — {result['question_text'][:60]}")
+        lines.append(f"   {excerpt(result['answer_text'], terms)}")
+    return '\n'.join(lines)
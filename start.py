@@ -5,22 +5,22 @@ Telegram Questionnaire Bot Startup Script
 
 import sys
 import os
+import importlib.util
 from pathlib import Path
 
 # Add current directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
 def check_requirements():
-    """Check if all required packages are installed"""
-    try:
-        import telegram
-        import pandas
-        import openpyxl
-        return True
-    except ImportError as e:
-        print(f"❌ Missing required package: {e}")
+    """Check if all required packages are installed without importing them"""
+    missing = [name for name in ('telegram', 'pandas', 'openpyxl', 'qrcode', 'PIL')
+               if importlib.util.find_spec(name) is None]
+    
+    if missing:
+        print(f"❌ Missing required package: {', '.join(missing)}")
         print("Please install requirements: pip install -r requirements.txt")
         return False
+    return True
 
 def check_config():
     """Check if configuration is valid"""
@@ -0,0 +1,174 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from models import Question, Questionnaire, QuestionnaireStatus, QuestionType, User
+
+
+class StorageBackend(ABC):
+    """Operations the bot needs from its data store.
+
+    `Database` (SQLite) is the production backend; `MemoryStorage` keeps
+    everything in Python dicts for load tests and benchmarks. Timestamps are
+    UTC strings in SQLite's CURRENT_TIMESTAMP format in both.
+    """
+
+    # Bot state
+    @abstractmethod
+    def get_state(self, key: str, default: str = None) -> Optional[str]:
+        """Get a bot state value"""
+
+    @abstractmethod
+    def set_state(self, key: str, value: str):
+        """Set a bot state value"""
+
+    # Users
+    @abstractmethod
+    def create_or_update_user(self, user_id: int, username: str = None,
+                              first_name: str = None, last_name: str = None) -> User:
+        """Create or update user"""
+
+    @abstractmethod
+    def get_user(self, user_id: int) -> Optional[User]:
+        """Get user by ID"""
+
+    # Questionnaires
+    @abstractmethod
+    def create_questionnaire(self, title: str, description: str, created_by: int) -> int:
+        """Create new questionnaire"""
+
+    @abstractmethod
+    def import_questionnaire(self, title: str, description: str, created_by: int,
+                             questions: List[Tuple[str, QuestionType, Optional[List[str]], bool, Optional[dict]]]) -> int:
+        """Create a draft questionnaire with all its questions in one transaction"""
+
+    @abstractmethod
+    def clone_questionnaire(self, questionnaire_id: int, created_by: int, title: str = None,
+                            as_template: bool = False) -> Optional[int]:
+        """Copy a questionnaire and its questions into a new draft (or template); None if it does not exist"""
+
+    @abstractmethod
+    def get_templates(self) -> List[Questionnaire]:
+        """Get the template library, newest first"""
+
+    @abstractmethod
+    def get_questionnaire(self, questionnaire_id: int) -> Optional[Questionnaire]:
+        """Get questionnaire by ID (None once deleted)"""
+
+    @abstractmethod
+    def get_questionnaires_by_admin(self, admin_id: int) -> List[Questionnaire]:
+        """Get all questionnaires created by admin, newest first (templates excluded)"""
+
+    @abstractmethod
+    def get_active_questionnaires(self) -> List[Questionnaire]:
+        """Get all active questionnaires, newest first"""
+
+    @abstractmethod
+    def update_questionnaire_status(self, questionnaire_id: int, status: QuestionnaireStatus):
+        """Update questionnaire status"""
+
+    @abstractmethod
+    def delete_questionnaire(self, questionnaire_id: int, admin_id: int) -> bool:
+        """Soft-delete questionnaire (admin only)"""
+
+    @abstractmethod
+    def get_deleted_questionnaires(self) -> List[int]:
+        """Get ids of soft-deleted questionnaires still waiting to be purged"""
+
+    @abstractmethod
+    def count_questionnaire_rows(self, questionnaire_id: int) -> int:
+        """Count the rows purge_questionnaire_batch has to remove for a questionnaire"""
+
+    @abstractmethod
+    def purge_questionnaire_batch(self, questionnaire_id: int, batch_size: int) -> int:
+        """Delete up to batch_size rows of a soft-deleted questionnaire; returns 0 once it is gone"""
+
+    # Questions
+    @abstractmethod
+    def add_question(self, questionnaire_id: int, question_text: str,
+                     question_type: QuestionType, options: List[str] = None,
+                     is_required: bool = True, branches: dict = None) -> int:
+        """Add question to questionnaire (as a new version once it has been activated).
+
+        branches is the question's skip logic in the form compiled.transition_table reads.
+        """
+
+    @abstractmethod
+    def update_questionnaire(self, questionnaire_id: int, title: str, description: str,
+                             questions: List[Tuple[str, QuestionType, Optional[List[str]], bool, Optional[dict]]]) -> Optional[int]:
+        """Replace title, description and questions; returns the version now current, None if not found.
+
+        Drafts are rewritten in place; activated questionnaires get a new version and
+        respondents already answering keep theirs.
+        """
+
+    @abstractmethod
+    def get_questions(self, questionnaire_id: int, version: int = None) -> List[Question]:
+        """Get the questions of a questionnaire version (default: the current one)"""
+
+    @abstractmethod
+    def get_question_history(self, questionnaire_id: int) -> List[Question]:
+        """Get every question any version of the questionnaire has used, oldest first"""
+
+    # Responses
+    @abstractmethod
+    def start_questionnaire_response(self, questionnaire_id: int, user_id: int, version: int = None):
+        """Start questionnaire response, pinned to a version (default: the current one)"""
+
+    @abstractmethod
+    def save_response(self, questionnaire_id: int, user_id: int, question_id: int,
+                      answer_text: str = None, selected_option: int = None,
+                      selected_options: List[int] = None, answer_number: float = None,
+                      answer_date: str = None):
+        """Save response to question (answer_number for number and rating questions, answer_date for dates)"""
+
+    @abstractmethod
+    def complete_questionnaire_response(self, questionnaire_id: int, user_id: int):
+        """Mark questionnaire response as completed"""
+
+    @abstractmethod
+    def get_questionnaire_stats(self, questionnaire_id: int) -> dict:
+        """Get questionnaire statistics"""
+
+    @abstractmethod
+    def get_questionnaire_responses(self, questionnaire_id: int) -> List[dict]:
+        """Get all responses for questionnaire, grouped by user"""
+
+    @abstractmethod
+    def get_option_stats(self, questionnaire_id: int) -> Dict[int, dict]:
+        """Multiple-choice selections per question: {question_id: {'answers', 'tallies': [per option], 'pairs': {(i, j): n}}}"""
+
+    @abstractmethod
+    def get_numeric_stats(self, questionnaire_id: int) -> Dict[int, dict]:
+        """Number, rating and date answers per question: {question_id: {'answers', 'mean', 'median', 'min', 'max',
+        'start', 'width', 'histogram': [answers per bucket]}}; dates are julian days (models.from_julian_day)"""
+
+    @abstractmethod
+    def get_top_terms(self, questionnaire_id: int, limit: int = 5) -> Dict[int, Dict[str, List[Tuple[str, int]]]]:
+        """Most frequent terms and phrases per TEXT question: {question_id: {'term': [(term, answers)], 'phrase': [...]}}"""
+
+    @abstractmethod
+    def search_responses(self, questionnaire_id: int, query: str, limit: int,
+                         offset: int = 0) -> Tuple[int, List[dict]]:
+        """Full-text search a questionnaire's text answers; returns the match count and one ranked page"""
+
+    # Retention
+    @abstractmethod
+    def purge_incomplete_attempts(self, older_than_days: float, batch_size: int) -> int:
+        """Delete up to batch_size unfinished attempts started before the cutoff, with their partial answers"""
+
+    @abstractmethod
+    def purge_stale_users(self, older_than_days: float, batch_size: int) -> int:
+        """Delete up to batch_size non-admin users first seen before the cutoff who left no data behind"""
+
+    # Space management; backends without files or cold storage keep these defaults
+    def archive_closed_questionnaires(self, older_than_days: float) -> List[Tuple[int, int]]:
+        """Archive every questionnaire closed for longer than the given days; returns (id, rows) pairs"""
+        return []
+
+    def incremental_vacuum(self, pages: int) -> int:
+        """Return free pages to the filesystem; returns the free pages left"""
+        return 0
+
+    def database_size(self) -> int:
+        """Total size of the stored data in bytes"""
+        return 0
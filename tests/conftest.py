@@ -0,0 +1,31 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Tests run without a real config.py: fall back to the example one
+try:
+    import config  # noqa: F401
+except ImportError:
+    spec = importlib.util.spec_from_file_location('config', ROOT / 'config.example.py')
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    sys.modules['config'] = config
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def storage(request, tmp_path):
+    """Each storage backend in turn, empty"""
+    from database import Database
+    from memory_storage import MemoryStorage
+
+    if request.param == 'memory':
+        yield MemoryStorage()
+        return
+    db = Database(str(tmp_path / 'bot.db'), shards=0)
+    yield db
+    db.read_pool.close()
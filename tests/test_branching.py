@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from compiled import CompiledQuestionnaire, branching_errors
+from definitions import DefinitionError, validate_definition
+from memory_storage import MemoryStorage
+from models import QuestionnaireStatus, QuestionType
+
+TEXT = (QuestionType.TEXT, None, None)
+
+
+def choice(branches):
+    return QuestionType.SINGLE_CHOICE, ['Yes', 'No'], branches
+
+
+def test_linear_and_forward_branches_are_valid():
+    assert branching_errors([TEXT, TEXT, TEXT]) == []
+    assert branching_errors([choice({'1': 3}), TEXT, TEXT]) == []
+    assert branching_errors([choice({'0': 'end'}), TEXT]) == []
+
+
+@pytest.mark.parametrize('steps, error', [
+    ([choice({'*': 3}), TEXT, TEXT], 'question 2: unreachable'),
+    ([TEXT, choice({'1': 1}), TEXT], 'questions 1 → 2 → 1 loop'),
+    ([choice({'5': 2}), TEXT], "question 1: no option '5' to branch on"),
+    ([choice({'0': 7}), TEXT], "question 1: option 1 goes to 7, not a question number or 'end'"),
+    ([(QuestionType.TEXT, None, {'*': 'end'}), TEXT], 'question 2: unreachable'),
+])
+def test_broken_branches_are_reported(steps, error):
+    assert error in branching_errors(steps)
+
+
+def test_compiled_transitions_follow_the_branches():
+    storage = MemoryStorage()
+    storage.create_or_update_user(1, 'admin')
+    questionnaire_id = storage.create_questionnaire('Cars', 'd', 1)
+    storage.add_question(questionnaire_id, 'Car?', QuestionType.SINGLE_CHOICE, ['Yes', 'No'], branches={'1': 3})
+    storage.add_question(questionnaire_id, 'Brand?', QuestionType.TEXT)
+    storage.add_question(questionnaire_id, 'Age?', QuestionType.NUMBER)
+
+    compiled = CompiledQuestionnaire(questionnaire_id, 1, storage.get_questions(questionnaire_id))
+
+    assert compiled.next_index(0, selected_option=0) == 1
+    assert compiled.next_index(0, selected_option=1) == 2
+    assert compiled.next_index(1) == 2
+    assert compiled.next_index(2) == 3
+
+
+def test_definitions_with_loops_are_rejected():
+    definition = {
+        'title': 'Cars',
+        'questions': [
+            {'text': 'Car?', 'type': 'single_choice', 'options': ['Yes', 'No'], 'goto': {'No': 3}},
+            {'text': 'Brand?', 'type': 'text', 'goto': 1},
+            {'text': 'Age?', 'type': 'number'},
+        ],
+    }
+    with pytest.raises(DefinitionError) as raised:
+        validate_definition(definition)
+    assert 'questions 1 → 2 → 1 loop' in raised.value.errors
+
+    definition['questions'][1]['goto'] = 'end'
+    title, description, specs = validate_definition(definition)
+    assert [branches for *_, branches in specs] == [{'1': 3}, {'*': 'end'}, None]
+
+
+def test_activation_refuses_unreachable_questions():
+    from bot import QuestionnaireBot
+    bot = QuestionnaireBot(db=MemoryStorage())
+    bot.db.create_or_update_user(1, 'admin')
+    questionnaire_id = bot.db.create_questionnaire('Cars', 'd', 1)
+    bot.db.add_question(questionnaire_id, 'Car?', QuestionType.SINGLE_CHOICE, ['Yes', 'No'], branches={'*': 3})
+    bot.db.add_question(questionnaire_id, 'Brand?', QuestionType.TEXT)
+    bot.db.add_question(questionnaire_id, 'Age?', QuestionType.NUMBER)
+
+    replies = []
+
+    async def edit_message_text(text, **kwargs):
+        replies.append(text)
+
+    query = SimpleNamespace(edit_message_text=edit_message_text)
+    asyncio.run(bot.handle_activate_questionnaire(query, SimpleNamespace(id=1), None, questionnaire_id))
+
+    assert replies[-1].startswith('❌ Cannot activate')
+    assert 'question 2: unreachable' in replies[-1]
+    assert bot.db.get_questionnaire(questionnaire_id).status == QuestionnaireStatus.DRAFT
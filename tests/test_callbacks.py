@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from callbacks import ACCESS_DENIED_MESSAGE, EXPIRED_BUTTON_MESSAGE, MAX_CALLBACK_DATA_LENGTH, CallbackRouter
+from config import Config
+
+
+async def noop(query, user, context, *args):
+    query.handled = args
+
+
+def make_router() -> CallbackRouter:
+    router = CallbackRouter()
+    router.register('results', 'r', noop, admin_only=True, legacy_prefix='results_')
+    router.register('restart_survey', 'rs', noop, legacy_prefix='restart_survey_')
+    router.register('admin_list', 'al', noop, admin_only=True, legacy_prefix='admin_list')
+    return router
+
+
+@pytest.mark.parametrize('name, args', [
+    ('results', (0,)),
+    ('results', (35, 36, 123456789)),
+    ('restart_survey', (2 ** 40,)),
+    ('admin_list', ()),
+])
+def test_encode_decode_round_trip(name, args):
+    router = make_router()
+    data = router.encode(name, *args)
+
+    route, decoded = router.decode(data)
+    assert route.name == name
+    assert decoded == list(args)
+    assert len(data.encode('utf-8')) <= MAX_CALLBACK_DATA_LENGTH
+
+
+def test_legacy_data_still_decodes():
+    router = make_router()
+
+    route, args = router.decode('restart_survey_42')
+    assert (route.name, args) == ('restart_survey', [42])
+    route, args = router.decode('admin_list')
+    assert (route.name, args) == ('admin_list', [])
+
+
+@pytest.mark.parametrize('data', ['', '1zz:1', '1r:not-base36!', 'unknown_7', 'results_x'])
+def test_unknown_or_malformed_data_is_rejected(data):
+    assert make_router().decode(data) is None
+
+
+def test_encode_rejects_negative_arguments():
+    with pytest.raises(ValueError):
+        make_router().encode('results', -1)
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+        self.handled = None
+        self.replies = []
+
+    async def answer(self):
+        pass
+
+    async def edit_message_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def dispatch(router, data, user_id):
+    query = FakeQuery(data)
+    update = SimpleNamespace(callback_query=query, effective_user=SimpleNamespace(id=user_id))
+    asyncio.run(router.dispatch(update, None))
+    return query
+
+
+def test_dispatch_guards_admin_routes():
+    router = make_router()
+    admin_id = Config.ADMIN_USER_IDS[0]
+    outsider_id = max(Config.ADMIN_USER_IDS) + 1
+
+    assert dispatch(router, router.encode('results', 7), admin_id).handled == (7,)
+    denied = dispatch(router, router.encode('results', 7), outsider_id)
+    assert denied.handled is None and denied.replies == [ACCESS_DENIED_MESSAGE]
+    assert dispatch(router, router.encode('restart_survey', 7), outsider_id).handled == (7,)
+    assert dispatch(router, '1zz:1', admin_id).replies == [EXPIRED_BUTTON_MESSAGE]
+
+
+def test_only_survey_routes_are_open_to_everyone():
+    from bot import QuestionnaireBot
+    from memory_storage import MemoryStorage
+
+    router = QuestionnaireBot(db=MemoryStorage()).router
+    open_routes = {name for name, route in router._routes_by_name.items() if not route.admin_only}
+    assert open_routes == {'restart_survey'}
@@ -0,0 +1,37 @@
+import pandas as pd
+
+from database import Database
+from models import QuestionType
+from utils import export_to_excel
+
+
+def test_export_writes_every_answer_type(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = Database(str(tmp_path / 'bot.db'), shards=0)
+    db.create_or_update_user(1, 'admin')
+    questionnaire_id = db.create_questionnaire('Feedback', 'd', 1)
+    questions = [
+        (db.add_question(questionnaire_id, 'Car?', QuestionType.SINGLE_CHOICE, ['Yes', 'No']),
+         {'selected_option': 1}),
+        (db.add_question(questionnaire_id, 'Colours?', QuestionType.MULTIPLE_CHOICE, ['red', 'green', 'blue']),
+         {'selected_options': [0, 2]}),
+        (db.add_question(questionnaire_id, 'Age?', QuestionType.NUMBER), {'answer_number': 42}),
+        (db.add_question(questionnaire_id, 'Born?', QuestionType.DATE), {'answer_date': '1984-02-29'}),
+        (db.add_question(questionnaire_id, 'Anything else?', QuestionType.TEXT), {'answer_text': 'no'}),
+    ]
+    db.create_or_update_user(100, 'respondent')
+    db.start_questionnaire_response(questionnaire_id, 100)
+    for question_id, answer in questions:
+        db.save_response(questionnaire_id, 100, question_id, **answer)
+    db.complete_questionnaire_response(questionnaire_id, 100)
+
+    filepath = export_to_excel('Feedback', db.get_questionnaire_responses(questionnaire_id),
+                               db.get_question_history(questionnaire_id))
+    db.read_pool.close()
+
+    row = pd.read_excel(filepath).iloc[0]
+    assert row['Q: Car?'] == 'No'
+    assert row['Q: Colours?'] == 'red, blue'
+    assert row['Q: Age?'] == 42
+    assert row['Q: Born?'] == '1984-02-29'
+    assert row['Q: Anything else?'] == 'no'
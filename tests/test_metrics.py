@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+
+from metrics import Counter, Histogram, MetricsRegistry
+
+
+def hammer(func, threads: int = 8, calls: int = 20000):
+    def worker():
+        for _ in range(calls):
+            func()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    return threads * calls
+
+
+def test_counter_increments_from_many_threads_are_not_lost():
+    counter = Counter('test_total', 'test')
+    total = hammer(lambda: counter.inc('a'))
+    assert counter.get('a') == total
+
+
+def test_histogram_observations_from_many_threads_are_not_lost():
+    histogram = Histogram('test_seconds', 'test', buckets=(0.5, 1.0))
+    total = hammer(lambda: histogram.observe(0.25))
+
+    samples = list(histogram.samples())
+    assert 'test_seconds_count %d' % total in samples
+    assert 'test_seconds_sum %s' % (0.25 * total) in samples
+
+
+def test_registry_rejects_duplicate_names():
+    registry = MetricsRegistry()
+    registry.register(Counter('test_total', 'test'))
+    with pytest.raises(ValueError):
+        registry.register(Counter('test_total', 'again'))
+    assert '# TYPE test_total counter' in registry.render()
@@ -0,0 +1,99 @@
+import sqlite3
+from collections import Counter
+
+from database import TERM_COUNT_UPSERT, Database
+from models import QuestionType, Response
+from text_analytics import answer_terms
+
+OLD_RESPONSES = '''
+    CREATE TABLE responses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        questionnaire_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        question_id INTEGER NOT NULL,
+        answer_text TEXT,
+        selected_option INTEGER,
+        selected_options TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def old_database(path: str):
+    """A database whose responses table predates selected_mask and the one-answer-per-question index"""
+    db = Database(path, shards=0)
+    db.create_or_update_user(1, 'admin')
+    questionnaire_id = db.create_questionnaire('Feedback', 'd', 1)
+    text_id = db.add_question(questionnaire_id, 'Anything else?', QuestionType.TEXT)
+    choice_id = db.add_question(questionnaire_id, 'Which?', QuestionType.MULTIPLE_CHOICE, ['a', 'b', 'c'])
+    for user_id in (100, 101):
+        db.create_or_update_user(user_id, f'user{user_id}')
+        db.start_questionnaire_response(questionnaire_id, user_id)
+    db.read_pool.close()
+
+    conn = sqlite3.connect(path)
+    conn.execute('DROP TABLE responses_fts')
+    conn.execute('DROP TABLE responses')
+    conn.execute(OLD_RESPONSES)
+    conn.execute("UPDATE questionnaire_responses SET started_at = '2024-01-01 00:00:00' WHERE user_id = 100")
+    conn.execute("UPDATE questionnaire_responses SET started_at = '2024-01-02 00:00:00' WHERE user_id = 101")
+    answers = [
+        # user 100 answered twice: only the later answer is kept
+        (100, text_id, 'slow app', None, '2024-01-01 00:00:00'),
+        (100, text_id, 'great app', None, '2024-01-01 00:00:01'),
+        (100, choice_id, None, '[0, 2]', '2024-01-01 00:00:02'),
+        # user 101 restarted after answering: the abandoned attempt's answer goes
+        (101, text_id, 'slow start', None, '2024-01-01 00:00:00'),
+        (101, choice_id, None, '[1]', '2024-01-03 00:00:00'),
+    ]
+    conn.executemany('''
+        INSERT INTO responses (questionnaire_id, user_id, question_id, answer_text, selected_options, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(questionnaire_id, *answer) for answer in answers])
+    conn.execute('DELETE FROM text_term_counts')
+    counts = Counter()
+    for answer in answers:
+        if answer[2] is not None:
+            counts.update(answer_terms(answer[2]))
+    conn.executemany(TERM_COUNT_UPSERT, [(questionnaire_id, text_id, kind, term, count)
+                                         for (kind, term), count in counts.items()])
+    conn.commit()
+    conn.close()
+    return questionnaire_id, text_id, choice_id
+
+
+def test_old_responses_are_migrated_to_masks_and_deduplicated(tmp_path):
+    path = str(tmp_path / 'bot.db')
+    questionnaire_id, text_id, choice_id = old_database(path)
+
+    db = Database(path, shards=0)
+    conn = db.get_connection()
+    columns = {row['name'] for row in conn.execute('PRAGMA table_info(responses)')}
+    rows = conn.execute(f'SELECT {Response.COLUMNS} FROM responses ORDER BY user_id, question_id').fetchall()
+    conn.close()
+
+    assert 'selected_options' not in columns
+    answers = {(row.user_id, row.question_id): row for row in map(Response._make, rows)}
+    assert set(answers) == {(100, text_id), (100, choice_id), (101, choice_id)}
+    assert answers[100, text_id].answer_text == 'great app'
+    assert answers[100, choice_id].selected_options == [0, 2]
+    assert answers[101, choice_id].selected_mask == 0b10
+
+    # The deleted answers no longer count towards the top terms
+    terms = dict(db.get_top_terms(questionnaire_id, limit=10)[text_id]['term'])
+    assert terms == {'great': 1, 'app': 1}
+    assert dict(db.get_top_terms(questionnaire_id, limit=10)[text_id]['phrase']) == {'great app': 1}
+    assert db.search_responses(questionnaire_id, 'slow', limit=10)[0] == 0
+    db.read_pool.close()
+
+
+def test_second_start_keeps_the_migrated_answers(tmp_path):
+    path = str(tmp_path / 'bot.db')
+    questionnaire_id, text_id, choice_id = old_database(path)
+    Database(path, shards=0).read_pool.close()
+
+    db = Database(path, shards=0)
+    stats = db.get_option_stats(questionnaire_id)[choice_id]
+    db.read_pool.close()
+    assert stats['answers'] == 2
+    assert stats['tallies'] == [1, 1, 1]
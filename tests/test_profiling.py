@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from profiling import IDLE, SamplingProfiler
+
+
+async def handle_busy_update(seconds: float):
+    """Stands in for a bot handler that keeps the event loop busy"""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def dispatch(seconds: float):
+    """Outer frame from the same file, like handle_text_message calling the answering handler"""
+    await handle_busy_update(seconds)
+
+
+def profile(workload) -> SamplingProfiler:
+    # Like main() -> run() -> run_polling(): a handler-file frame sits below the event loop
+    profiler = SamplingProfiler(handler_files=[__file__], interval=0.002)
+    profiler.start()
+    asyncio.run(workload)
+    profiler.stop()
+    return profiler
+
+
+def handler_samples(profiler: SamplingProfiler) -> dict:
+    samples = {}
+    for stack, count in profiler.stacks.items():
+        handler, _ = profiler._split(stack)
+        samples[handler] = samples.get(handler, 0) + count
+    return samples
+
+
+def test_idle_loop_counts_as_idle():
+    profiler = profile(asyncio.sleep(0.3))
+    samples = handler_samples(profiler)
+
+    assert profiler.samples
+    assert samples.get(IDLE, 0) >= profiler.samples * 0.9
+    assert 'Busy samples: ' in profiler.report()
+
+
+def test_busy_handler_is_credited_by_name():
+    profiler = profile(dispatch(0.3))
+    samples = handler_samples(profiler)
+
+    assert samples.get('handle_busy_update', 0) >= profiler.samples * 0.8
+    assert 'dispatch' not in samples
+    assert 'profile' not in samples
+    assert 'handle_busy_update' in profiler.collapsed_stacks()
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from database import Database
+from models import QuestionType
+
+
+@pytest.fixture(params=[0, 2], ids=['single', 'sharded'])
+def db(request, tmp_path):
+    db = Database(str(tmp_path / 'bot.db'), shards=request.param)
+    yield db
+    db.read_pool.close()
+
+
+def answered_questionnaire(db, respondents: int):
+    db.create_or_update_user(1, 'admin')
+    questionnaire_id = db.create_questionnaire('Feedback', 'd', 1)
+    question_id = db.add_question(questionnaire_id, 'Anything else?', QuestionType.TEXT)
+    for user_id in range(100, 100 + respondents):
+        db.create_or_update_user(user_id, f'user{user_id}')
+        db.start_questionnaire_response(questionnaire_id, user_id)
+        db.save_response(questionnaire_id, user_id, question_id, answer_text='fine')
+    return questionnaire_id, question_id
+
+
+def answers(db, questionnaire_id):
+    return {entry['user_info']['user_id']: entry['responses'][0]['answer_text']
+            for entry in db.get_questionnaire_responses(questionnaire_id)}
+
+
+def test_answer_commits_while_a_pooled_read_is_open(db):
+    questionnaire_id, question_id = answered_questionnaire(db, respondents=50)
+
+    with db.read_connection(questionnaire_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT user_id, answer_text FROM responses WHERE questionnaire_id = ?',
+                       (questionnaire_id,))
+        first = cursor.fetchone()
+
+        # The unfinished statement holds a WAL snapshot; the writer must not wait for it
+        writer = threading.Thread(target=db.save_response,
+                                  args=(questionnaire_id, 100, question_id),
+                                  kwargs={'answer_text': 'changed'})
+        writer.start()
+        writer.join(timeout=2)
+        assert not writer.is_alive()
+
+        rows = [first] + cursor.fetchall()
+
+    # The reader finishes on its snapshot, the write is visible to the next read
+    assert len(rows) == 50
+    assert {row['answer_text'] for row in rows} == {'fine'}
+    assert answers(db, questionnaire_id)[100] == 'changed'
+
+
+def test_exports_and_answers_run_concurrently(db):
+    questionnaire_id, question_id = answered_questionnaire(db, respondents=20)
+    errors = []
+
+    def export():
+        try:
+            for _ in range(20):
+                assert len(db.get_questionnaire_responses(questionnaire_id)) == 20
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=export) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    for user_id in range(100, 120):
+        db.save_response(questionnaire_id, user_id, question_id, answer_text='again')
+    for reader in readers:
+        reader.join(timeout=10)
+
+    assert not errors
+    assert not any(reader.is_alive() for reader in readers)
+    assert set(answers(db, questionnaire_id).values()) == {'again'}
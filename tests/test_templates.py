@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from config import Config
+from memory_storage import MemoryStorage
+from models import QuestionType
+
+
+class FakeQuery:
+    def __init__(self):
+        self.replies = []
+        self.markups = []
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        self.replies.append(text)
+        self.markups.append(reply_markup)
+
+
+@pytest.fixture
+def bot():
+    from bot import QuestionnaireBot
+    return QuestionnaireBot(db=MemoryStorage())
+
+
+@pytest.fixture
+def admins():
+    if len(Config.ADMIN_USER_IDS) < 2:
+        pytest.skip('needs two admins in ADMIN_USER_IDS')
+    return [SimpleNamespace(id=user_id) for user_id in Config.ADMIN_USER_IDS[:2]]
+
+
+def own_questionnaire(db, owner) -> int:
+    db.create_or_update_user(owner.id, 'owner')
+    questionnaire_id = db.create_questionnaire('Feedback', 'd', owner.id)
+    db.add_question(questionnaire_id, 'Anything else?', QuestionType.TEXT)
+    return questionnaire_id
+
+
+def call(handler, *args) -> FakeQuery:
+    query = FakeQuery()
+    asyncio.run(handler(query, *args))
+    return query
+
+
+def test_only_the_owner_can_clone_or_save_as_template(bot, admins):
+    owner, other = admins
+    questionnaire_id = own_questionnaire(bot.db, owner)
+
+    for handler in (bot.handle_clone_questionnaire, bot.handle_save_template):
+        assert call(handler, other, None, questionnaire_id).replies[-1].startswith('❌')
+    assert not bot.db.get_questionnaires_by_admin(other.id)
+    assert not bot.db.get_templates()
+
+    assert not call(bot.handle_save_template, owner, None, questionnaire_id).replies[-1].startswith('❌')
+    assert not call(bot.handle_clone_questionnaire, owner, None, questionnaire_id).replies[-1].startswith('❌')
+
+
+def test_templates_are_shared_but_only_deletable_by_their_owner(bot, admins):
+    owner, other = admins
+    questionnaire_id = own_questionnaire(bot.db, owner)
+    call(bot.handle_save_template, owner, None, questionnaire_id)
+    template_id = bot.db.get_templates()[0].id
+
+    def buttons(user):
+        _, markup = bot.templates_page(user.id)
+        return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+    delete = bot.router.encode('delete', template_id)
+    assert delete in buttons(owner)
+    assert delete not in buttons(other)
+
+    # Any admin may start from a template, but not from someone's plain questionnaire
+    assert not call(bot.handle_use_template, other, None, template_id).replies[-1].startswith('❌')
+    assert call(bot.handle_use_template, other, None, questionnaire_id).replies[-1] == "❌ Template not found."
@@ -0,0 +1,28 @@
+from models import QuestionType
+
+
+def top_terms(db, questionnaire_id, question_id):
+    top = db.get_top_terms(questionnaire_id, limit=10)[question_id]
+    return dict(top['term']), dict(top['phrase'])
+
+
+def test_overwritten_and_abandoned_answers_stop_counting(storage):
+    storage.create_or_update_user(1, 'admin')
+    questionnaire_id = storage.create_questionnaire('Feedback', 'd', 1)
+    question_id = storage.add_question(questionnaire_id, 'Anything else?', QuestionType.TEXT)
+    for user_id in (100, 101):
+        storage.create_or_update_user(user_id, f'user{user_id}')
+        storage.start_questionnaire_response(questionnaire_id, user_id)
+
+    storage.save_response(questionnaire_id, 100, question_id, answer_text='slow app')
+    storage.save_response(questionnaire_id, 101, question_id, answer_text='slow app')
+    assert top_terms(storage, questionnaire_id, question_id) == ({'slow': 2, 'app': 2}, {'slow app': 2})
+
+    # Answering the same question again replaces the answer and its terms
+    storage.save_response(questionnaire_id, 100, question_id, answer_text='great app')
+    assert top_terms(storage, questionnaire_id, question_id) == (
+        {'slow': 1, 'great': 1, 'app': 2}, {'slow app': 1, 'great app': 1})
+
+    # Restarting discards the previous attempt's answers
+    storage.start_questionnaire_response(questionnaire_id, 101)
+    assert top_terms(storage, questionnaire_id, question_id) == ({'great': 1, 'app': 1}, {'great app': 1})
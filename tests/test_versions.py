@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+from memory_storage import MemoryStorage
+from models import QuestionnaireStatus, QuestionType
+
+
+class FakeQuery:
+    def __init__(self):
+        self.replies = []
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        self.replies.append(text)
+
+
+def spec(question_text, question_type=QuestionType.TEXT, options=None):
+    return question_text, question_type, options, True, None
+
+
+def texts(questions):
+    return [question.question_text for question in questions]
+
+
+def setup_draft(storage):
+    storage.create_or_update_user(1, 'admin')
+    questionnaire_id = storage.create_questionnaire('Feedback', 'd', 1)
+    storage.add_question(questionnaire_id, 'Name?', QuestionType.TEXT)
+    storage.add_question(questionnaire_id, 'Car?', QuestionType.SINGLE_CHOICE, ['Yes', 'No'])
+    return questionnaire_id
+
+
+def test_drafts_are_edited_in_place(storage):
+    questionnaire_id = setup_draft(storage)
+
+    version = storage.update_questionnaire(questionnaire_id, 'Feedback', 'd', [spec('Name?'), spec('Age?')])
+
+    assert version == 1
+    assert storage.get_questionnaire(questionnaire_id).version == 1
+    assert texts(storage.get_questions(questionnaire_id)) == ['Name?', 'Age?']
+    # Nobody can have answered the dropped question, so it is gone
+    assert texts(storage.get_question_history(questionnaire_id)) == ['Name?', 'Age?']
+
+
+def test_active_edits_create_one_version_and_respondents_keep_theirs(storage):
+    questionnaire_id = setup_draft(storage)
+    storage.update_questionnaire_status(questionnaire_id, QuestionnaireStatus.ACTIVE)
+    first = storage.get_questions(questionnaire_id)
+    storage.create_or_update_user(100, 'early')
+    storage.start_questionnaire_response(questionnaire_id, 100, 1)
+
+    version = storage.update_questionnaire(questionnaire_id, 'Feedback', 'd',
+                                           [spec('Name?'), spec('Age?', QuestionType.NUMBER)])
+    assert version == 2
+    # Publishing the same questions again is not another version
+    assert storage.update_questionnaire(questionnaire_id, 'Feedback', 'd',
+                                        [spec('Name?'), spec('Age?', QuestionType.NUMBER)]) == 2
+
+    second = storage.get_questions(questionnaire_id)
+    assert texts(storage.get_questions(questionnaire_id, 1)) == ['Name?', 'Car?']
+    assert texts(second) == ['Name?', 'Age?']
+    # The unchanged question keeps its row, and with it its answers
+    assert second[0].id == first[0].id
+    assert texts(storage.get_question_history(questionnaire_id)) == ['Name?', 'Car?', 'Age?']
+
+    # The respondent who started on version 1 finishes it; a newcomer gets version 2
+    storage.save_response(questionnaire_id, 100, first[1].id, selected_option=0)
+    storage.complete_questionnaire_response(questionnaire_id, 100)
+    storage.create_or_update_user(101, 'late')
+    storage.start_questionnaire_response(questionnaire_id, 101, 2)
+    storage.save_response(questionnaire_id, 101, second[1].id, answer_number=30)
+    storage.complete_questionnaire_response(questionnaire_id, 101)
+
+    results = {entry['user_info']['user_id']: entry['responses']
+               for entry in storage.get_questionnaire_responses(questionnaire_id)}
+    assert [answer['question_text'] for answer in results[100]] == ['Name?', 'Car?']
+    assert results[100][1]['selected_option_text'] == 'Yes'
+    assert [answer['question_text'] for answer in results[101]] == ['Name?', 'Age?']
+    assert results[101][1]['answer_number'] == 30
+
+
+def test_adding_a_question_to_an_active_questionnaire_copies_the_version(storage):
+    questionnaire_id = setup_draft(storage)
+    storage.update_questionnaire_status(questionnaire_id, QuestionnaireStatus.ACTIVE)
+
+    storage.add_question(questionnaire_id, 'Anything else?', QuestionType.TEXT)
+
+    assert storage.get_questionnaire(questionnaire_id).version == 2
+    assert texts(storage.get_questions(questionnaire_id, 1)) == ['Name?', 'Car?']
+    assert texts(storage.get_questions(questionnaire_id)) == ['Name?', 'Car?', 'Anything else?']
+
+
+def test_chat_additions_to_a_questionnaire_activated_meanwhile_publish_one_version():
+    from bot import QuestionnaireBot
+    bot = QuestionnaireBot(db=MemoryStorage())
+    admin = SimpleNamespace(id=1)
+    questionnaire_id = setup_draft(bot.db)
+    bot.user_states[admin.id] = {'action': 'creating_questionnaire', 'step': 'questions_menu',
+                                 'data': {'questionnaire_id': questionnaire_id}}
+
+    # Activated from another chat while the admin is still adding questions
+    bot.db.update_questionnaire_status(questionnaire_id, QuestionnaireStatus.ACTIVE)
+    bot.add_created_question(admin.id, questionnaire_id, 'Age?', QuestionType.NUMBER)
+    bot.add_created_question(admin.id, questionnaire_id, 'Anything else?', QuestionType.TEXT)
+    assert bot.db.get_questionnaire(questionnaire_id).version == 1
+
+    asyncio.run(bot.handle_finish_questionnaire(FakeQuery(), admin, None, questionnaire_id))
+
+    assert bot.db.get_questionnaire(questionnaire_id).version == 2
+    assert texts(bot.db.get_questions(questionnaire_id)) == ['Name?', 'Car?', 'Age?', 'Anything else?']
+
+    # Editing it again from the chat is refused
+    query = FakeQuery()
+    asyncio.run(bot.handle_restart_creation(query, admin, None, questionnaire_id))
+    assert query.replies[-1].startswith('❌')
+    assert admin.id not in bot.user_states
@@ -0,0 +1,61 @@
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+TERM = 'term'
+PHRASE = 'phrase'
+
+WORD_PATTERN = re.compile(r'\w+')
+# Phrases never span punctuation
+CLAUSE_PATTERN = re.compile(r'[^\w\s]+')
+# Han, Hiragana/Katakana and Hangul runs are written without spaces
+CJK_PATTERN = re.compile(r'([぀-ヿ㐀-䶿一-鿿가-힯]+)')
+
+STOP_WORDS = frozenset('''
+a about after all also am an and any are as at be because been but by can could did do does
+for from had has have he her his how i if in into is it its just me more my no not of on or
+our out she so than that the their them then there these they this to too up us very was we
+were what when which who will with would you your
+'''.split())
+
+MAX_TERM_LENGTH = 40
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase content words of a clause; CJK runs become overlapping two-character terms"""
+    tokens = []
+    for word in WORD_PATTERN.findall((text or '').lower()):
+        # The capturing split alternates other text (even indexes) and CJK runs (odd indexes)
+        for index, part in enumerate(CJK_PATTERN.split(word)):
+            if index % 2:
+                tokens.extend(part[i:i + 2] for i in range(max(1, len(part) - 1)))
+            elif len(part) > 1 and not part.isdigit() and part not in STOP_WORDS:
+                tokens.append(part[:MAX_TERM_LENGTH])
+    return tokens
+
+
+def answer_terms(text: str) -> Counter:
+    """(kind, term) pairs of one answer, each counted once so counts read as 'answers mentioning it'"""
+    pairs = set()
+    for clause in CLAUSE_PATTERN.split(text or ''):
+        tokens = tokenize(clause)
+        pairs.update((TERM, token) for token in tokens)
+        pairs.update((PHRASE, _phrase(first, second)) for first, second in zip(tokens, tokens[1:]) if first != second)
+    return Counter(pairs)
+
+
+def _phrase(first: str, second: str) -> str:
+    """Join two adjacent terms; overlapping CJK bigrams merge into the three characters they cover"""
+    if first[-1] == second[0] and CJK_PATTERN.fullmatch(first + second):
+        return first + second[1:]
+    return f'{first} {second}'
+
+
+def format_top_terms(top: Dict[str, List[Tuple[str, int]]]) -> str:
+    """One line each for the top terms and phrases of a question"""
+    lines = []
+    for kind, label in ((TERM, 'Top terms'), (PHRASE, 'Top phrases')):
+        if top.get(kind):
+            # Terms are \w runs, so backticks keep Markdown intact whatever they contain
+            lines.append(f"   {label}: " + ', '.join(f"`{term}` ({count})" for term, count in top[kind]))
+    return '\n'.join(lines)
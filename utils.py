@@ -1,13 +1,39 @@
-import pandas as pd
 from typing import List, Dict
 from datetime import datetime
+import importlib
+import logging
 import os
-import qrcode
+import time
 from io import BytesIO
 
+from telegram.helpers import escape_markdown
+
+from models import QuestionType, from_julian_day
+from text_analytics import format_top_terms
+
+# pandas, openpyxl, qrcode and Pillow add hundreds of milliseconds to startup but are
+# only needed for exports and QR codes, so they are imported on first use.
+HEAVY_MODULES = ('pandas', 'openpyxl', 'qrcode', 'PIL.Image')
+
+logger = logging.getLogger(__name__)
+
+def preload_heavy_modules():
+    """Import the export/QR dependencies ahead of first use (run off the hot path)"""
+    for name in HEAVY_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("Could not preload %s: %s", name, e)
+            continue
+        logger.debug("Preloaded %s in %.0fms", name, (time.perf_counter() - start) * 1000)
+
+CHOICE_TYPE_VALUES = (QuestionType.SINGLE_CHOICE.value, QuestionType.MULTIPLE_CHOICE.value)
+
 def export_to_excel(questionnaire_title: str, responses_data: List[dict], 
                    questions_data: List[dict]) -> str:
     """Export questionnaire responses to Excel file"""
+    import pandas as pd
     
     # Create filename
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -39,8 +65,12 @@ def export_to_excel(questionnaire_title: str, responses_data: List[dict],
         # Add each question's response
         for resp in response['responses']:
             question_text = resp['question_text']
-            if resp['question_type'] == 'multiple_choice':
+            if resp['question_type'] in CHOICE_TYPE_VALUES:
                 answer = resp.get('selected_option_text', 'No answer')
+            elif resp['question_type'] in (QuestionType.NUMBER.value, QuestionType.RATING.value):
+                answer = resp.get('answer_number')  # numeric cells, so the sheet can aggregate them
+            elif resp['question_type'] == QuestionType.DATE.value:
+                answer = resp.get('answer_date')
             else:
                 answer = resp.get('answer_text', 'No answer')
             
@@ -76,7 +106,7 @@ def format_questionnaire_info(questionnaire, questions_count: int, stats: dict)
 👥 Started: {stats['total_started']}
 ✅ Completed: {stats['total_completed']}
 📅 Created: {questionnaire.created_at.strftime('%Y-%m-%d %H:%M')}
-🔄 Status: {questionnaire.status.value.title()}
+🔄 Status: {questionnaire.status.value.title()} (version {questionnaire.version})
 """
 
 def format_question_for_display(question, question_number: int) -> str:
@@ -121,8 +151,10 @@ def get_user_display_name(user_info: dict) -> str:
     else:
         return f"User {user_info['user_id']}"
 
-def format_response_summary(responses_data: List[dict], questionnaire_title: str) -> str:
-    """Format response summary for admin"""
+def format_response_summary(responses_data: List[dict], questionnaire_title: str,
+                            questions: list = None, top_terms: Dict[int, dict] = None,
+                            option_stats: Dict[int, dict] = None, numeric_stats: Dict[int, dict] = None) -> str:
+    """Format response summary for admin, with option tallies, numeric summaries and top text terms if given"""
     if not responses_data:
         return f"📊 **Response Summary for '{questionnaire_title}'**\n\nNo responses yet."
     
@@ -143,14 +175,83 @@ def format_response_summary(responses_data: List[dict], questionnaire_title: str
         if len(completed_responses) > 5:
             summary += f"... and {len(completed_responses) - 5} more\n"
     
+    length = len(summary)
+    choice_sections = []
+    for question in questions or []:
+        section = format_option_stats(question, (option_stats or {}).get(question.id))
+        # Whole sections only, so a cut never splits Markdown; Telegram's limit is 4096 characters
+        if section and length + len(section) <= 4000:
+            choice_sections.append(section)
+            length += len(section)
+    if choice_sections:
+        summary += "\n**Choice Answers:**\n" + "".join(choice_sections)
+    
+    numeric_sections = []
+    for question in questions or []:
+        section = format_numeric_stats(question, (numeric_stats or {}).get(question.id))
+        if section and length + len(section) <= 4000:
+            numeric_sections.append(section)
+            length += len(section)
+    if numeric_sections:
+        summary += "\n**Numeric Answers:**\n" + "".join(numeric_sections)
+    
+    text_sections = []
+    for question in questions or []:
+        top = format_top_terms((top_terms or {}).get(question.id, {}))
+        section = f"• {escape_markdown(question.question_text[:60])}\n{top}\n"
+        if top and length + len(section) <= 4000:
+            text_sections.append(section)
+            length += len(section)
+    if text_sections:
+        summary += "\n**Text Answers:**\n" + "".join(text_sections)
+    
     return summary
 
+def format_option_stats(question, stats: dict) -> str:
+    """Tallies and the most frequent pair of a multiple-choice question, or '' without answers"""
+    if not stats or not stats['answers']:
+        return ""
+    
+    options = [escape_markdown(option[:30]) for option in question.options or []]
+    tallies = ", ".join(
+        f"{option} {count} ({count * 100 // stats['answers']}%)" for option, count in zip(options, stats['tallies'])
+    )
+    section = f"• {escape_markdown(question.question_text[:60])} ({stats['answers']} answers)\n   {tallies}\n"
+    
+    if stats['pairs']:
+        (first, second), count = max(stats['pairs'].items(), key=lambda item: (item[1], -item[0][0], -item[0][1]))
+        section += f"   Most often together: {options[first]} + {options[second]} ({count})\n"
+    return section
+
+def format_numeric_stats(question, stats: dict) -> str:
+    """Mean, median, range and histogram of a number, rating or date question, or '' without answers"""
+    if not stats or not stats['answers']:
+        return ""
+    
+    def show(value: float) -> str:
+        if question.question_type == QuestionType.DATE:
+            return from_julian_day(value).isoformat()
+        return f"{value:.4g}"
+    
+    if question.question_type == QuestionType.RATING:
+        labels = [escape_markdown(option[:20]) for option in question.options or []]
+    else:
+        labels = [show(stats['start'] + index * stats['width']) + "+" for index in range(len(stats['histogram']))]
+    histogram = ", ".join(f"{label} {count}" for label, count in zip(labels, stats['histogram']))
+    
+    return (f"• {escape_markdown(question.question_text[:60])} ({stats['answers']} answers)\n"
+            f"   Mean {show(stats['mean'])}, median {show(stats['median'])}, "
+            f"range {show(stats['min'])} – {show(stats['max'])}\n"
+            f"   {histogram}\n")
+
 def generate_questionnaire_link(bot_username: str, questionnaire_id: int) -> str:
     """Generate deep link for questionnaire"""
     return f"https://t.me/{bot_username}?start=survey_{questionnaire_id}"
 
 def generate_qr_code(data: str) -> BytesIO:
     """Generate QR code for given data"""
+    import qrcode
+    
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,